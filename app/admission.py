@@ -0,0 +1,174 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from app import config
+from app.metrics import Counter, Gauge, register
+from app.responses import dumps
+
+admission_shed = register(Counter(
+    "admission_shed_total", "Requests turned away by admission control", labels=("reason",)
+))
+admission_in_flight = register(Gauge("admission_in_flight", "Requests currently being served"))
+booking_queue_depth = register(Gauge(
+    "booking_queue_depth", "Bookings waiting for a per-professor gate", labels=("stat",)
+))
+
+
+class TokenBuckets:
+    """Per-key token buckets: ``rate`` tokens a second, holding at most ``burst``.
+
+    Buckets for the least recently seen keys are dropped beyond ``maxsize``;
+    a dropped bucket simply starts full again.
+    """
+
+    def __init__(self, rate, burst, maxsize=100000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+
+    def take(self, key):
+        """Take one token; returns 0 if allowed, else the seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            tokens -= 1
+            wait = 0.0
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.maxsize:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyGate:
+    """Lets at most ``limit`` holders per key in at once and queues the rest in process.
+
+    Requests beyond ``max_waiting`` queued for one key, or queued for longer
+    than ``timeout`` seconds, are shed with a 503.
+    """
+
+    def __init__(self, limit=1, max_waiting=50, timeout=2.0):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._gates = {}
+
+    def _report(self):
+        depths = [gate["waiting"] for gate in self._gates.values()]
+        booking_queue_depth.set("total", value=sum(depths))
+        booking_queue_depth.set("max", value=max(depths, default=0))
+
+    @asynccontextmanager
+    async def enter(self, key):
+        gate = self._gates.get(key)
+        if gate is None:
+            gate = self._gates[key] = {"semaphore": asyncio.Semaphore(self.limit), "waiting": 0, "users": 0}
+        semaphore = gate["semaphore"]
+        if semaphore.locked() and gate["waiting"] >= self.max_waiting:
+            admission_shed.inc("queue_full")
+            raise HTTPException(
+                status_code=503, detail="Too many bookings queued for this professor",
+                headers={"Retry-After": str(config.ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+
+        gate["users"] += 1
+        try:
+            if semaphore.locked():
+                await self._wait(gate)
+            else:
+                await semaphore.acquire()
+            try:
+                yield
+            finally:
+                semaphore.release()
+        finally:
+            gate["users"] -= 1
+            if not gate["users"]:
+                del self._gates[key]
+
+    async def _wait(self, gate):
+        gate["waiting"] += 1
+        self._report()
+        try:
+            await asyncio.wait_for(gate["semaphore"].acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            admission_shed.inc("queue_timeout")
+            raise HTTPException(
+                status_code=503, detail="Timed out waiting for other bookings with this professor",
+                headers={"Retry-After": str(config.ADMISSION_RETRY_AFTER_SECONDS)},
+            )
+        finally:
+            gate["waiting"] -= 1
+            self._report()
+
+
+write_limits = TokenBuckets(config.RATE_LIMIT_WRITES_PER_SECOND, config.RATE_LIMIT_WRITE_BURST)
+booking_gate = ConcurrencyGate(
+    limit=config.BOOKING_GATE_CONCURRENCY,
+    max_waiting=config.BOOKING_GATE_MAX_WAITING,
+    timeout=config.BOOKING_GATE_TIMEOUT_SECONDS,
+)
+
+
+def check_write_rate(user_key):
+    """Raise 429 with Retry-After when the user is over the write rate limit."""
+    if config.RATE_LIMIT_WRITES_PER_SECOND <= 0:
+        return
+    wait = write_limits.take(user_key)
+    if wait:
+        admission_shed.inc("rate_limited")
+        raise HTTPException(
+            status_code=429, detail="Too many requests, slow down", headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+
+class AdmissionMiddleware:
+    """ASGI middleware capping requests in flight; the excess gets a fast 503 with Retry-After.
+
+    Health, readiness and metrics endpoints are always let through so the
+    orchestrator can still see the worker while it sheds load.
+    """
+
+    EXEMPT_PATHS = ("/healthz", "/readyz", "/metrics")
+
+    def __init__(self, app, max_in_flight=None):
+        self.app = app
+        self.max_in_flight = config.ADMISSION_MAX_IN_FLIGHT if max_in_flight is None else max_in_flight
+        self.in_flight = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            admission_shed.inc("overloaded")
+            body = dumps({"detail": "Server is busy, retry shortly"})
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(config.ADMISSION_RETRY_AFTER_SECONDS).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        self.in_flight += 1
+        admission_in_flight.set(value=self.in_flight)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            admission_in_flight.set(value=self.in_flight)
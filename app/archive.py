@@ -0,0 +1,97 @@
+# Hot/cold tiering for appointments.
+#
+# The overlap checks, schedule loads and listings all work on the hot
+# ``appointments`` collection, so appointments that ended more than
+# ARCHIVE_AFTER_DAYS ago are moved out to ``appointments_archive`` by a
+# background job. Availability needs no job: a TTL index on end_time drops
+# slots once they are over (app/indexes.py).
+#
+# A batch is first upserted into the archive and only then deleted from the
+# hot collection, each delete matching just the copy that was archived, so a
+# worker dying halfway (or an appointment canceled meanwhile) loses nothing;
+# the next pass copies it again. The job sleeps ARCHIVE_PAUSE_SECONDS between
+# batches to keep its I/O from competing with requests. Appointments written
+# before start_ts/end_ts existed get them on the way (app/times.py), so they
+# stay listed once EPOCH_TIME_QUERIES is on.
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+
+from pymongo import DeleteOne, ReplaceOne
+
+from app import config, times
+from app.schedule_version import schedule_versions
+
+logger = logging.getLogger(__name__)
+
+COLLECTION = "appointments_archive"
+
+
+def with_epoch_times(appointment):
+    """The appointment with its integer times filled in, if it predates them and its times can be read."""
+    if "start_ts" in appointment and "end_ts" in appointment:
+        return appointment
+    try:
+        return {**appointment, **times.bounds(appointment["start_time"], appointment["end_time"])}
+    except (KeyError, TypeError, ValueError):
+        return appointment
+
+
+async def archive_batch(db, cutoff, batch_size):
+    """Move up to ``batch_size`` appointments that ended before ``cutoff``; returns how many moved."""
+    batch = await db["appointments"].find(
+        {times.field("end"): {"$lt": times.key(cutoff)}}
+    ).sort("_id", 1).limit(batch_size).to_list(length=None)
+    if not batch:
+        return 0
+
+    await db[COLLECTION].bulk_write(
+        [ReplaceOne({"_id": appointment["_id"]}, with_epoch_times(appointment), upsert=True) for appointment in batch],
+        ordered=False,
+    )
+    deleted = await db["appointments"].bulk_write(
+        [DeleteOne({"_id": appointment["_id"], "is_canceled": appointment["is_canceled"]}) for appointment in batch],
+        ordered=False,
+    )
+    for appointment in batch:
+        schedule_versions.bump(appointment["professor_id"], appointment["student_id"])
+    return deleted.deleted_count
+
+
+async def archive_old_appointments(db, now=None):
+    """Move every appointment older than ARCHIVE_AFTER_DAYS, batch by batch; returns how many moved."""
+    cutoff = (now or datetime.utcnow()) - timedelta(days=config.ARCHIVE_AFTER_DAYS)
+    moved = 0
+    while True:
+        count = await archive_batch(db, cutoff, config.ARCHIVE_BATCH_SIZE)
+        moved += count
+        if count < config.ARCHIVE_BATCH_SIZE:
+            # A short batch is the last one (or the rest changed under us; the next pass gets them)
+            return moved
+        await asyncio.sleep(config.ARCHIVE_PAUSE_SECONDS)
+
+
+async def run_archive_loop(db, interval):
+    """Background task: archive old appointments every ``interval`` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            moved = await archive_old_appointments(db)
+            if moved:
+                logger.info("Archived %d appointments", moved)
+        except Exception:
+            logger.exception("Appointment archiving failed")
+
+
+def merge_pages(hot, archived, limit, descending=False):
+    """The first ``limit + 1`` listing rows of two pages sorted by (cursor_time, appointment_id).
+
+    An appointment caught mid-move can be in both; the hot copy wins.
+    """
+    seen = {row["appointment_id"] for row in hot}
+    archived = [row for row in archived if row["appointment_id"] not in seen]
+    merged = heapq.merge(
+        hot, archived, key=lambda row: (row["cursor_time"], row["appointment_id"]), reverse=descending
+    )
+    return [row for _, row in zip(range(limit + 1), merged)]
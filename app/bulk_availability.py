@@ -0,0 +1,60 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from app.times import to_utc
+
+
+def expand_weekly(weekdays, start, end, from_date, until, exclude=()):
+    """Expand a weekly pattern into concrete (start_time, end_time) pairs.
+
+    ``weekdays`` uses Monday=0 .. Sunday=6, ``start``/``end`` are times of day
+    and the range from_date..until is inclusive. Dates in ``exclude`` are skipped.
+    Times carrying a UTC offset are taken on the dates as given, then converted
+    to UTC (so a slot may start on the previous or next UTC day).
+    """
+    excluded = set(exclude)
+    slots = []
+    day = from_date
+    while day <= until:
+        if day.weekday() in weekdays and day not in excluded:
+            slots.append((to_utc(datetime.combine(day, start)), to_utc(datetime.combine(day, end))))
+        day += timedelta(days=1)
+    return slots
+
+
+def sweep_conflicts(candidates, existing):
+    """Split candidate slots into accepted ones and ones that conflict.
+
+    ``candidates`` are (start, end) pairs; ``existing`` are (id, start, end)
+    slots already stored. Candidates are taken in start order and each one is
+    rejected if it overlaps an existing slot or a candidate accepted before it.
+    Returns a list of (candidate, conflicting_slot_or_None) in candidate order,
+    where conflicting_slot is an existing (id, start, end) or the accepted
+    candidate (None, start, end).
+    """
+    existing = sorted(existing, key=lambda slot: slot[1])
+    starts = [slot[1] for slot in existing]
+    # prefix_max[k] is the existing slot with the latest end among the first k + 1 by start
+    prefix_max = []
+    for slot in existing:
+        if not prefix_max or slot[2] > prefix_max[-1][2]:
+            prefix_max.append(slot)
+        else:
+            prefix_max.append(prefix_max[-1])
+
+    results = {}
+    latest_accepted = None
+    order = sorted(range(len(candidates)), key=lambda i: candidates[i])
+    for i in order:
+        start, end = candidates[i]
+        # Every existing slot starting before `end` overlaps iff the latest-ending one does
+        k = bisect_left(starts, end)
+        if k and prefix_max[k - 1][2] > start:
+            results[i] = prefix_max[k - 1]
+        elif latest_accepted is not None and latest_accepted[2] > start:
+            results[i] = latest_accepted
+        else:
+            results[i] = None
+            if latest_accepted is None or end > latest_accepted[2]:
+                latest_accepted = (None, start, end)
+    return [(candidates[i], results[i]) for i in range(len(candidates))]
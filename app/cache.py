@@ -0,0 +1,58 @@
+import time
+from collections import OrderedDict
+
+# Returned by TTLCache.get when a key is absent (distinguishes "not cached" from a cached None)
+MISSING = object()
+
+
+class TTLCache:
+    """Small LRU cache whose entries expire after a time-to-live.
+
+    ``None`` values are cached too (negative caching of lookups that found
+    nothing) and expire after ``negative_ttl`` seconds instead of ``ttl``.
+    """
+
+    def __init__(self, maxsize=10000, ttl=300.0, negative_ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, key):
+        """Like get(), but without touching LRU order or the hit/miss counters."""
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return MISSING
+        return entry[0]
+
+    def set(self, key, value):
+        ttl = self.negative_ttl if value is None else self.ttl
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app import config
+from app.schedule_index import schedule_index
+from app.schedule_version import schedule_versions
+from app.users import invalidate_user_everywhere, user_cache
+
+logger = logging.getLogger(__name__)
+
+WATCHED_COLLECTIONS = ("users", "availability", "appointments")
+TOKENS_COLLECTION = "change_stream_tokens"
+
+
+def _owner(kind, item_id):
+    """(professor key, schedule) of the cached schedule holding ``item_id``.
+
+    Delete events carry no professor_id, so the cached schedules are searched.
+    """
+    for professor_key, schedule in schedule_index:
+        if item_id in getattr(schedule, kind):
+            return professor_key, schedule
+    return None, None
+
+
+def apply_change(change):
+    """Bring this worker's caches in line with one change event.
+
+    Writes made by this worker have usually been applied already; every
+    update here is idempotent, so replaying them (or replaying events after
+    a resume) is harmless.
+    """
+    collection = change["ns"]["coll"]
+    document_id = change.get("documentKey", {}).get("_id")
+    document = change.get("fullDocument")
+
+    if collection == "users":
+        invalidate_user_everywhere(document_id, document["username"] if document else None)
+        return
+
+    kind = "free" if collection == "availability" else "booked"
+    if document is None:
+        # Deleted (or gone before the update lookup ran): drop it wherever it is cached
+        professor_key, schedule = _owner(kind, document_id)
+        if schedule is not None:
+            getattr(schedule, kind).discard(document_id)
+            schedule_versions.bump(professor_key)
+        return
+
+    professor_id = document.get("professor_id")
+    schedule_versions.bump(professor_id, *([document["student_id"]] if "student_id" in document else []))
+    schedule = schedule_index.cached(professor_id)
+    if schedule is None:
+        return
+    intervals = getattr(schedule, kind)
+    if kind == "booked" and document.get("is_canceled"):
+        intervals.discard(document_id)
+    else:
+        intervals.upsert(document_id, document["start_time"], document["end_time"])
+
+
+def _use_long_ttls(enabled):
+    # While the stream keeps caches coherent entries can live long; otherwise fall back to short TTLs
+    if enabled:
+        schedule_index.ttl = config.CHANGE_STREAM_CACHE_TTL_SECONDS
+        user_cache.ttl = config.CHANGE_STREAM_CACHE_TTL_SECONDS
+    else:
+        schedule_index.ttl = config.SCHEDULE_INDEX_TTL_SECONDS
+        user_cache.ttl = config.USER_CACHE_TTL_SECONDS
+
+
+class ChangeStreamSubscriber:
+    """Follows availability, appointments and users changes for this worker's caches.
+
+    The resume token is saved in ``change_stream_tokens`` under the consumer
+    name so a restarted or reconnected subscriber continues where it stopped.
+    Unless given one, a subscriber names itself after the lowest free worker
+    slot on its host ("<host>:0", "<host>:1", ...), which a restarted worker
+    gets back. When the stream cannot be opened or breaks, caches drop back
+    to their plain TTL expiry until it recovers.
+    """
+
+    def __init__(self, db, consumer=None):
+        self.db = db
+        self.consumer = consumer
+        self.healthy = False
+        self._owner = uuid.uuid4().hex
+        self._token = None
+        self._saved_at = 0.0
+
+    async def _claim_consumer(self):
+        """Take the lowest worker slot no live worker holds; returns its consumer name.
+
+        A slot stays held while its worker keeps saving its token and for
+        CHANGE_STREAM_SLOT_LEASE_SECONDS after; a worker shutting down cleanly
+        frees it at once. Should an idle worker's slot be taken over, both
+        save into one document, which only moves where the next restart resumes.
+        """
+        prefix = config.CHANGE_STREAM_CONSUMER or socket.gethostname()
+        slot = 0
+        while True:
+            now = datetime.utcnow()
+            name = f"{prefix}:{slot}"
+            try:
+                await self.db[TOKENS_COLLECTION].update_one(
+                    {"_id": name, "$or": [
+                        {"owner": None},
+                        {"owner": self._owner},
+                        {"updated_at": {"$lte": now - timedelta(seconds=config.CHANGE_STREAM_SLOT_LEASE_SECONDS)}},
+                    ]},
+                    {"$set": {"owner": self._owner, "updated_at": now}},
+                    upsert=True,
+                )
+                return name
+            except DuplicateKeyError:
+                slot += 1
+
+    async def _release_consumer(self):
+        await self.db[TOKENS_COLLECTION].update_one(
+            {"_id": self.consumer, "owner": self._owner}, {"$set": {"owner": None}}
+        )
+
+    async def _load_token(self):
+        saved = await self.db[TOKENS_COLLECTION].find_one({"_id": self.consumer})
+        return saved.get("token") if saved else None
+
+    async def _save_token(self, force=False):
+        if self._token is None:
+            return
+        if not force and time.monotonic() - self._saved_at < config.CHANGE_STREAM_TOKEN_SAVE_SECONDS:
+            return
+        await self.db[TOKENS_COLLECTION].update_one(
+            {"_id": self.consumer},
+            {"$set": {"token": self._token, "owner": self._owner, "updated_at": datetime.utcnow()}},
+            upsert=True,
+        )
+        self._saved_at = time.monotonic()
+
+    @staticmethod
+    def _forget(change):
+        """Drop whatever cached state an event that could not be applied may have left stale."""
+        document = change.get("fullDocument") or {}
+        if change.get("ns", {}).get("coll") == "users":
+            invalidate_user_everywhere(change.get("documentKey", {}).get("_id"))
+        elif document.get("professor_id") is not None:
+            schedule_index.invalidate(document["professor_id"])
+            schedule_versions.bump(document["professor_id"])
+        else:
+            schedule_index.invalidate()
+
+    async def run_once(self):
+        """Follow the stream until it ends or fails."""
+        pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED_COLLECTIONS)}}}]
+        resume_after = self._token or await self._load_token()
+        async with self.db.watch(pipeline, full_document="updateLookup", resume_after=resume_after) as stream:
+            self.healthy = True
+            _use_long_ttls(True)
+            async for change in stream:
+                try:
+                    apply_change(change)
+                except Exception:
+                    # One malformed document must not stop the stream or leave its caches stale
+                    logger.exception("Skipping change event for %s", change.get("documentKey"))
+                    self._forget(change)
+                self._token = stream.resume_token
+                await self._save_token()
+
+    async def run(self):
+        backoff = 1.0
+        while True:
+            try:
+                if self.consumer is None:
+                    self.consumer = await self._claim_consumer()
+                await self.run_once()
+                backoff = 1.0
+            except asyncio.CancelledError:
+                if self.consumer is not None:
+                    await self._save_token(force=True)
+                    await self._release_consumer()
+                raise
+            except PyMongoError as error:
+                logger.warning("Change stream unavailable, caches fall back to TTL expiry: %s", error)
+                if "resume" in str(error).lower():
+                    # The saved token is older than the oplog window; start from now
+                    self._token = None
+                    await self.db[TOKENS_COLLECTION].delete_one({"_id": self.consumer})
+            except Exception:
+                logger.exception("Change stream subscriber failed, caches fall back to TTL expiry")
+            if self.healthy:
+                # Events may have been missed while the stream was down
+                self.healthy = False
+                _use_long_ttls(False)
+                schedule_index.invalidate()
+                user_cache.invalidate()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
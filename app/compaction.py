@@ -0,0 +1,164 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from app import config, times
+from app.schedule_index import schedule_index
+from app.schedule_version import schedule_versions
+
+logger = logging.getLogger(__name__)
+
+LEASE_COLLECTION = "compaction_leases"
+
+
+def coalesce(slots):
+    """Group start-sorted availability documents into runs that touch or overlap.
+
+    Returns (head, others, run_start, run_end) for every run of two or more
+    documents; the head document is kept and stretched over the run, the
+    others are deleted.
+    """
+    runs = []
+    current = []
+    run_end = None
+    for slot in slots:
+        if current and slot["start_time"] <= run_end:
+            current.append(slot)
+            run_end = max(run_end, slot["end_time"])
+            continue
+        if len(current) > 1:
+            runs.append((current[0], current[1:], current[0]["start_time"], run_end))
+        current = [slot]
+        run_end = slot["end_time"]
+    if len(current) > 1:
+        runs.append((current[0], current[1:], current[0]["start_time"], run_end))
+    return runs
+
+
+async def restore_interval(db, professor_id, start_time, end_time):
+    """Give [start_time, end_time) back to a professor as a slot of its own.
+
+    Touching slots are not merged here: deleting or stretching a neighbour
+    could race a booking that has just claimed it and lose the remainder it
+    is about to write back. The compaction pass coalesces the fragments later.
+    Returns the (id, start, end) of the new slot.
+    """
+    result = await db["availability"].insert_one({"professor_id": professor_id, **times.bounds(start_time, end_time)})
+    restored = (result.inserted_id, start_time, end_time)
+
+    schedule = schedule_index.cached(professor_id)
+    if schedule is not None:
+        schedule.add_free(*restored)
+    schedule_versions.bump(professor_id)
+    return restored
+
+
+async def _acquire_lease(db, professor_id, owner):
+    """Take the professor's compaction lease; False while another worker holds it.
+
+    The upsert only matches an expired lease, so against a live one it tries
+    to insert a second document with the same _id and fails.
+    """
+    now = datetime.utcnow()
+    try:
+        await db[LEASE_COLLECTION].update_one(
+            {"_id": professor_id, "expires_at": {"$lte": now}},
+            {"$set": {"owner": owner, "expires_at": now + timedelta(seconds=config.COMPACTION_LEASE_SECONDS)}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+async def compact_professor(db, professor_id):
+    """Coalesce one professor's touching/overlapping availability; returns documents removed.
+
+    Every worker runs the compaction loop, so a professor is only compacted
+    while holding a lease in ``compaction_leases``; a second pass over the
+    same fragments could otherwise stretch a head over time it put back.
+    """
+    owner = ObjectId()
+    if not await _acquire_lease(db, professor_id, owner):
+        return 0
+    try:
+        availability = db["availability"]
+        slots = await availability.find(
+            {"professor_id": professor_id}, {"start_time": 1, "end_time": 1}
+        ).sort([(times.field("start"), 1), ("_id", 1)]).to_list(length=None)
+        runs = coalesce(slots)
+        if not runs:
+            return 0
+        removed = await asyncio.gather(*(
+            _compact_run(availability, professor_id, head, others, run_end) for head, others, _, run_end in runs
+        ))
+    finally:
+        await db[LEASE_COLLECTION].delete_one({"_id": professor_id, "owner": owner})
+
+    schedule_index.invalidate(professor_id)
+    schedule_versions.bump(professor_id)
+    return sum(removed)
+
+
+async def _compact_run(availability, professor_id, head, others, run_end):
+    """Delete a run's fragments and stretch its head over them; returns fragments removed.
+
+    Each delete only matches a fragment that is still exactly as read, so one
+    claimed by a booking in the meantime survives. If any fragment survived,
+    or the head changed, the run is abandoned and only the fragments this pass
+    deleted are put back; the next pass tries again.
+    """
+    deleted = await asyncio.gather(*(
+        availability.find_one_and_delete({"_id": slot["_id"], **times.matches(slot)}, projection={"_id": 1})
+        for slot in others
+    ))
+    gone = [slot for slot, document in zip(others, deleted) if document is not None]
+    if len(gone) == len(others):
+        stretched = await availability.find_one_and_update(
+            {"_id": head["_id"], **times.matches(head)},
+            {"$set": times.bounds(end=run_end)},
+        )
+        if stretched is not None:
+            return len(gone)
+    await _reinsert(availability, professor_id, gone)
+    return 0
+
+
+async def _reinsert(availability, professor_id, slots):
+    """Put back fragments this compaction pass deleted but could not merge."""
+    if not slots:
+        return
+    await availability.insert_many(
+        [
+            {"_id": slot["_id"], "professor_id": professor_id, **times.bounds(slot["start_time"], slot["end_time"])}
+            for slot in slots
+        ],
+        ordered=False,
+    )
+
+
+async def compact_all(db):
+    """Compact every professor that has more than one availability document."""
+    fragmented = await db["availability"].aggregate([
+        {"$group": {"_id": "$professor_id", "slots": {"$sum": 1}}},
+        {"$match": {"slots": {"$gt": 1}}},
+    ]).to_list(length=None)
+    removed = 0
+    for professor in fragmented:
+        removed += await compact_professor(db, professor["_id"])
+    return removed
+
+
+async def run_compaction_loop(db, interval):
+    """Background task: compact availability fragments every ``interval`` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            removed = await compact_all(db)
+            if removed:
+                logger.info("Availability compaction removed %d fragments", removed)
+        except Exception:
+            logger.exception("Availability compaction failed")
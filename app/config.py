@@ -5,3 +5,94 @@ load_dotenv()
 
 MONGO_URI = os.getenv("MONGO_URI")
 JWT_SECRET = os.getenv("JWT_SECRET")
+MONGO_DB_NAME = os.getenv("MONGO_DB_NAME", "college_appointments")
+
+# MongoDB connection pool settings (shared by the whole process)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+
+# Per-professor in-memory schedule index (app/schedule_index.py)
+SCHEDULE_INDEX_MAX_PROFESSORS = int(os.getenv("SCHEDULE_INDEX_MAX_PROFESSORS", "1000"))
+SCHEDULE_INDEX_TTL_SECONDS = float(os.getenv("SCHEDULE_INDEX_TTL_SECONDS", "30"))
+
+# Upper bound on slots accepted by one POST /availability/bulk request
+BULK_AVAILABILITY_MAX_SLOTS = int(os.getenv("BULK_AVAILABILITY_MAX_SLOTS", "1000"))
+
+# In-process user record cache (app/users.py)
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "300"))
+USER_CACHE_NEGATIVE_TTL_SECONDS = float(os.getenv("USER_CACHE_NEGATIVE_TTL_SECONDS", "30"))
+
+# Password hashing (app/security.py). N is the scrypt cost factor (a power of two).
+PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", "16384"))
+PASSWORD_SCRYPT_R = int(os.getenv("PASSWORD_SCRYPT_R", "8"))
+PASSWORD_SCRYPT_P = int(os.getenv("PASSWORD_SCRYPT_P", "1"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+# Longest a worker may answer 304 for a listing changed by another worker (app/schedule_version.py)
+ETAG_MAX_STALENESS_SECONDS = float(os.getenv("ETAG_MAX_STALENESS_SECONDS", "30"))
+
+# Background availability compaction (app/compaction.py); 0 disables it
+COMPACTION_INTERVAL_SECONDS = float(os.getenv("COMPACTION_INTERVAL_SECONDS", "600"))
+COMPACTION_LEASE_SECONDS = float(os.getenv("COMPACTION_LEASE_SECONDS", "60"))  # Per-professor lock shared by workers
+
+# Hot/cold tiering (app/archive.py)
+AVAILABILITY_EXPIRE_AFTER_SECONDS = int(os.getenv("AVAILABILITY_EXPIRE_AFTER_SECONDS", "0"))  # TTL past a slot's end_time
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))  # 0 disables archiving
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "180"))  # Appointments that ended longer ago are archived
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_PAUSE_SECONDS = float(os.getenv("ARCHIVE_PAUSE_SECONDS", "1"))  # Between batches
+
+# Start-up warm-up and budgets (app/startup.py)
+WARMUP_MAX_PROFESSORS = int(os.getenv("WARMUP_MAX_PROFESSORS", "5000"))
+WARMUP_MAX_SCHEDULES = int(os.getenv("WARMUP_MAX_SCHEDULES", "200"))
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "20"))
+STARTUP_IMPORT_BUDGET_SECONDS = float(os.getenv("STARTUP_IMPORT_BUDGET_SECONDS", "2"))
+
+# Change-stream cache coherence across workers (app/change_stream.py)
+CHANGE_STREAM_ENABLED = os.getenv("CHANGE_STREAM_ENABLED", "true").lower() == "true"
+CHANGE_STREAM_CONSUMER = os.getenv("CHANGE_STREAM_CONSUMER")  # Token name prefix (default: host name); a worker slot is appended
+CHANGE_STREAM_SLOT_LEASE_SECONDS = float(os.getenv("CHANGE_STREAM_SLOT_LEASE_SECONDS", "300"))  # Slot held after a worker's last save
+CHANGE_STREAM_TOKEN_TTL_SECONDS = int(os.getenv("CHANGE_STREAM_TOKEN_TTL_SECONDS", "86400"))  # Unused tokens are then dropped
+CHANGE_STREAM_CACHE_TTL_SECONDS = float(os.getenv("CHANGE_STREAM_CACHE_TTL_SECONDS", "600"))
+CHANGE_STREAM_TOKEN_SAVE_SECONDS = float(os.getenv("CHANGE_STREAM_TOKEN_SAVE_SECONDS", "5"))
+
+# Read routing and read-your-writes sessions (app/read_routing.py)
+CAUSAL_READS = os.getenv("CAUSAL_READS", "true").lower() == "true"
+CAUSAL_MAX_USERS = int(os.getenv("CAUSAL_MAX_USERS", "50000"))
+CAUSAL_TTL_SECONDS = float(os.getenv("CAUSAL_TTL_SECONDS", "60"))  # Longer than any expected replication lag
+# Signs the X-Causal-Position header; must be the same on every worker (defaults to the JWT signing key)
+CAUSAL_TOKEN_SECRET = os.getenv("CAUSAL_TOKEN_SECRET") or os.getenv("JWT_SECRET_KEY", "admin123")
+
+# Schedule storage: "intervals" (availability/appointments documents) or
+# "day_buckets" (one slot-bitmap document per professor-day, app/day_buckets.py)
+SCHEDULE_STORAGE = os.getenv("SCHEDULE_STORAGE", "intervals")
+DAY_BUCKET_SLOT_MINUTES = int(os.getenv("DAY_BUCKET_SLOT_MINUTES", "5"))  # Must divide a day evenly
+
+# Query availability/appointments on the integer start_ts/end_ts fields (app/times.py). Off by
+# default: turn it on once `python -m app.migrate_epoch_times` reports nothing remaining.
+EPOCH_TIME_QUERIES = os.getenv("EPOCH_TIME_QUERIES", "false").lower() == "true"
+
+# Idempotency-Key handling for POST /appointments, /availability and /availability/bulk (app/idempotency.py)
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))  # How long a key is remembered
+IDEMPOTENCY_CACHE_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_CACHE_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "5"))  # Wait for a duplicate on another worker
+IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "30"))  # Then treat its owner as dead
+
+# Admission control (app/admission.py); 0 disables a limit
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "500"))  # Per worker
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+RATE_LIMIT_WRITES_PER_SECOND = float(os.getenv("RATE_LIMIT_WRITES_PER_SECOND", "2"))  # Per user, bookings and availability
+RATE_LIMIT_WRITE_BURST = float(os.getenv("RATE_LIMIT_WRITE_BURST", "5"))
+BOOKING_GATE_CONCURRENCY = int(os.getenv("BOOKING_GATE_CONCURRENCY", "1"))  # Bookings run at once per professor
+BOOKING_GATE_MAX_WAITING = int(os.getenv("BOOKING_GATE_MAX_WAITING", "50"))
+BOOKING_GATE_TIMEOUT_SECONDS = float(os.getenv("BOOKING_GATE_TIMEOUT_SECONDS", "2"))
+
+# Logging (app/structured_logging.py): records go through a queue to a background writer
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # "json" or "text"
+LOG_QUEUE_MAX_RECORDS = int(os.getenv("LOG_QUEUE_MAX_RECORDS", "10000"))  # Beyond this, records are dropped and counted
+LOG_REQUESTS = os.getenv("LOG_REQUESTS", "true").lower() == "true"  # One line per finished request
@@ -0,0 +1,247 @@
+# Day-bucket schedule storage (SCHEDULE_STORAGE=day_buckets).
+#
+# Each professor-day is one document in ``day_buckets`` holding two bitmaps
+# of fixed-size slots (DAY_BUCKET_SLOT_MINUTES, 5 by default): ``free`` is
+# offered time nobody has booked, ``booked`` is time taken by appointments.
+# A slot is never in both. The bitmaps are stored as arrays of 32-bit words
+# (in Int64s, so no value is ever negative) because $bit only works on
+# integers and a day of 5-minute slots needs 288 bits.
+#
+# Booking moves the appointment's bits from free to booked with one
+# conditional update that only matches while every one of them is still
+# free; cancelling moves them back. Overlap checks are bitwise ANDs, done by
+# the server through $bitsAllSet/$bitsAllClear.
+from datetime import datetime, time, timedelta, timezone
+
+from bson.int64 import Int64
+from pymongo import UpdateOne
+
+from app import config
+
+COLLECTION = "day_buckets"
+SLOT_MINUTES = config.DAY_BUCKET_SLOT_MINUTES
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+WORD_BITS = 32
+WORDS = -(-SLOTS_PER_DAY // WORD_BITS)
+WORD_MASK = (1 << WORD_BITS) - 1
+
+
+def naive_utc(value):
+    # Naive UTC datetimes, which is what pymongo hands back from the collections
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def day_of(moment):
+    return datetime.combine(naive_utc(moment).date(), time())
+
+
+def bucket_id(professor_id, day):
+    return f"{professor_id}:{day:%Y-%m-%d}"
+
+
+def _slot_of(moment, day, round_up):
+    slots, remainder = divmod((moment - day).total_seconds(), 60 * SLOT_MINUTES)
+    return int(slots) + (1 if remainder and round_up else 0)
+
+
+def _on_grid(moment, day):
+    return (moment - day).total_seconds() % (60 * SLOT_MINUTES) == 0
+
+
+def day_spans(start, end, align="exact"):
+    """Split [start, end) into (day, first slot, end slot) pieces, one per day touched.
+
+    ``align`` says what to do with times off the slot grid: "exact" raises
+    ValueError, "inward" shrinks the span to whole slots (for availability
+    being migrated) and "outward" grows it (for bookings being migrated).
+    Empty pieces are left out.
+    """
+    start, end = naive_utc(start), naive_utc(end)
+    if align == "exact" and not (_on_grid(start, day_of(start)) and _on_grid(end, day_of(end))):
+        raise ValueError(f"Times must fall on {SLOT_MINUTES}-minute boundaries")
+    spans = []
+    day = day_of(start)
+    while day < end:
+        next_day = day + timedelta(days=1)
+        first = _slot_of(max(start, day), day, round_up=align != "outward")
+        last = _slot_of(min(end, next_day), day, round_up=align == "outward")
+        if first < last:
+            spans.append((day, first, last))
+        day = next_day
+    return spans
+
+
+def span_mask(first, last):
+    """Bitmap with slots [first, last) set."""
+    return ((1 << (last - first)) - 1) << first
+
+
+def to_words(mask):
+    return [Int64((mask >> (WORD_BITS * i)) & WORD_MASK) for i in range(WORDS)]
+
+
+def from_words(words):
+    mask = 0
+    for i, word in enumerate(words):
+        mask |= (int(word) & WORD_MASK) << (WORD_BITS * i)
+    return mask
+
+
+def _word_positions(mask):
+    """{word index: [bit positions]} for every word the mask touches."""
+    positions = {}
+    for i in range(WORDS):
+        word = (mask >> (WORD_BITS * i)) & WORD_MASK
+        if word:
+            positions[i] = [bit for bit in range(WORD_BITS) if word >> bit & 1]
+    return positions
+
+
+def _bit_update(field, mask, operation):
+    updates = {}
+    for i in _word_positions(mask):
+        word = (mask >> (WORD_BITS * i)) & WORD_MASK
+        value = word if operation == "or" else ~word & WORD_MASK
+        updates[f"{field}.{i}"] = {operation: Int64(value)}
+    return updates
+
+
+def runs(mask):
+    """(first slot, end slot) of every run of consecutive set bits, in order."""
+    found = []
+    slot = 0
+    while mask:
+        if mask & 1:
+            length = (~mask & (mask + 1)).bit_length() - 1
+            found.append((slot, slot + length))
+            mask >>= length
+            slot += length
+        else:
+            skip = (mask & -mask).bit_length() - 1
+            mask >>= skip
+            slot += skip
+    return found
+
+
+def empty_bucket(professor_id, day):
+    return {
+        "_id": bucket_id(professor_id, day),
+        "professor_id": professor_id,
+        "day": day,
+        "free": to_words(0),
+        "booked": to_words(0),
+    }
+
+
+def free_intervals(buckets):
+    """Free (start, end) datetimes from day-sorted buckets; runs crossing midnight are joined."""
+    intervals = []
+    for bucket in buckets:
+        for first, last in runs(from_words(bucket["free"])):
+            start = bucket["day"] + timedelta(minutes=first * SLOT_MINUTES)
+            end = bucket["day"] + timedelta(minutes=last * SLOT_MINUTES)
+            if intervals and intervals[-1][1] == start:
+                intervals[-1] = (intervals[-1][0], end)
+            else:
+                intervals.append((start, end))
+    return intervals
+
+
+async def add_free(db, professor_id, start_time, end_time):
+    """Offer [start_time, end_time); False if any of it is already free or booked.
+
+    Spans over several days are applied day by day and rolled back if a
+    later day conflicts.
+    """
+    buckets = db[COLLECTION]
+    spans = day_spans(start_time, end_time)
+    if not spans:
+        raise ValueError("Start time must be earlier than end time")
+    await buckets.bulk_write(
+        [
+            UpdateOne({"_id": bucket_id(professor_id, day)}, {"$setOnInsert": empty_bucket(professor_id, day)}, upsert=True)
+            for day, _, _ in spans
+        ],
+        ordered=False,
+    )
+    applied = []
+    for day, first, last in spans:
+        mask = span_mask(first, last)
+        condition = {"_id": bucket_id(professor_id, day)}
+        for i, positions in _word_positions(mask).items():
+            condition[f"free.{i}"] = {"$bitsAllClear": positions}
+            condition[f"booked.{i}"] = {"$bitsAllClear": positions}
+        result = await buckets.update_one(condition, {"$bit": _bit_update("free", mask, "or")})
+        if not result.modified_count:
+            for applied_day, applied_mask in applied:
+                await buckets.update_one(
+                    {"_id": bucket_id(professor_id, applied_day)}, {"$bit": _bit_update("free", applied_mask, "and")}
+                )
+            return False
+        applied.append((day, mask))
+    return True
+
+
+async def book(db, professor_id, start_time, end_time, session=None):
+    """Move [start_time, end_time) from free to booked in one conditional update.
+
+    Returns False (and changes nothing) unless every slot is still free. The
+    appointment must sit inside one day so the claim stays a single update.
+    """
+    spans = day_spans(start_time, end_time)
+    if len(spans) != 1:
+        raise ValueError("Appointments cannot cross midnight UTC")
+    day, first, last = spans[0]
+    mask = span_mask(first, last)
+    condition = {"_id": bucket_id(professor_id, day)}
+    for i, positions in _word_positions(mask).items():
+        condition[f"free.{i}"] = {"$bitsAllSet": positions}
+    result = await db[COLLECTION].update_one(
+        condition,
+        {"$bit": {**_bit_update("free", mask, "and"), **_bit_update("booked", mask, "or")}},
+        session=session,
+    )
+    return bool(result.modified_count)
+
+
+async def release(db, professor_id, start_time, end_time, session=None):
+    """Move a booking's slots back from booked to free; False if they were not booked."""
+    released = True
+    # Outward, like the migration, so bookings carried over from the interval model line up
+    for day, first, last in day_spans(start_time, end_time, align="outward"):
+        mask = span_mask(first, last)
+        condition = {"_id": bucket_id(professor_id, day)}
+        for i, positions in _word_positions(mask).items():
+            condition[f"booked.{i}"] = {"$bitsAllSet": positions}
+        result = await db[COLLECTION].update_one(
+            condition,
+            {"$bit": {**_bit_update("booked", mask, "and"), **_bit_update("free", mask, "or")}},
+            session=session,
+        )
+        released = released and bool(result.modified_count)
+    return released
+
+
+async def find_buckets(collection, professor_id, from_time=None, to_time=None, session=None):
+    """The professor's buckets for the days overlapping [from_time, to_time), oldest first."""
+    bucket_filter = {"professor_id": professor_id}
+    if from_time is not None:
+        bucket_filter.setdefault("day", {})["$gte"] = day_of(from_time)
+    if to_time is not None:
+        bucket_filter.setdefault("day", {})["$lt"] = naive_utc(to_time)
+    return await collection.find(bucket_filter, {"day": 1, "free": 1}, session=session).sort("day", 1).to_list(length=None)
+
+
+async def find_window(collection, from_time, to_time, professor_ids=None, session=None):
+    """Buckets for the days overlapping [from_time, to_time), of the given professors or everyone.
+
+    Sorted by professor, then day, so each professor's buckets can be fed to free_intervals().
+    """
+    bucket_filter = {"day": {"$gte": day_of(from_time), "$lt": naive_utc(to_time)}}
+    if professor_ids is not None:
+        bucket_filter["professor_id"] = {"$in": list(professor_ids)}
+    return await collection.find(
+        bucket_filter, {"professor_id": 1, "day": 1, "free": 1}, session=session
+    ).sort([("professor_id", 1), ("day", 1)]).to_list(length=None)
@@ -0,0 +1,162 @@
+import asyncio
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from bson import Binary
+from fastapi import HTTPException, Response
+from pymongo import ReturnDocument
+
+from app import config
+from app.cache import MISSING, TTLCache
+from app.read_routing import primary
+from app.responses import dumps
+
+COLLECTION = "idempotency_keys"
+
+# Finished responses by record id, so a retry to the same worker costs no round trip
+_completed = TTLCache(maxsize=config.IDEMPOTENCY_CACHE_MAX_ENTRIES, ttl=config.IDEMPOTENCY_TTL_SECONDS)
+
+# Executions running in this worker; duplicates arriving meanwhile wait on them
+_in_flight = {}
+
+
+def _fingerprint(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _replay(status_code, body):
+    return Response(
+        content=bytes(body), status_code=status_code, media_type="application/json",
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def _check_fingerprint(record, fingerprint):
+    if record["fingerprint"] != fingerprint:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+
+async def _claim(db, record_id, fingerprint):
+    """Claim the key, or return the record another request already holds.
+
+    A single upsert either creates the pending record (returns None) or
+    hands back the existing one, so a finished retry costs one round trip.
+    A pending record whose owner went quiet for IDEMPOTENCY_LOCK_SECONDS is
+    taken over.
+    """
+    now = datetime.utcnow()
+    records = db[COLLECTION]
+    existing = await records.find_one_and_update(
+        {"_id": record_id},
+        {"$setOnInsert": {"state": "pending", "fingerprint": fingerprint, "created_at": now, "claimed_at": now}},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
+    )
+    if existing is None or existing["state"] == "done":
+        return existing
+    if existing["claimed_at"] < now - timedelta(seconds=config.IDEMPOTENCY_LOCK_SECONDS):
+        taken = await records.find_one_and_update(
+            {"_id": record_id, "state": "pending", "claimed_at": existing["claimed_at"]},
+            {"$set": {"claimed_at": now}},
+        )
+        if taken is not None:
+            return None
+    return existing
+
+
+async def _wait_for_other_worker(db, record_id):
+    """Poll a record another worker is executing until it finishes (or give up with 409)."""
+    deadline = asyncio.get_running_loop().time() + config.IDEMPOTENCY_WAIT_SECONDS
+    while asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.05)
+        record = await primary(db, COLLECTION).find_one({"_id": record_id})
+        if record is None:
+            break
+        if record["state"] == "done":
+            return record
+    raise HTTPException(
+        status_code=409, detail="A request with this Idempotency-Key is still in progress",
+        headers={"Retry-After": "1"},
+    )
+
+
+def _remember(record_id, fingerprint, outcome):
+    _completed.set(record_id, {"fingerprint": fingerprint, "status_code": outcome[0], "body": outcome[1]})
+
+
+async def _execute(db, record_id, fingerprint, operation):
+    """Run the operation once and store its outcome; returns (status_code, body bytes)."""
+    try:
+        content = await operation()
+        outcome = (200, dumps(content))
+    except HTTPException as error:
+        if error.status_code >= 500 or error.status_code == 429:
+            # Server errors and rate limiting say nothing about the request; let the client retry for real
+            await db[COLLECTION].delete_one({"_id": record_id})
+            raise
+        # Client errors (e.g. 409 slot taken) are answers too; retries get the same one
+        outcome = (error.status_code, dumps({"detail": error.detail}))
+    except BaseException:
+        # Let the client retry for real
+        await db[COLLECTION].delete_one({"_id": record_id})
+        raise
+    await db[COLLECTION].update_one(
+        {"_id": record_id},
+        {"$set": {"state": "done", "status_code": outcome[0], "body": Binary(outcome[1])}},
+    )
+    _remember(record_id, fingerprint, outcome)
+    return outcome
+
+
+async def run_idempotent(db, key, user_id, route, payload, operation):
+    """Run ``operation`` at most once per (user, route, Idempotency-Key).
+
+    The first request executes and its response is stored in the TTL-indexed
+    ``idempotency_keys`` collection; retries get that response back without
+    re-running any validation or writes. Duplicates arriving while the first
+    is still running wait for it, in-process or, across workers, by polling
+    the record. Without a key the operation simply runs.
+    """
+    if not key:
+        return await operation()
+    fingerprint = _fingerprint(payload)
+    record_id = f"{user_id}:{route}:{key}"
+
+    done = _completed.get(record_id)
+    if done is not MISSING:
+        _check_fingerprint(done, fingerprint)
+        return _replay(done["status_code"], done["body"])
+
+    running = _in_flight.get(record_id)
+    if running is not None:
+        _check_fingerprint(running, fingerprint)
+        status_code, body = await asyncio.shield(running["future"])
+        return _replay(status_code, body)
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[record_id] = {"fingerprint": fingerprint, "future": future}
+    try:
+        record = await _claim(db, record_id, fingerprint)
+        if record is not None:
+            _check_fingerprint(record, fingerprint)
+            if record["state"] != "done":
+                record = await _wait_for_other_worker(db, record_id)
+            outcome = (record["status_code"], bytes(record["body"]))
+            _remember(record_id, fingerprint, outcome)
+            future.set_result(outcome)
+            return _replay(*outcome)
+
+        outcome = await _execute(db, record_id, fingerprint, operation)
+        future.set_result(outcome)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as error:
+        future.set_exception(error)
+        # Waiters re-raise it; mark it retrieved so a future nobody waited on does not log a warning
+        future.exception()
+        raise
+    finally:
+        _in_flight.pop(record_id, None)
+    return Response(content=outcome[1], status_code=outcome[0], media_type="application/json")
@@ -0,0 +1,189 @@
+# Index declarations for the application's collections.
+#
+# The indexes are created (or verified) at startup from app.startup.lifespan.
+# Running `python -m app.indexes` explains every query shape the routes issue
+# and reports the ones the database would answer with a collection scan.
+import asyncio
+import logging
+import sys
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from app import config, times
+
+logger = logging.getLogger(__name__)
+
+
+def time_indexes(epoch):
+    """Indexes for time-based queries, on the integer time fields or on the datetime ones (app/times.py)."""
+    start, end, suffix = ("start_ts", "end_ts", "ts") if epoch else ("start_time", "end_time", "time")
+    return {
+        "availability": [
+            IndexModel(
+                [("professor_id", ASCENDING), (start, ASCENDING), (end, ASCENDING)],
+                name=f"professor_{suffix}",
+            ),
+            # Slots are dropped once they are over; a TTL needs a date, so it is on end_time either way
+            IndexModel(
+                [("end_time", ASCENDING)], name="end_time_ttl", expireAfterSeconds=config.AVAILABILITY_EXPIRE_AFTER_SECONDS
+            ),
+        ],
+        "appointments": [
+            IndexModel(
+                [("professor_id", ASCENDING), ("is_canceled", ASCENDING), (start, ASCENDING), (end, ASCENDING)],
+                name=f"professor_active_{suffix}",
+            ),
+            IndexModel(
+                [("student_id", ASCENDING), ("is_canceled", ASCENDING), (start, ASCENDING)],
+                name=f"student_active_{suffix}",
+            ),
+            # Finds the appointments due for archiving (app/archive.py)
+            IndexModel([(end, ASCENDING)], name=f"end_{suffix}"),
+        ],
+        # History listings read the archive the same way as the hot collection
+        "appointments_archive": [
+            IndexModel(
+                [("professor_id", ASCENDING), ("is_canceled", ASCENDING), (start, ASCENDING)],
+                name=f"professor_active_{suffix}",
+            ),
+            IndexModel(
+                [("student_id", ASCENDING), ("is_canceled", ASCENDING), (start, ASCENDING)],
+                name=f"student_active_{suffix}",
+            ),
+        ],
+    }
+
+
+INDEXES = {
+    "users": [
+        IndexModel([("username", ASCENDING)], name="username_unique", unique=True),
+    ],
+    # Only the set the queries use is kept up; drop the other after switching EPOCH_TIME_QUERIES
+    **time_indexes(config.EPOCH_TIME_QUERIES),
+    # Stored Idempotency-Key responses expire on their own (app/idempotency.py)
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=config.IDEMPOTENCY_TTL_SECONDS),
+    ],
+    # Compaction leases left behind by a worker that died mid-pass (app/compaction.py)
+    "compaction_leases": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    # Resume tokens of worker slots no longer in use (app/change_stream.py)
+    "change_stream_tokens": [
+        IndexModel(
+            [("updated_at", ASCENDING)], name="updated_at_ttl", expireAfterSeconds=config.CHANGE_STREAM_TOKEN_TTL_SECONDS
+        ),
+    ],
+    # Only used with SCHEDULE_STORAGE=day_buckets; bookings address buckets by _id
+    "day_buckets": [
+        IndexModel([("professor_id", ASCENDING), ("day", ASCENDING)], name="professor_day", unique=True),
+        # Slot searches across every professor (app/routes/search.py)
+        IndexModel([("day", ASCENDING)], name="day"),
+    ],
+}
+
+
+async def ensure_indexes(db):
+    """Create any missing indexes and check that existing ones match the declarations.
+
+    Returns a list of problems (an empty list means every index is in place).
+    """
+    problems = []
+    for collection_name, models in INDEXES.items():
+        collection = db[collection_name]
+        try:
+            await collection.create_indexes(models)
+        except OperationFailure as error:
+            # Typically an index with the same name but different keys/options already exists
+            problems.append(f"{collection_name}: {error}")
+            continue
+
+        existing = await collection.index_information()
+        for model in models:
+            spec = model.document
+            info = existing.get(spec["name"])
+            if info is None:
+                problems.append(f"{collection_name}: index {spec['name']} is missing")
+            elif list(info["key"]) != list(spec["key"].items()):
+                problems.append(f"{collection_name}: index {spec['name']} has keys {info['key']}")
+
+    for problem in problems:
+        logger.error("Index check failed: %s", problem)
+    return problems
+
+
+def _query_shapes():
+    """Representative (collection, filter, sort) tuples for every query the routes run."""
+    some_id = ObjectId()
+    now = datetime.utcnow()
+    start, end, at = times.field("start"), times.field("end"), times.key(now)
+    return [
+        ("users", {"username": "student1"}, None),
+        ("users", {"_id": some_id, "role": "professor"}, None),
+        ("availability", {"professor_id": some_id}, None),
+        ("availability", {"professor_id": some_id, start: {"$lt": at}, end: {"$gt": at}}, [(start, 1), ("_id", 1)]),
+        ("appointments", {"professor_id": some_id, "is_canceled": False}, None),
+        ("appointments", {"student_id": some_id, "is_canceled": False, start: {"$gte": at}}, [(start, 1), ("_id", 1)]),
+        (
+            "appointments",
+            {"professor_id": some_id, start: {"$lt": at}, end: {"$gt": at}, "is_canceled": False},
+            None,
+        ),
+        ("appointments", {end: {"$lt": at}}, [("_id", 1)]),
+        (
+            "appointments_archive",
+            {"student_id": some_id, "is_canceled": False, start: {"$lt": at}},
+            [(start, -1), ("_id", -1)],
+        ),
+        ("day_buckets", {"professor_id": some_id, "day": {"$gte": now, "$lt": now}}, [("day", 1)]),
+        ("day_buckets", {"day": {"$gte": now, "$lt": now}}, [("professor_id", 1), ("day", 1)]),
+    ]
+
+
+def _plan_stages(plan):
+    stages = [plan.get("stage")]
+    for child_key in ("inputStage", "queryPlan"):
+        if child_key in plan:
+            stages.extend(_plan_stages(plan[child_key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+async def find_unindexed_queries(db):
+    """Return (collection, filter, stages) for every query shape that would collection-scan."""
+    unindexed = []
+    for collection_name, query, sort in _query_shapes():
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        explanation = await cursor.explain()
+        stages = _plan_stages(explanation["queryPlanner"]["winningPlan"])
+        if "COLLSCAN" in stages:
+            unindexed.append((collection_name, query, stages))
+    return unindexed
+
+
+async def _main():
+    from app.db import close, connect
+
+    db = connect()[config.MONGO_DB_NAME]
+    try:
+        unindexed = await find_unindexed_queries(db)
+    finally:
+        close()
+
+    for collection_name, query, stages in unindexed:
+        print(f"{collection_name}: {query} -> {' <- '.join(str(stage) for stage in stages)}")
+    if unindexed:
+        print(f"{len(unindexed)} query shape(s) are not index-covered")
+        return 1
+    print("All query shapes use an index")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(_main()))
@@ -1,18 +1,77 @@
+import time
+
+# Measured so worker start-up can be kept within budget during rolling restarts
+_IMPORT_STARTED = time.perf_counter()
+
 from fastapi import FastAPI
-from app.routes import auth, available, appointments
-from app.db import get_db  # Assuming get_db handles the MongoDB connection setup
+from starlette.exceptions import HTTPException
+from fastapi.responses import PlainTextResponse
+from app.routes import auth, available, appointments, search
+from app.db import pool_stats
+from app.startup import lifespan, record_import_time
+from app import startup
+from app.admission import AdmissionMiddleware
+from app.metrics import Gauge, MetricsMiddleware, render
+from app.read_routing import CausalPositionMiddleware
+from app.responses import FastJSONResponse
+from app.structured_logging import RequestContextMiddleware, configure_logging
+from app.users import user_cache
+
+# Log records are written by a background thread, never on the request path
+configure_logging()
+
+# The lifespan hook opens the shared MongoDB connection pool and warms caches at startup;
+# every route serializes with orjson unless it picks another response class
+application = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
+
+# Error details may carry datetimes (e.g. conflicting slots), so they go through orjson as well
+@application.exception_handler(HTTPException)
+async def http_exception_handler(request, exc):
+    return FastJSONResponse({"detail": exc.detail}, status_code=exc.status_code, headers=exc.headers)
+
 
-application = FastAPI()
+# Read-your-writes positions travel with the client (X-Causal-Position), so any worker can honour them
+application.add_middleware(CausalPositionMiddleware)
+
+# Global in-flight cap; added before the metrics middleware so shed requests are still measured
+application.add_middleware(AdmissionMiddleware)
+
+# Per-route latency, status and Mongo round-trip metrics
+application.add_middleware(MetricsMiddleware)
+
+# Outermost: a request id (and route timing) on every log line, including for shed requests
+application.add_middleware(RequestContextMiddleware)
 
 # Register the routes
 application.include_router(auth.router)
 application.include_router(available.router)
 application.include_router(appointments.router)
+application.include_router(search.router)
+application.include_router(startup.router)
+
+
+# Connection pool statistics for monitoring
+@application.get("/poolstats")
+def get_pool_stats():
+    return pool_stats()
 
-# If you're using MongoDB, you don't need to run `Base.metadata.create_all(bind=engine)`
-# Remove that line, as it relates to SQLAlchemy and wouldn't be needed for MongoDB.
 
+# User cache hit/miss counters for monitoring
+@application.get("/cachestats")
+def get_cache_stats():
+    return {"users": user_cache.stats()}
 
 
+# Prometheus scrape endpoint
+@application.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    pool = Gauge("mongo_pool", "MongoDB connection pool statistics", labels=("stat",))
+    for stat, value in pool_stats().items():
+        pool.set(stat, value=value)
+    cache = Gauge("user_cache", "User cache statistics", labels=("stat",))
+    for stat, value in user_cache.stats().items():
+        cache.set(stat, value=value)
+    return PlainTextResponse(render([pool, cache]), media_type="text/plain; version=0.0.4")
 
 
+record_import_time(time.perf_counter() - _IMPORT_STARTED)
@@ -0,0 +1,204 @@
+import bisect
+import contextvars
+import threading
+import time
+
+from pymongo import monitoring
+from starlette.routing import Match
+
+# Default latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{str(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for label_values, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, *label_values, value):
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for label_values, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labels + ("le",), label_values + (bound,))
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.labels + ("le",), label_values + ("+Inf",))
+                lines.append(f"{self.name}_bucket{labels} {count}")
+                base = _format_labels(self.labels, label_values)
+                lines.append(f"{self.name}_sum{base} {total}")
+                lines.append(f"{self.name}_count{base} {count}")
+        return lines
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+http_request_duration = register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route", labels=("method", "route")
+))
+http_responses = register(Counter(
+    "http_responses_total", "HTTP responses by route and status", labels=("method", "route", "status")
+))
+mongo_command_duration = register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency", labels=("collection", "command")
+))
+mongo_command_failures = register(Counter(
+    "mongo_command_failures_total", "Failed MongoDB commands", labels=("collection", "command")
+))
+mongo_round_trips = register(Histogram(
+    "mongo_round_trips_per_request", "MongoDB commands issued while serving one request",
+    labels=("method", "route"), buckets=ROUND_TRIP_BUCKETS,
+))
+
+# Per-request command counter; Motor copies the context into its executor
+# threads, so the command listener sees the request that issued the command.
+_request_round_trips = contextvars.ContextVar("request_round_trips", default=None)
+
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """Records per-collection/per-command latency and counts round trips per request."""
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _collection(event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        return target if isinstance(target, str) else ""
+
+    def started(self, event):
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = self._collection(event)
+        counter = _request_round_trips.get()
+        if counter is not None:
+            counter[0] += 1
+
+    def _finish(self, event):
+        with self._lock:
+            return self._pending.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event):
+        collection = self._finish(event)
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+
+    def failed(self, event):
+        collection = self._finish(event)
+        mongo_command_duration.observe(event.duration_micros / 1e6, collection, event.command_name)
+        mongo_command_failures.inc(collection, event.command_name)
+
+
+command_metrics_listener = CommandMetricsListener()
+
+
+def route_template(app, scope):
+    # Label by route template (e.g. /appointments/{appointmentid}) to keep cardinality bounded
+    for route in getattr(app, "routes", []):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, status and Mongo round trips per route."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+        round_trips = [0]
+        token = _request_round_trips.set(round_trips)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _request_round_trips.reset(token)
+            method = scope["method"]
+            route = route_template(scope.get("app"), scope)
+            http_request_duration.observe(elapsed, method, route)
+            http_responses.inc(method, route, status["code"])
+            mongo_round_trips.observe(round_trips[0], method, route)
+
+
+def render(extra_gauges=()):
+    """Prometheus text exposition of every registered metric plus ``extra_gauges``."""
+    lines = []
+    for metric in list(REGISTRY) + list(extra_gauges):
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
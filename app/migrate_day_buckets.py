@@ -0,0 +1,96 @@
+# Builds the day_buckets collection from availability and appointments.
+#
+#   python -m app.migrate_day_buckets                 # every professor
+#   python -m app.migrate_day_buckets --professor <id> --dry-run
+#
+# Each professor's buckets are rebuilt from scratch and written with one
+# bulk upsert, so the tool can be re-run (or resumed after a failure) at any
+# time. Availability off the slot grid is shrunk to whole slots and
+# appointments are grown to whole slots; time covered by both counts as
+# booked. Run it with writes to the interval collections stopped, then switch
+# SCHEDULE_STORAGE to day_buckets.
+import argparse
+import asyncio
+import sys
+from collections import defaultdict
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+from app import day_buckets
+
+
+def build_buckets(professor_id, slots, bookings):
+    """Bucket documents for one professor from its availability and active appointments."""
+    masks = defaultdict(lambda: [0, 0])
+    for slot in slots:
+        for day, first, last in day_buckets.day_spans(slot["start_time"], slot["end_time"], align="inward"):
+            masks[day][0] |= day_buckets.span_mask(first, last)
+    for booking in bookings:
+        for day, first, last in day_buckets.day_spans(booking["start_time"], booking["end_time"], align="outward"):
+            masks[day][1] |= day_buckets.span_mask(first, last)
+
+    buckets = []
+    for day, (free, booked) in sorted(masks.items()):
+        bucket = day_buckets.empty_bucket(professor_id, day)
+        bucket["free"] = day_buckets.to_words(free & ~booked)
+        bucket["booked"] = day_buckets.to_words(booked)
+        buckets.append(bucket)
+    return buckets
+
+
+async def migrate_professor(db, professor_id, dry_run=False):
+    """Rebuild one professor's buckets; returns how many were written."""
+    projection = {"start_time": 1, "end_time": 1}
+    slots, bookings = await asyncio.gather(
+        db["availability"].find({"professor_id": professor_id}, projection).to_list(length=None),
+        db["appointments"].find(
+            # Appointments from before the datetime migration still hold strings; they are history only
+            {"professor_id": professor_id, "is_canceled": False, "start_time": {"$type": "date"}}, projection
+        ).to_list(length=None),
+    )
+    buckets = build_buckets(professor_id, slots, bookings)
+    if buckets and not dry_run:
+        await db[day_buckets.COLLECTION].bulk_write(
+            [ReplaceOne({"_id": bucket["_id"]}, bucket, upsert=True) for bucket in buckets], ordered=False
+        )
+    return len(buckets)
+
+
+async def migrate(db, professor_ids=None, dry_run=False):
+    """Migrate the given professors (default: everyone with availability or appointments)."""
+    if professor_ids is None:
+        with_slots, with_bookings = await asyncio.gather(
+            db["availability"].distinct("professor_id"), db["appointments"].distinct("professor_id")
+        )
+        professor_ids = sorted(set(with_slots) | set(with_bookings))
+    written = 0
+    for professor_id in professor_ids:
+        written += await migrate_professor(db, professor_id, dry_run=dry_run)
+    return len(professor_ids), written
+
+
+async def _main(args):
+    from app import config
+    from app.db import close, connect
+    from app.indexes import ensure_indexes
+
+    db = connect()[config.MONGO_DB_NAME]
+    try:
+        if not args.dry_run:
+            await ensure_indexes(db)
+        professor_ids = [ObjectId(args.professor)] if args.professor else None
+        professors, written = await migrate(db, professor_ids, dry_run=args.dry_run)
+    finally:
+        close()
+
+    verb = "would write" if args.dry_run else "wrote"
+    print(f"{professors} professor(s), {verb} {written} day bucket(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build day_buckets from availability and appointments")
+    parser.add_argument("--professor", help="only migrate this professor id")
+    parser.add_argument("--dry-run", action="store_true", help="build the buckets without writing them")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
@@ -0,0 +1,146 @@
+# Fills in the integer start_ts/end_ts fields (app/times.py) on availability,
+# appointments and appointments_archive documents written before they existed.
+#
+#   python -m app.migrate_epoch_times                       # every collection
+#   python -m app.migrate_epoch_times --collection appointments --batch-size 200 --pause 0.5
+#   python -m app.migrate_epoch_times --dry-run
+#
+# It runs online, next to the service. New writes already carry both fields,
+# and every batch update only applies while a document still has the times it
+# was read with, so a booking or cancel made meanwhile is never overwritten;
+# documents changed under it are picked up by another pass. Appointments
+# still holding ISO-string times get datetime display fields too.
+#
+# The last _id done is saved in ``migration_progress`` after each batch, so an
+# interrupted run continues where it stopped (--restart ignores that). When a
+# collection is done its integer-field indexes are built. Once the run
+# reports 0 still without integer times for every collection (exit status 0),
+# set EPOCH_TIME_QUERIES=true and drop the old *_time indexes.
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from app import times
+from app.indexes import time_indexes
+
+COLLECTIONS = ("availability", "appointments", "appointments_archive")
+PROGRESS_COLLECTION = "migration_progress"
+MAX_PASSES = 5
+
+_MISSING_FIELDS = {"$or": [{"start_ts": {"$exists": False}}, {"end_ts": {"$exists": False}}]}
+
+
+def converted(document):
+    """The $set bringing one document to the canonical form, or None if its times cannot be read."""
+    try:
+        return times.bounds(document["start_time"], document["end_time"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+async def _migrate_pass(db, name, batch_size, pause, dry_run, resume_after=None):
+    collection = db[name]
+    progress_id = f"epoch_times:{name}"
+    counts = {"updated": 0, "changed": 0, "unreadable": 0}
+    last_id = resume_after
+    while True:
+        query = dict(_MISSING_FIELDS)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        batch = await collection.find(query, {"start_time": 1, "end_time": 1}).sort("_id", 1).limit(
+            batch_size
+        ).to_list(length=None)
+        if not batch:
+            return counts
+
+        updates = []
+        for document in batch:
+            fields = converted(document)
+            if fields is None:
+                counts["unreadable"] += 1
+                continue
+            updates.append(UpdateOne(
+                {"_id": document["_id"], "start_time": document["start_time"], "end_time": document["end_time"]},
+                {"$set": fields},
+            ))
+        last_id = batch[-1]["_id"]
+
+        if dry_run:
+            counts["updated"] += len(updates)
+        else:
+            if updates:
+                result = await collection.bulk_write(updates, ordered=False)
+                counts["updated"] += result.modified_count
+                counts["changed"] += len(updates) - result.matched_count
+            await db[PROGRESS_COLLECTION].update_one(
+                {"_id": progress_id}, {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}}, upsert=True
+            )
+        if pause:
+            # Leave the primary room for the service between batches
+            await asyncio.sleep(pause)
+
+
+async def migrate_collection(db, name, batch_size=500, pause=0.0, dry_run=False, restart=False):
+    """Migrate one collection in batches; returns counts of updated and unreadable documents.
+
+    Passes repeat (up to MAX_PASSES) while documents keep changing under the
+    migration, then the integer-field indexes are built.
+    """
+    progress_id = f"epoch_times:{name}"
+    saved = None if restart or dry_run else await db[PROGRESS_COLLECTION].find_one({"_id": progress_id})
+    resume_after = saved["last_id"] if saved else None
+
+    totals = {"updated": 0, "unreadable": 0, "passes": 0}
+    for _ in range(MAX_PASSES):
+        counts = await _migrate_pass(db, name, batch_size, pause, dry_run, resume_after)
+        totals["updated"] += counts["updated"]
+        totals["unreadable"] = counts["unreadable"]
+        totals["passes"] += 1
+        resume_after = None
+        if not counts["changed"]:
+            break
+
+    if not dry_run:
+        await db[PROGRESS_COLLECTION].delete_one({"_id": progress_id})
+        await db[name].create_indexes(time_indexes(True)[name])
+    totals["remaining"] = await db[name].count_documents(_MISSING_FIELDS)
+    return totals
+
+
+async def migrate(db, collections=COLLECTIONS, **options):
+    return {name: await migrate_collection(db, name, **options) for name in collections}
+
+
+async def _main(args):
+    from app import config
+    from app.db import close, connect
+
+    db = connect()[config.MONGO_DB_NAME]
+    try:
+        results = await migrate(
+            db, [args.collection] if args.collection else COLLECTIONS,
+            batch_size=args.batch_size, pause=args.pause, dry_run=args.dry_run, restart=args.restart,
+        )
+    finally:
+        close()
+
+    verb = "would update" if args.dry_run else "updated"
+    for name, totals in results.items():
+        print(
+            f"{name}: {verb} {totals['updated']} document(s) in {totals['passes']} pass(es); "
+            f"{totals['unreadable']} with unreadable times, {totals['remaining']} still without integer times"
+        )
+    return 1 if any(totals["remaining"] for totals in results.values()) and not args.dry_run else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add integer UTC times to availability and (archived) appointments")
+    parser.add_argument("--collection", choices=COLLECTIONS, help="only migrate this collection")
+    parser.add_argument("--batch-size", type=int, default=500, help="documents read and updated per batch")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true", help="count what would change without writing")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress and start from the beginning")
+    sys.exit(asyncio.run(_main(parser.parse_args())))
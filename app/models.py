@@ -1,7 +1,8 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 from bson import ObjectId
 from datetime import datetime
 from typing import Literal, Optional
+from app.times import to_utc
 
 class ObjectIdStr(ObjectId):
     @classmethod
@@ -19,28 +20,28 @@ class ObjectIdStr(ObjectId):
                 raise ValueError(f"Value '{value}' is not a valid ObjectId string")
         raise ValueError(f"Value '{value}' is not a valid ObjectId")
 
+    @classmethod
+    def __modify_schema__(cls, field_schema):
+        field_schema.update(type="string", pattern="^[0-9a-f]{24}$")
+
 class User(BaseModel):
     username: str
     password: str
     role: Literal["student", "professor"]
 
-    class Config:
-        json_encoders = {ObjectId: str}
-
+# Times may arrive with any UTC offset; past the models everything is naive UTC (app/times.py)
 class Availability(BaseModel):
     professor_id: ObjectIdStr
     start_time: datetime
     end_time: datetime
 
-    class Config:
-        json_encoders = {ObjectId: str}
+    _utc = validator("start_time", "end_time", allow_reuse=True)(to_utc)
 
 class Appointment(BaseModel):
     professor_id: ObjectIdStr
     student_id: ObjectIdStr
-    start_time: str
-    end_time: str
+    start_time: datetime
+    end_time: datetime
     is_canceled: Optional[bool] = False
 
-    class Config:
-        json_encoders = {ObjectId: str}
+    _utc = validator("start_time", "end_time", allow_reuse=True)(to_utc)
@@ -0,0 +1,43 @@
+import base64
+import json
+
+from bson import ObjectId
+
+from app import times
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort_value, document_id):
+    """Opaque keyset cursor for the (sort_value, _id) position of the last returned document.
+
+    The sort value is a time, carried as epoch seconds whichever field the query sorted on.
+    """
+    payload = json.dumps({"t": times.epoch(sort_value), "id": str(document_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # Cursors handed out before the switch to epoch seconds hold an ISO string
+        return times.epoch(payload["t"]), ObjectId(payload["id"])
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+
+
+def keyset_filter(field, cursor, descending=False):
+    """Mongo filter selecting documents strictly after the cursor position in (field, _id) order.
+
+    ``field`` is a time field as chosen by times.field().
+    """
+    sort_value, document_id = decode_cursor(cursor)
+    sort_value = times.key(sort_value)
+    op = "$lt" if descending else "$gt"
+    return {"$or": [
+        {field: {op: sort_value}},
+        {field: sort_value, "_id": {op: document_id}},
+    ]}
@@ -0,0 +1,185 @@
+# Read routing and read-your-writes.
+#
+# Browsing reads go to secondaries. So that users still see their own
+# writes, the causal position (cluster time, operation time) of each write
+# session is handed back to the client in an X-Causal-Position response
+# header. The client sends the latest one it received with its next
+# requests, and whichever worker serves them makes its secondary reads wait
+# for that position. Positions are HMAC-signed with CAUSAL_TOKEN_SECRET,
+# name the users the write concerned and expire after CAUSAL_TTL_SECONDS,
+# so a client can neither forge one nor present another user's.
+#
+# Clients that do not echo the header still get read-your-writes from the
+# worker that took their write, which keeps positions in memory as well.
+import base64
+import contextvars
+import hashlib
+import hmac
+import time
+from contextlib import asynccontextmanager
+
+import bson
+from pymongo import ReadPreference
+
+from app import config
+from app.cache import MISSING, TTLCache
+
+POSITION_HEADER = "X-Causal-Position"
+
+# Causal position of each user's latest write through this worker, keyed by
+# the JWT subject. Entries only need to outlive replication lag; after that
+# any secondary has the write anyway.
+_write_positions = TTLCache(maxsize=config.CAUSAL_MAX_USERS, ttl=config.CAUSAL_TTL_SECONDS)
+
+# The position the client sent with this request and the one to send back
+_request_positions = contextvars.ContextVar("request_positions", default=None)
+
+
+def primary(db, name):
+    """Collection whose reads go to the primary, for checks a write decision depends on."""
+    return db.get_collection(name, read_preference=ReadPreference.PRIMARY)
+
+
+def browsing(db, name):
+    """Collection whose reads may be served by a secondary."""
+    return db.get_collection(name, read_preference=ReadPreference.SECONDARY_PREFERRED)
+
+
+def _signature(payload):
+    return hmac.new(config.CAUSAL_TOKEN_SECRET.encode(), payload, hashlib.sha256).digest()
+
+
+def encode_position(user_ids, cluster_time, operation_time, issued_at=None):
+    """Signed X-Causal-Position value for a write concerning ``user_ids``."""
+    payload = bson.encode({
+        "u": [str(user_id) for user_id in user_ids],
+        "c": cluster_time,
+        "o": operation_time,
+        "t": int(time.time() if issued_at is None else issued_at),
+    })
+    return base64.urlsafe_b64encode(payload + _signature(payload)).decode().rstrip("=")
+
+
+def decode_position(token, user_id):
+    """(cluster time, operation time) from an X-Causal-Position value, or MISSING.
+
+    MISSING unless the token is intact, names ``user_id`` and is recent.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload, signature = raw[:-32], raw[-32:]
+        if not hmac.compare_digest(signature, _signature(payload)):
+            return MISSING
+        position = bson.decode(payload)
+    except Exception:
+        return MISSING
+    if str(user_id) not in position["u"] or time.time() - position["t"] > config.CAUSAL_TTL_SECONDS:
+        return MISSING
+    return position["c"], position["o"]
+
+
+def _remember(session, user_ids):
+    if session.cluster_time is None or session.operation_time is None:
+        return
+    for user_id in user_ids:
+        seen = _write_positions.peek(str(user_id))
+        if seen is not MISSING and seen[1] >= session.operation_time:
+            continue
+        _write_positions.set(str(user_id), (session.cluster_time, session.operation_time))
+    positions = _request_positions.get()
+    if positions is not None:
+        positions["outgoing"] = encode_position(user_ids, session.cluster_time, session.operation_time)
+
+
+def _latest_position(user_id):
+    """The later of this worker's position for the user and the one the client sent, or MISSING."""
+    seen = _write_positions.get(str(user_id))
+    positions = _request_positions.get()
+    if positions is not None and positions["incoming"]:
+        carried = decode_position(positions["incoming"], user_id)
+        if carried is not MISSING and (seen is MISSING or carried[1] > seen[1]):
+            return carried
+    return seen
+
+
+def carries_newer_position(user_id):
+    """Whether the client sent a position for the user later than any write this worker took for them.
+
+    Such a write went through another worker, and this worker's schedule
+    versions may not have caught up with it yet, so an ETag match proves nothing.
+    """
+    positions = _request_positions.get()
+    if positions is None or not positions["incoming"]:
+        return False
+    carried = decode_position(positions["incoming"], user_id)
+    if carried is MISSING:
+        return False
+    seen = _write_positions.peek(str(user_id))
+    return seen is MISSING or carried[1] > seen[1]
+
+
+@asynccontextmanager
+async def write_session(db, *user_ids):
+    """Causally consistent session whose writes the given users must read back.
+
+    A session must not be shared by operations running concurrently, so
+    gathered writes each take their own.
+    """
+    if not config.CAUSAL_READS:
+        yield None
+        return
+    async with await db.client.start_session(causal_consistency=True) as session:
+        try:
+            yield session
+        finally:
+            _remember(session, user_ids)
+
+
+@asynccontextmanager
+async def read_session(db, user_id):
+    """Session that makes a secondary read wait for the user's own latest write.
+
+    Yields None (a plain read, no session) when neither this worker nor the
+    client knows of a recent write by the user.
+    """
+    seen = _latest_position(user_id) if config.CAUSAL_READS else MISSING
+    if seen is MISSING:
+        yield None
+        return
+    async with await db.client.start_session(causal_consistency=True) as session:
+        cluster_time, operation_time = seen
+        session.advance_cluster_time(cluster_time)
+        session.advance_operation_time(operation_time)
+        yield session
+
+
+class CausalPositionMiddleware:
+    """ASGI middleware carrying X-Causal-Position between the client and the sessions above."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = None
+        for name, value in scope["headers"]:
+            if name == b"x-causal-position":
+                incoming = value.decode("latin-1")[:1024]
+                break
+        positions = {"incoming": incoming, "outgoing": None}
+        token = _request_positions.set(positions)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and positions["outgoing"]:
+                message["headers"] = list(message.get("headers", [])) + [
+                    (POSITION_HEADER.lower().encode(), positions["outgoing"].encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_positions.reset(token)
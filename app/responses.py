@@ -0,0 +1,38 @@
+import orjson
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+
+
+def _default(value):
+    # orjson handles datetime natively; ObjectId is the only Mongo type the routes hand back as-is
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content):
+    """Serialize to JSON bytes; naive datetimes come out in isoformat like jsonable_encoder did."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """Default response class: orjson with native ObjectId and datetime support."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def prebuilt(content, response=None, status_code=200):
+    """Return ``content`` as a ready FastJSONResponse.
+
+    FastAPI passes a route's return value through ``jsonable_encoder`` and,
+    with a ``response_model``, through validation. Handing it a Response
+    skips both, so the declared model only documents the shape. Headers
+    set on the injected ``response`` (e.g. ETag) are carried over.
+    """
+    prepared = FastJSONResponse(content, status_code=status_code)
+    if response is not None:
+        for name, value in response.raw_headers:
+            if name not in (b"content-length", b"content-type"):
+                prepared.raw_headers.append((name, value))
+    return prepared
@@ -1,15 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from app.models import Appointment
 from app.db import get_db  # MongoDB connection
+from app.schedule_index import schedule_index
+from app.compaction import restore_interval
+from app import config, day_buckets, times
+from app.users import find_user_by_id
+from app.schedule_version import etag_matches, expiring, fresh_expiring_etag, schedule_versions
+from app.pagination import InvalidCursor, encode_cursor, keyset_filter
+from app.admission import booking_gate, check_write_rate
+from app import archive
+from app.idempotency import run_idempotent
+from app.read_routing import browsing, carries_newer_position, primary, read_session, write_session
+from app.responses import dumps, prebuilt
+from app.schemas import AppointmentPage
 from datetime import datetime
+from typing import Literal, Optional
 from fastapi_jwt_auth import AuthJWT
 from pydantic import BaseModel
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from pymongo import DeleteOne, InsertOne, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
 from contextlib import contextmanager
 import logging
 import os
-import pytz
 from app.db import get_db
 
 
@@ -32,122 +48,258 @@ def get_config():
 # APIRouter for Appointment-related routes
 router = APIRouter()
 
+
+async def _noop():
+    return None
+
+
+async def _claim_slot(db, schedule, professor_id, start_time, end_time, session=None):
+    """Shrink the covering availability slot to the part before the appointment.
+
+    The update only matches while the slot still covers [start_time, end_time),
+    so of two concurrent bookings for overlapping times exactly one wins.
+    Returns the original slot document (or None if nothing covers the request)
+    together with the schedule it was checked against.
+    """
+    for attempt in range(2):
+        covering_slot = schedule.free_slot_for(start_time, end_time)
+        if covering_slot is not None:
+            claimed = await db["availability"].find_one_and_update(
+                {
+                    "_id": covering_slot[0],
+                    times.field("start"): {"$lte": times.key(start_time)},
+                    times.field("end"): {"$gte": times.key(end_time)},
+                },
+                {"$set": times.bounds(end=start_time)},
+                return_document=ReturnDocument.BEFORE,
+                session=session,
+            )
+            if claimed is not None:
+                return claimed, schedule
+        if attempt == 0:
+            # The index was stale (another request changed the slot); reload and try once more
+            schedule = await schedule_index.get(db, professor_id, refresh=True)
+            if schedule.has_booking_overlap(start_time, end_time):
+                break
+    return None, schedule
+
+
+def _remainder_ops(slot, professor_id, start_time, end_time):
+    """Bulk operations that turn a claimed slot into whatever is left around the appointment.
+
+    The claim already cut the slot down to [slot start, start_time); this only
+    has to drop it when that part is empty and add the part after end_time.
+    Returns the operations and the id of the new document holding the part
+    after end_time, if one is inserted.
+    """
+    ops = []
+    inserted_id = None
+    if slot["start_time"] == start_time:
+        if slot["end_time"] > end_time:
+            # Case 2: Shrink the slot to start after the appointment
+            ops.append(UpdateOne({"_id": slot["_id"]}, {"$set": times.bounds(end_time, slot["end_time"])}))
+        else:
+            # Remove the exact match slot (fully booked)
+            ops.append(DeleteOne({"_id": slot["_id"]}))
+    elif slot["end_time"] > end_time:
+        # Case 1: Split the availability into two parts
+        inserted_id = ObjectId()
+        ops.append(InsertOne({
+            "_id": inserted_id,
+            "professor_id": professor_id,
+            **times.bounds(end_time, slot["end_time"]),
+        }))
+    # Case 3 (slot ends with the appointment) is fully handled by the claim
+    return ops, inserted_id
+
+
+async def _book_from_day_buckets(db, appointment, start_time, end_time):
+    """Steps 5-8 for SCHEDULE_STORAGE=day_buckets: one conditional bitmap update claims the time."""
+    async with write_session(db, appointment.student_id, appointment.professor_id) as session:
+        try:
+            claimed = await day_buckets.book(db, appointment.professor_id, start_time, end_time, session=session)
+        except ValueError as error:
+            raise HTTPException(status_code=400, detail=str(error))
+        if not claimed:
+            raise HTTPException(status_code=409, detail="The requested time is not free in the professor's schedule.")
+
+        new_appointment = {
+            "professor_id": appointment.professor_id,
+            "student_id": appointment.student_id,
+            **times.bounds(start_time, end_time),
+            "is_canceled": False
+        }
+        try:
+            result = await db["appointments"].insert_one(new_appointment, session=session)
+        except Exception:
+            await day_buckets.release(db, appointment.professor_id, start_time, end_time)
+            raise
+    schedule_versions.bump(appointment.professor_id, appointment.student_id)
+    return result.inserted_id
+
+
+async def _release_claim(db, slot, new_appointment, start_time, end_time, remainder_id):
+    """Undo a partially applied booking: give back [start_time, end_time) and any unwritten remainder.
+
+    Only what this booking took is put back, as slots of their own; the claimed
+    slot is never reset to its original bounds, since another booking may have
+    claimed what the claim left of it in the meantime.
+    """
+    if "_id" in new_appointment:
+        await db["appointments"].delete_one({"_id": new_appointment["_id"]})
+    if slot["start_time"] == start_time:
+        # The claim left the slot empty for the remainder write to fill; if that never
+        # happened, the slot can simply take back the booked time and the remainder
+        restored = await db["availability"].update_one(
+            {"_id": slot["_id"], **times.matches({"start_time": start_time, "end_time": start_time})},
+            {"$set": times.bounds(start_time, slot["end_time"])},
+        )
+        if restored.matched_count:
+            return
+    elif remainder_id is not None:
+        try:
+            await db["availability"].insert_one({
+                "_id": remainder_id,
+                "professor_id": slot["professor_id"],
+                **times.bounds(end_time, slot["end_time"]),
+            })
+        except DuplicateKeyError:
+            pass  # The remainder was written
+    await restore_interval(db, slot["professor_id"], start_time, end_time)
+
 # Appointment Booking Route
 @router.post("/appointments")
-def book_appointment(
+async def book_appointment(
     appointment: Appointment,
-    db: MongoClient = Depends(get_db),
-    Authorize: AuthJWT = Depends()
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    Authorize: AuthJWT = Depends(),
+    idempotency_key: Optional[str] = Header(None),
 ):
+    if idempotency_key:
+        Authorize.jwt_required()
+    user_id = Authorize.get_jwt_subject()
+
+    async def gated():
+        # Only a booking that actually runs is rate limited; a retry answered from the stored response is not
+        check_write_rate(user_id or request.client.host)
+        # Competing bookings for one professor queue here, so each sees the previous winner
+        # in the schedule index and the losers are rejected without another Mongo round trip
+        async with booking_gate.enter(str(appointment.professor_id)):
+            return await _book_appointment(appointment, db, Authorize)
+
+    # A retry carrying the same Idempotency-Key gets the first attempt's response back
+    return await run_idempotent(
+        db, idempotency_key, user_id, "POST /appointments", appointment.dict(), gated
+    )
+
+
+async def _book_appointment(appointment, db, Authorize):
     try:
         # Step 1: Ensure the user is authorized
         Authorize.jwt_required()
         student_id = str(Authorize.get_jwt_subject())  # JWT subject is the student ID
         user_role = Authorize.get_raw_jwt().get("role")
-        print(student_id)
 
         if user_role != "student":
             raise HTTPException(status_code=403, detail="Only students can book appointments")
 
         # Step 2: Verify the professor exists
-        professor = db["users"].find_one({"_id": ObjectId(appointment.professor_id), "role": "professor"})
-        if not professor:
+        professor = await find_user_by_id(db, appointment.professor_id)
+        if not professor or professor["role"] != "professor":
             raise HTTPException(status_code=404, detail="Professor not found")
 
         # Step 3: Ensure the student is booking for themselves
         if student_id != str(appointment.student_id):
             raise HTTPException(status_code=403, detail="You can only book appointments for yourself")
 
-        # Step 4: Validate the time slot provided
-        try:
-            start_time = datetime.fromisoformat(appointment.start_time)
-            end_time = datetime.fromisoformat(appointment.end_time)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Invalid time format for start_time or end_time")
-
+        # Step 4: Validate the time slot provided (the model has already normalized it to UTC)
+        start_time, end_time = appointment.start_time, appointment.end_time
         if start_time >= end_time:
             raise HTTPException(status_code=400, detail="Start time must be earlier than end time")
 
-        # Step 5: Check professor's availability for the requested slot
-        available_slots = list(db["availability"].find({"professor_id": appointment.professor_id}))
+        if config.SCHEDULE_STORAGE == "day_buckets":
+            appointment_id = await _book_from_day_buckets(db, appointment, start_time, end_time)
+            logger.info(
+                "Appointment %s booked by student %s with professor %s",
+                appointment_id, appointment.student_id, appointment.professor_id,
+            )
+            return {"message": "Appointment booked successfully", "appointment_id": str(appointment_id)}
+
+        # Step 5: Check professor's availability for the requested slot using the schedule index
+        schedule = await schedule_index.get(db, appointment.professor_id)
+        if not schedule.can_book(start_time, end_time):
+            # The cached schedule may miss writes made by other workers; re-read once before rejecting
+            schedule = await schedule_index.get(db, appointment.professor_id, refresh=True)
 
         # Ensure that the requested time slot is fully covered by one of the professor's availability slots
-        slot_found = any(
-            slot["start_time"] <= start_time and slot["end_time"] >= end_time for slot in available_slots
-        )
-        if not slot_found:
+        if schedule.free_slot_for(start_time, end_time) is None:
             raise HTTPException(
                 status_code=409,
                 detail="Requested time is outside the professor's availability slots. Available slots are: " +
-                       ", ".join([f"{slot['start_time']} - {slot['end_time']}" for slot in available_slots])
+                       ", ".join([f"{slot_start} - {slot_end}" for _, slot_start, slot_end in schedule.free.items()])
             )
 
         # Step 6: Ensure no overlapping appointments
-        existing_appointments = db["appointments"].find_one({
-            "professor_id": appointment.professor_id,
-            "start_time": {"$lt": end_time},
-            "end_time": {"$gt": start_time},
-            "is_canceled": False
-        })
-        if existing_appointments:
+        if schedule.has_booking_overlap(start_time, end_time):
             raise HTTPException(status_code=409, detail="There is already an existing appointment during this time slot.")
 
-        # Step 7: Save the appointment if all checks pass
-        new_appointment = {
-            "professor_id": appointment.professor_id,
-            "student_id": appointment.student_id,
-            "start_time": start_time,
-            "end_time": end_time,
-            "is_canceled": False
-        }
-        result = db["appointments"].insert_one(new_appointment)
-
-        # Step 8: Update professor's availability
-        for slot in available_slots:
-            if slot["start_time"] == start_time and slot["end_time"] == end_time:
-                # Remove the exact match slot (fully booked)
-                db["availability"].delete_one({"_id": slot["_id"]})
-            elif start_time > slot["start_time"] and end_time < slot["end_time"]:
-                # Case 1: Split the availability into two parts
-                new_slot1 = {
-                    "professor_id": appointment.professor_id,
-                    "start_time": slot["start_time"],
-                    "end_time": start_time
-                }
-                new_slot2 = {
-                    "professor_id": appointment.professor_id,
-                    "start_time": end_time,
-                    "end_time": slot["end_time"]
-                }
-                db["availability"].insert_one(new_slot1)
-                db["availability"].insert_one(new_slot2)
-
-                # Delete the original slot after creating the two new slots
-                db["availability"].delete_one({"_id": slot["_id"]})
-            elif start_time == slot["start_time"]:
-                # Case 2: Shrink the slot to start after the appointment
-                db["availability"].update_one(
-                    {"_id": slot["_id"]}, {"$set": {"start_time": end_time}}
-                )
-            elif end_time == slot["end_time"]:
-                # Case 3: Shrink the slot to end before the appointment
-                db["availability"].update_one(
-                    {"_id": slot["_id"]}, {"$set": {"end_time": start_time}}
-                )
-
-        logger.info(f"Appointment booked successfully for student {appointment.student_id} with professor {appointment.professor_id}")
-
-        return {"message": "Appointment booked successfully", "appointment_id": str(result.inserted_id)}
+        # Step 7: Atomically claim the availability slot covering the appointment. The claim and
+        # the appointment go through a session so both parties read them back from any replica.
+        async with write_session(db, appointment.student_id, appointment.professor_id) as session:
+            claimed_slot, schedule = await _claim_slot(
+                db, schedule, appointment.professor_id, start_time, end_time, session=session
+            )
+            if claimed_slot is None:
+                raise HTTPException(status_code=409, detail="The requested time slot was just booked by someone else.")
+
+            # Step 8: Save the appointment and write back what is left of the slot in parallel
+            new_appointment = {
+                "professor_id": appointment.professor_id,
+                "student_id": appointment.student_id,
+                **times.bounds(start_time, end_time),
+                "is_canceled": False
+            }
+            remainder_ops, remainder_id = _remainder_ops(claimed_slot, appointment.professor_id, start_time, end_time)
+            appointment_result, remainder_result = await asyncio.gather(
+                db["appointments"].insert_one(new_appointment, session=session),
+                db["availability"].bulk_write(remainder_ops, ordered=True) if remainder_ops else _noop(),
+                return_exceptions=True,
+            )
+        if isinstance(appointment_result, Exception) or isinstance(remainder_result, Exception):
+            await _release_claim(db, claimed_slot, new_appointment, start_time, end_time, remainder_id)
+            schedule_index.invalidate(appointment.professor_id)
+            schedule_versions.bump(appointment.professor_id)
+            raise appointment_result if isinstance(appointment_result, Exception) else remainder_result
+
+        # Keep the schedule index in step with what was written
+        slot_id, slot_start, slot_end = claimed_slot["_id"], claimed_slot["start_time"], claimed_slot["end_time"]
+        schedule.remove_free(slot_id, slot_start)
+        if slot_start < start_time:
+            schedule.add_free(slot_id, slot_start, start_time)
+        if slot_end > end_time:
+            schedule.add_free(remainder_id or slot_id, end_time, slot_end)
+        schedule.add_booking(appointment_result.inserted_id, start_time, end_time)
+        schedule_versions.bump(appointment.professor_id, appointment.student_id)
+
+        logger.info(
+            "Appointment %s booked by student %s with professor %s",
+            appointment_result.inserted_id, appointment.student_id, appointment.professor_id,
+        )
+
+        return {"message": "Appointment booked successfully", "appointment_id": str(appointment_result.inserted_id)}
 
+    except HTTPException:
+        raise
     except Exception as error:
-        logger.error(f"Unexpected error occurred: {str(error)}")
+        logger.exception("Unexpected error while booking an appointment")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(error)}")
 
 # Cancel Appointment Route
 @router.put("/appointments/{appointmentid}")
-def cancel_appointment(
+async def cancel_appointment(
     appointmentid: str,
-    db: MongoClient = Depends(get_db),
+    db: AsyncIOMotorDatabase = Depends(get_db),
     Authorize: AuthJWT = Depends(),
 ):
     try:
@@ -165,22 +317,39 @@ def cancel_appointment(
                 status_code=403, detail="Only professors can cancel appointments"
             )
 
-        # Fetch the appointment from the database
-        appointment = db["appointments"].find_one({"_id": ObjectId(appointmentid)})
+        # Fetch the appointment from the primary; the cancel decision depends on it
+        appointment = await primary(db, "appointments").find_one({"_id": ObjectId(appointmentid)})
 
         if not appointment:
             raise HTTPException(status_code=404, detail="Appointment not found")
 
         # Ensure the professor owns the appointment
-        if appointment["professor_id"] != professor_id:
+        if str(appointment["professor_id"]) != professor_id:
             raise HTTPException(
                 status_code=403, detail="You can only cancel your own appointments"
             )
 
-        # Update the appointment status
-        db["appointments"].update_one({"_id": ObjectId(appointmentid)}, {"$set": {"is_canceled": True}})
-
-        logger.info(f"Appointment {appointmentid} canceled by professor {professor_id}")
+        # Update the appointment status (only the first cancel of an appointment takes effect)
+        async with write_session(db, appointment["professor_id"], appointment["student_id"]) as session:
+            result = await db["appointments"].update_one(
+                {"_id": ObjectId(appointmentid), "is_canceled": False}, {"$set": {"is_canceled": True}},
+                session=session,
+            )
+        if result.modified_count and config.SCHEDULE_STORAGE == "day_buckets":
+            schedule_versions.bump(appointment["professor_id"], appointment["student_id"])
+            if isinstance(appointment["end_time"], datetime) and appointment["end_time"] > datetime.utcnow():
+                await day_buckets.release(db, appointment["professor_id"], appointment["start_time"], appointment["end_time"])
+        elif result.modified_count:
+            schedule = schedule_index.cached(appointment["professor_id"])
+            if schedule is not None:
+                schedule.remove_booking(appointment["_id"], appointment["start_time"])
+            schedule_versions.bump(appointment["professor_id"], appointment["student_id"])
+
+            # Give the freed time back to the professor; compaction later merges it with adjacent slots
+            if isinstance(appointment["end_time"], datetime) and appointment["end_time"] > datetime.utcnow():
+                await restore_interval(db, appointment["professor_id"], appointment["start_time"], appointment["end_time"])
+
+        logger.info("Appointment %s canceled by professor %s", appointmentid, professor_id)
 
         return {
             "message": "Appointment canceled successfully",
@@ -188,13 +357,49 @@ def cancel_appointment(
             "is_canceled": True,
         }
 
+    except HTTPException:
+        raise
     except Exception as error:
-        logger.error(f"Error occurred while canceling appointment {appointmentid}: {str(error)}")
+        logger.exception("Unexpected error while canceling appointment %s", appointmentid)
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(error)}")
 
 # Get Appointments Route
-@router.get("/getappointments")
-def get_appointments(Authorize: AuthJWT = Depends(), db: MongoClient = Depends(get_db)):
+def _iso_or_raw(field):
+    # Dates are formatted by the server; anything else (legacy string times) passes through
+    return {"$cond": [
+        {"$eq": [{"$type": field}, "date"]},
+        {"$dateToString": {"date": field, "format": "%Y-%m-%dT%H:%M:%S"}},
+        field,
+    ]}
+
+
+APPOINTMENT_PROJECTION = {
+    "_id": 0,
+    "appointment_id": {"$toString": "$_id"},
+    "student_id": {"$toString": "$student_id"},
+    "professor_id": {"$toString": "$professor_id"},
+    "start_time": _iso_or_raw("$start_time"),
+    "end_time": _iso_or_raw("$end_time"),
+    "is_canceled": 1,
+}
+
+
+def _next_cursor(document):
+    return encode_cursor(document["cursor_time"], ObjectId(document["appointment_id"]))
+
+
+@router.get("/getappointments", response_model=AppointmentPage)
+async def get_appointments(
+    request: Request,
+    response: Response,
+    scope: Literal["all", "upcoming", "past"] = "all",
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    format: Optional[Literal["json", "ndjson"]] = None,
+    include_archived: bool = False,
+    Authorize: AuthJWT = Depends(),
+    db: AsyncIOMotorDatabase = Depends(get_db),
+):
     # Ensure the user is authorized
     Authorize.jwt_required()
     user_id = Authorize.get_jwt_subject()
@@ -209,38 +414,130 @@ def get_appointments(Authorize: AuthJWT = Depends(), db: MongoClient = Depends(g
 
     # Fetch appointments based on role
     if role == "professor":
-        appointments = list(db["appointments"].find({
-            "professor_id": userid,
-            "is_canceled": False
-        }))
+        match = {"professor_id": userid, "is_canceled": False}
     elif role == "student":
-        appointments = list(db["appointments"].find({
-            "student_id": userid,
-            "is_canceled": False
-        }))
+        match = {"student_id": userid, "is_canceled": False}
     else:
         raise HTTPException(status_code=403, detail="Unauthorized role")
 
-    # If no appointments found, return an empty list
-    if not appointments:
-        return {"appointments": []}
-
-    # Serialize the appointment data
-    appointment_data = []
-    for appointment in appointments:
+    # Long-past appointments live in the archive, which only history listings ask to read
+    archived = include_archived and scope != "upcoming"
+
+    # Answer repeated polling from the schedule version without touching Mongo. Upcoming and past
+    # listings also change as appointments start, so their tags carry an expiry (set further down)
+    stream = format == "ndjson" or (format is None and "application/x-ndjson" in request.headers.get("accept", ""))
+    etag = schedule_versions.etag(userid, role, scope, limit, cursor, stream, archived)
+    if_none_match = request.headers.get("if-none-match")
+    current = datetime.utcnow()
+    if scope == "all":
+        fresh = etag if etag_matches(if_none_match, etag) else None
+    else:
+        fresh = fresh_expiring_etag(if_none_match, etag, times.epoch(current))
+    # A client that wrote through another worker reads for real: this worker's version may lag that write
+    if fresh is not None and not carries_newer_position(user_id):
+        return Response(status_code=304, headers={"ETag": fresh})
+
+    # Upcoming appointments are listed soonest first, past ones most recent first
+    start_field = times.field("start")
+    now = times.key(current)
+    descending = scope == "past"
+    upcoming = dict(match, **{start_field: {"$gte": now}})
+    if scope == "upcoming":
+        match[start_field] = {"$gte": now}
+    elif scope == "past":
+        match[start_field] = {"$lt": now}
+    if cursor:
         try:
-            appointment_data.append({
-                "appointment_id": str(appointment["_id"]),
-                "student_id": str(appointment["student_id"]),  # Convert ObjectId to string
-                "professor_id": str(appointment["professor_id"]),  # Convert ObjectId to string
-                "start_time": appointment["start_time"].isoformat() if isinstance(appointment["start_time"], datetime) else appointment["start_time"],
-                "end_time": appointment["end_time"].isoformat() if isinstance(appointment["end_time"], datetime) else appointment["end_time"],
-                "is_canceled": appointment["is_canceled"]
-            })
-        except KeyError as e:
-            raise HTTPException(status_code=500, detail=f"Missing key in appointment data: {str(e)}")
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error processing appointment data: {str(e)}")
+            match = {"$and": [match, keyset_filter(start_field, cursor, descending=descending)]}
+        except InvalidCursor as error:
+            raise HTTPException(status_code=400, detail=str(error))
+
+    direction = -1 if descending else 1
+    pipeline = [
+        {"$match": match},
+        {"$sort": {start_field: direction, "_id": direction}},
+        {"$limit": limit + 1},
+        {"$project": dict(APPOINTMENT_PROJECTION, cursor_time=f"${start_field}")},
+    ]
+    if stream:
+        # A scoped stream's expiry is only known once it has been sent, so only "all" streams get an ETag
+        return StreamingResponse(
+            _stream_appointments(db, userid, pipeline, limit, archived, descending),
+            media_type="application/x-ndjson", headers={"ETag": etag} if scope == "all" else None,
+        )
+
+    # Listing is served by a secondary, after the user's own latest write has reached it
+    if archived:
+        appointment_data = await _history_page(db, userid, pipeline, limit, descending)
+    else:
+        async with read_session(db, userid) as session:
+            documents = browsing(db, "appointments").aggregate(pipeline, batchSize=min(limit + 1, 100), session=session)
+            appointment_data = await documents.to_list(length=limit + 1)
+    next_cursor = None
+    if len(appointment_data) > limit:
+        appointment_data = appointment_data[:limit]
+        next_cursor = _next_cursor(appointment_data[-1])
+    if scope == "upcoming":
+        # The page changes when its first appointment starts and drops off it
+        etag = expiring(etag, times.epoch(appointment_data[0]["cursor_time"]) if appointment_data else None)
+    elif scope == "past" and not cursor:
+        # The first page changes when the next upcoming appointment starts and joins it;
+        # later pages only hold appointments older than their cursor
+        soonest = await browsing(db, "appointments").find_one(upcoming, {start_field: 1}, sort=[(start_field, 1)])
+        etag = expiring(etag, times.epoch(soonest[start_field]) if soonest else None)
+    elif scope == "past":
+        etag = expiring(etag, None)
+    for appointment in appointment_data:
+        del appointment["cursor_time"]
 
     # Return the serialized appointment data
-    return {"appointments": appointment_data}
+    response.headers["ETag"] = etag
+    return prebuilt({"appointments": appointment_data, "next_cursor": next_cursor}, response)
+
+
+async def _history_page(db, user_id, pipeline, limit, descending):
+    """One page (plus one) drawn from both the hot collection and the archive, in listing order."""
+
+    async def page(collection):
+        # The two queries run concurrently, so each takes its own session
+        async with read_session(db, user_id) as session:
+            documents = browsing(db, collection).aggregate(pipeline, batchSize=min(limit + 1, 100), session=session)
+            return await documents.to_list(length=limit + 1)
+
+    hot, cold = await asyncio.gather(page("appointments"), page(archive.COLLECTION))
+    return archive.merge_pages(hot, cold, limit, descending=descending)
+
+
+async def _iterate(items):
+    for item in items:
+        yield item
+
+
+async def _ndjson_lines(documents, limit):
+    sent = 0
+    last = None
+    async for appointment in documents:
+        if sent == limit:
+            yield dumps({"next_cursor": _next_cursor(last)}) + b"\n"
+            break
+        last = appointment
+        cursor_time = appointment.pop("cursor_time")
+        yield dumps(appointment) + b"\n"
+        appointment["cursor_time"] = cursor_time
+        sent += 1
+
+
+async def _stream_appointments(db, user_id, pipeline, limit, archived=False, descending=False):
+    """Yield one JSON line per appointment as the cursor produces it, then the next cursor if any."""
+    if archived:
+        # Two sources have to be merged, so a history page is gathered before it is streamed
+        documents = _iterate(await _history_page(db, user_id, pipeline, limit, descending))
+        async for line in _ndjson_lines(documents, limit):
+            yield line
+        return
+
+    # The session has to outlive the route, so the stream opens its own
+    async with read_session(db, user_id) as session:
+        documents = browsing(db, "appointments").aggregate(pipeline, batchSize=min(limit + 1, 100), session=session)
+        async for line in _ndjson_lines(documents, limit):
+            yield line
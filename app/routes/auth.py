@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException, Depends
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi_jwt_auth import AuthJWT
 from pydantic import BaseModel
 from datetime import timedelta
-import traceback
 from contextlib import contextmanager
 from app.db import get_db
 from app.models import User  # Import the User model from models.py
+from app.users import find_user_by_username, invalidate_user
+from app.security import hash_password_async, run_in_crypto_pool, verify_password_async
+from pymongo.errors import DuplicateKeyError
 
 # Define FastAPI router
 router = APIRouter()
@@ -18,35 +20,59 @@ router = APIRouter()
 
 # Route to register a new user
 @router.post("/register")
-def register_user(user: User, db=Depends(get_db)): 
+async def register_user(user: User, db: AsyncIOMotorDatabase = Depends(get_db)):
     try:
         # Check if the username already exists
-        existing_user = db["users"].find_one({"username": user.username})
+        existing_user = await find_user_by_username(db, user.username)
         if existing_user:
             raise HTTPException(status_code=400, detail="Username already exists")
 
-        # Insert the new user (convert Pydantic model to dictionary)
-        result = db["users"].insert_one(user.dict()) 
-        user_data = user.dict()
-        user_data["_id"] = str(result.inserted_id) 
+        # Insert the new user with a hashed password (convert Pydantic model to dictionary)
+        new_user = user.dict()
+        new_user["password"] = await hash_password_async(user.password)
+        try:
+            result = await db["users"].insert_one(new_user)
+        except DuplicateKeyError:
+            # Registered concurrently (or by another worker) since the check above
+            raise HTTPException(status_code=400, detail="Username already exists")
+        finally:
+            # Drop the cached "no such user" entry
+            invalidate_user(username=user.username)
+        user_data = user.dict(exclude={"password"})
+        user_data["_id"] = str(result.inserted_id)
 
         return user_data
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating user: {e}")
 
 # Route to log in a user
 @router.post("/login")
-def login_user(user: User, db=Depends(get_db), Authorize: AuthJWT = Depends()): 
-    users_collection = db["users"]  # Access the 'users' collection
+async def login_user(user: User, db: AsyncIOMotorDatabase = Depends(get_db), Authorize: AuthJWT = Depends()):
+    # Fetch user by username (served from the user cache when possible)
+    found_user = await find_user_by_username(db, user.username)
+    if not found_user:
+        raise HTTPException(status_code=400, detail="Invalid credentials")
 
-    # Fetch user by username
-    found_user = users_collection.find_one({"username": user.username})
-    if not found_user or found_user["password"] != user.password:
+    # Verify the password off the event loop
+    matches, needs_rehash = await verify_password_async(user.password, found_user["password"])
+    if not matches:
         raise HTTPException(status_code=400, detail="Invalid credentials")
 
+    # Upgrade legacy plaintext records (or outdated cost parameters) now that we know the password
+    if needs_rehash:
+        new_hash = await hash_password_async(user.password)
+        await db["users"].update_one(
+            {"_id": found_user["_id"], "password": found_user["password"]},
+            {"$set": {"password": new_hash}},
+        )
+        invalidate_user(found_user["_id"], found_user["username"])
+
     # Create JWT with user details
-    access_token = Authorize.create_access_token(
-        subject=str(found_user["_id"])
+    access_token = await run_in_crypto_pool(
+        Authorize.create_access_token,
+        subject=str(found_user["_id"]),
         user_claims={"role": found_user["role"]},
         expires_time=timedelta(hours=1)  
     )
@@ -1,26 +1,85 @@
-from fastapi import APIRouter, Depends, HTTPException
-from pymongo import MongoClient
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Response
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from fastapi_jwt_auth import AuthJWT
 from datetime import datetime
+from typing import Optional
 from app.models import Availability, User
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter
+from app.admission import check_write_rate
+from app.idempotency import run_idempotent
+from app.read_routing import browsing, carries_newer_position, primary, read_session
+from app.responses import prebuilt
+from app.schemas import AvailabilityPage, AvailabilityQuery, BulkAvailabilityCreate
+from app.bulk_availability import expand_weekly, sweep_conflicts
+from app import config, day_buckets, times
 from contextlib import contextmanager
-import traceback
+import logging
 from app.db import get_db
+from app.schedule_index import schedule_index
+from app.cache import MISSING
+from app.users import cached_user_by_id, find_user_by_id
+from app.schedule_version import etag_matches, schedule_versions
 from bson import ObjectId 
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
 # MongoDB Connection
 
 
 
+async def _available_between(db, professor_id, start_time, end_time):
+    """(id, start, end) of the professor's free slots overlapping [start_time, end_time), from the primary."""
+    slots = await primary(db, "availability").find(
+        {
+            "professor_id": professor_id,
+            times.field("start"): {"$lt": times.key(end_time)},
+            times.field("end"): {"$gt": times.key(start_time)},
+        },
+        {"start_time": 1, "end_time": 1},
+    ).to_list(length=None)
+    return [(slot["_id"], slot["start_time"], slot["end_time"]) for slot in slots]
+
+
+async def _booked_between(db, professor_id, start_time, end_time):
+    """(id, start, end) of the professor's active appointments overlapping [start_time, end_time), from the primary."""
+    bookings = await primary(db, "appointments").find(
+        {
+            "professor_id": professor_id,
+            "is_canceled": False,
+            times.field("start"): {"$lt": times.key(end_time)},
+            times.field("end"): {"$gt": times.key(start_time)},
+        },
+        {"start_time": 1, "end_time": 1},
+    ).to_list(length=None)
+    return [(booking["_id"], booking["start_time"], booking["end_time"]) for booking in bookings]
+
+
 # Route to create availability
 @router.post("/availability")
-def create_availability(
+async def create_availability(
     availability_data: Availability,
-    db=Depends(get_db),
-    Authorize: AuthJWT = Depends()
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db),
+    Authorize: AuthJWT = Depends(),
+    idempotency_key: Optional[str] = Header(None),
 ):
+    if idempotency_key:
+        Authorize.jwt_required()
+    user_id = Authorize.get_jwt_subject()
+
+    # A retry carrying the same Idempotency-Key gets the first attempt's response back
+    # (and, not running again, is not rate limited again)
+    return await run_idempotent(
+        db, idempotency_key, user_id, "POST /availability", availability_data.dict(),
+        lambda: _create_availability(availability_data, db, Authorize, user_id or request.client.host),
+    )
+
+
+async def _create_availability(availability_data, db, Authorize, rate_key):
+    check_write_rate(rate_key)
     try:
         # JWT validation
         Authorize.jwt_required()
@@ -42,20 +101,40 @@ def create_availability(
         if availability_data.professor_id != user_object_id:
             raise HTTPException(status_code=403, detail="You cannot set availability for another professor!")
 
-        # Check for overlapping slots
+        if config.SCHEDULE_STORAGE == "day_buckets":
+            # The conditional bitmap update is the overlap check
+            try:
+                added = await day_buckets.add_free(
+                    db, user_object_id, availability_data.start_time, availability_data.end_time
+                )
+            except ValueError as error:
+                raise HTTPException(status_code=400, detail=str(error))
+            if not added:
+                raise HTTPException(status_code=409, detail={"message": "Time slot conflicts found", "conflicts": []})
+            schedule_versions.bump(user_object_id)
+            return {
+                "message": "Availability successfully added",
+                "availability": {
+                    "id": None,  # Day buckets have no per-slot documents
+                    "start_time": availability_data.start_time,
+                    "end_time": availability_data.end_time,
+                    "professor_id": user_id
+                }
+            }
+
+        # Overlaps are checked on the primary: the cached schedule index can miss slots and bookings
+        # other workers wrote, and overlapping free slots could each be claimed for the same time
         availability_collection = db["availability"]
-        overlapping_slots = availability_collection.find({
-            "professor_id": user_object_id,
-            "$or": [
-                {"start_time": {"$lt": availability_data.end_time}, "end_time": {"$gt": availability_data.start_time}}
-            ]
-        })
+        free, booked = await asyncio.gather(
+            _available_between(db, user_object_id, availability_data.start_time, availability_data.end_time),
+            _booked_between(db, user_object_id, availability_data.start_time, availability_data.end_time),
+        )
+        overlapping_slots = free + booked
 
-        # Use len(list()) to count the number of overlapping slots
-        if len(list(overlapping_slots)) > 0:
+        if len(overlapping_slots) > 0:
             conflict_details = [
-                {"start_time": slot["start_time"], "end_time": slot["end_time"]}
-                for slot in overlapping_slots
+                {"start_time": slot_start, "end_time": slot_end}
+                for _, slot_start, slot_end in overlapping_slots
             ]
             raise HTTPException(
                 status_code=409,
@@ -65,10 +144,13 @@ def create_availability(
         # Insert availability
         new_availability = {
             "professor_id": user_object_id,  # Use ObjectId in MongoDB
-            "start_time": availability_data.start_time,
-            "end_time": availability_data.end_time,
+            **times.bounds(availability_data.start_time, availability_data.end_time),
         }
-        result = availability_collection.insert_one(new_availability)
+        result = await availability_collection.insert_one(new_availability)
+        schedule = schedule_index.cached(user_object_id)
+        if schedule is not None:
+            schedule.add_free(result.inserted_id, availability_data.start_time, availability_data.end_time)
+        schedule_versions.bump(user_object_id)
 
         return {
             "message": "Availability successfully added",
@@ -80,16 +162,184 @@ def create_availability(
             }
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("Unexpected error while creating availability")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
 
 
-@router.post("/getavailability")
-def get_availability(
-    professor_id: str,
+# Route to create many availability slots at once (explicit intervals and/or a weekly pattern)
+@router.post("/availability/bulk")
+async def create_availability_bulk(
+    bulk_data: BulkAvailabilityCreate,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db),
     Authorize: AuthJWT = Depends(),
-    db=Depends(get_db)
+    idempotency_key: Optional[str] = Header(None),
+):
+    if idempotency_key:
+        Authorize.jwt_required()
+    user_id = Authorize.get_jwt_subject()
+
+    # Same Idempotency-Key and rate-limit handling as POST /availability
+    return await run_idempotent(
+        db, idempotency_key, user_id, "POST /availability/bulk", bulk_data.dict(),
+        lambda: _create_availability_bulk(bulk_data, db, Authorize, user_id or request.client.host),
+    )
+
+
+async def _create_availability_bulk(bulk_data, db, Authorize, rate_key):
+    check_write_rate(rate_key)
+    try:
+        # JWT validation
+        Authorize.jwt_required()
+        user_id = Authorize.get_jwt_subject()
+        raw_jwt = Authorize.get_raw_jwt()
+        user_role = raw_jwt.get("role")
+
+        # Role validation
+        if user_role != "professor":
+            raise HTTPException(status_code=403, detail="Only professors can add availability")
+
+        if not ObjectId.is_valid(user_id):
+            raise HTTPException(status_code=400, detail="Invalid user ID format")
+
+        user_object_id = ObjectId(user_id)
+
+        # Ownership validation
+        if bulk_data.professor_id != user_id:
+            raise HTTPException(status_code=403, detail="You cannot set availability for another professor!")
+
+        # Expand the request into candidate slots
+        candidates = [(interval.start_time, interval.end_time) for interval in bulk_data.intervals]
+        if bulk_data.recurrence is not None:
+            recurrence = bulk_data.recurrence
+            candidates.extend(expand_weekly(
+                recurrence.weekdays, recurrence.start, recurrence.end,
+                recurrence.from_date, recurrence.until, recurrence.exclude,
+            ))
+        if not candidates:
+            raise HTTPException(status_code=400, detail="No availability slots given")
+        if len(candidates) > config.BULK_AVAILABILITY_MAX_SLOTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"At most {config.BULK_AVAILABILITY_MAX_SLOTS} slots can be created per request"
+            )
+
+        results = [None] * len(candidates)
+        valid = []
+        for i, (start_time, end_time) in enumerate(candidates):
+            if start_time >= end_time:
+                results[i] = {"start_time": start_time, "end_time": end_time, "status": "invalid"}
+            else:
+                valid.append(i)
+
+        # One range query per collection covering every candidate (on the primary), then a sort-and-sweep
+        # conflict pass; booked time counts as taken, so availability is never offered over an appointment
+        availability_collection = db["availability"]
+        existing = []
+        booked_ids = set()
+        if valid and config.SCHEDULE_STORAGE != "day_buckets":
+            window_start = min(candidates[i][0] for i in valid)
+            window_end = max(candidates[i][1] for i in valid)
+            existing_slots, booked = await asyncio.gather(
+                _available_between(db, user_object_id, window_start, window_end),
+                _booked_between(db, user_object_id, window_start, window_end),
+            )
+            existing = existing_slots + booked
+            booked_ids = {booking[0] for booking in booked}
+
+        accepted = []
+        swept = sweep_conflicts([candidates[i] for i in valid], existing)
+        for i, ((start_time, end_time), conflict) in zip(valid, swept):
+            if conflict is None:
+                accepted.append(i)
+                results[i] = {"start_time": start_time, "end_time": end_time, "status": "accepted"}
+            else:
+                id_field = "appointment_id" if conflict[0] in booked_ids else "availability_id"
+                results[i] = {
+                    "start_time": start_time,
+                    "end_time": end_time,
+                    "status": "conflict",
+                    "conflicts_with": {
+                        id_field: str(conflict[0]) if conflict[0] is not None else None,
+                        "start_time": conflict[1],
+                        "end_time": conflict[2],
+                    },
+                }
+
+        if accepted and config.SCHEDULE_STORAGE == "day_buckets":
+            # Checked against the stored bitmaps one slot at a time
+            for i in accepted:
+                try:
+                    added = await day_buckets.add_free(db, user_object_id, *candidates[i])
+                except ValueError:
+                    results[i]["status"] = "invalid"
+                    continue
+                if not added:
+                    results[i].update(status="conflict", conflicts_with=None)
+            accepted = [i for i in accepted if results[i]["status"] == "accepted"]
+            schedule_versions.bump(user_object_id)
+
+        # Insert every accepted slot with a single write
+        elif accepted:
+            new_slots = [
+                {"professor_id": user_object_id, **times.bounds(*candidates[i])}
+                for i in accepted
+            ]
+            inserted = await availability_collection.insert_many(new_slots)
+            schedule = schedule_index.cached(user_object_id)
+            for i, slot_id in zip(accepted, inserted.inserted_ids):
+                results[i]["availability_id"] = str(slot_id)
+                if schedule is not None:
+                    schedule.add_free(slot_id, candidates[i][0], candidates[i][1])
+            schedule_versions.bump(user_object_id)
+
+        return {
+            "message": f"{len(accepted)} of {len(candidates)} availability slots added",
+            "professor_id": user_id,
+            "results": results,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Unexpected error while creating availability in bulk")
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
+
+
+async def _slots_from_day_buckets(db, professor_id, query, session):
+    """One page (plus one) of free runs from day buckets, shaped like availability documents.
+
+    Runs have no document of their own, so ``_id`` is None.
+    """
+    from_time = day_buckets.naive_utc(query.from_time) if query.from_time is not None else None
+    to_time = day_buckets.naive_utc(query.to_time) if query.to_time is not None else None
+    after = times.from_epoch(decode_cursor(query.cursor)[0]) if query.cursor else None
+    buckets = await day_buckets.find_buckets(
+        browsing(db, day_buckets.COLLECTION), professor_id, from_time, to_time, session=session
+    )
+    slots = []
+    for start_time, end_time in day_buckets.free_intervals(buckets):
+        if from_time is not None and end_time <= from_time:
+            continue
+        if to_time is not None and start_time >= to_time:
+            break
+        if after is None or start_time > after:
+            slots.append({"_id": None, "start_time": start_time, "end_time": end_time})
+            if len(slots) > query.limit:
+                break
+    return slots
+
+
+@router.post("/getavailability", response_model=AvailabilityPage)
+async def get_availability(
+    query: AvailabilityQuery,
+    request: Request,
+    response: Response,
+    Authorize: AuthJWT = Depends(),
+    db: AsyncIOMotorDatabase = Depends(get_db)
 ):
     try:
         # JWT validation
@@ -101,37 +351,90 @@ def get_availability(
             raise HTTPException(status_code=403, detail="Only students can view availability")
 
         # Convert professor_id to ObjectId
-        if not ObjectId.is_valid(professor_id):
+        if not ObjectId.is_valid(query.professor_id):
             raise HTTPException(status_code=400, detail="Invalid professor ID format")
 
-        professor_object_id = ObjectId(professor_id)
+        professor_object_id = ObjectId(query.professor_id)
 
-        # Check professor existence
-        users_collection = db["users"]
-        professor = users_collection.find_one({"_id": professor_object_id})
-        if not professor:
-            raise HTTPException(status_code=404, detail="Professor not found")
+        # Answer repeated polling from the schedule version without touching Mongo, unless the student
+        # wrote through another worker whose change this worker's version may not reflect yet
+        etag = schedule_versions.etag(professor_object_id, query.dict())
+        fresh = etag_matches(request.headers.get("if-none-match"), etag)
+        if fresh and not carries_newer_position(Authorize.get_jwt_subject()):
+            return Response(status_code=304, headers={"ETag": etag})
 
-        # Fetch availability slots
-        availability_collection = db["availability"]
-        availability_slots = list(availability_collection.find({"professor_id": professor_object_id}))
+        # Build the availability filter: time window plus keyset position
+        slot_filter = {"professor_id": professor_object_id}
+        if query.from_time is not None:
+            slot_filter[times.field("end")] = {"$gt": times.key(query.from_time)}
+        if query.to_time is not None:
+            slot_filter[times.field("start")] = {"$lt": times.key(query.to_time)}
+        if query.cursor:
+            try:
+                slot_filter = {"$and": [slot_filter, keyset_filter(times.field("start"), query.cursor)]}
+            except InvalidCursor as error:
+                raise HTTPException(status_code=400, detail=str(error))
 
-        if not availability_slots:
+        slot_pipeline = [
+            {"$match": slot_filter},
+            {"$sort": {times.field("start"): 1, "_id": 1}},
+            {"$limit": query.limit + 1},
+            {"$project": {"start_time": 1, "end_time": 1}},
+        ]
+        professor = cached_user_by_id(professor_object_id)
+        if professor is MISSING and config.SCHEDULE_STORAGE == "day_buckets":
+            # Buckets cannot be joined to users, so look the professor up (and cache it)
+            professor = await find_user_by_id(db, professor_object_id)
+        if professor is None:
+            raise HTTPException(status_code=404, detail="Professor not found")
+        # Browsing is served by a secondary, after the student's own latest booking has reached it
+        async with read_session(db, Authorize.get_jwt_subject()) as session:
+            if config.SCHEDULE_STORAGE == "day_buckets":
+                # One bucket document per day in the window
+                availability_slots = await _slots_from_day_buckets(db, professor_object_id, query, session)
+            elif professor is not MISSING:
+                # Existence is already known from the user cache; only read the slots
+                availability_slots = await browsing(db, "availability").aggregate(
+                    slot_pipeline, session=session
+                ).to_list(length=None)
+            else:
+                # Check professor existence and fetch one page of slots in a single round trip
+                pipeline = [
+                    {"$match": {"_id": professor_object_id}},
+                    {"$project": {"_id": 1}},
+                    {"$lookup": {"from": "availability", "pipeline": slot_pipeline, "as": "slots"}},
+                ]
+                found = await browsing(db, "users").aggregate(pipeline, session=session).to_list(length=1)
+                if not found:
+                    raise HTTPException(status_code=404, detail="Professor not found")
+                availability_slots = found[0]["slots"]
+        if not availability_slots and not query.cursor:
             raise HTTPException(status_code=404, detail="No availability found for the professor")
 
+        # One extra slot was fetched to tell whether another page exists
+        next_cursor = None
+        if len(availability_slots) > query.limit:
+            availability_slots = availability_slots[:query.limit]
+            last_slot = availability_slots[-1]
+            # Day-bucket runs have no id; their start times are unique per professor anyway
+            next_cursor = encode_cursor(last_slot["start_time"], last_slot["_id"] or professor_object_id)
+
         # Format response
         availability_data = [
             {
-                "availability_id": str(slot["_id"]),
-                "professor_id": str(slot["professor_id"]),  # Convert ObjectId to string
+                "availability_id": str(slot["_id"]) if slot["_id"] is not None else None,
+                "professor_id": query.professor_id,
                 "start_time": slot["start_time"],
                 "end_time": slot["end_time"],
             }
             for slot in availability_slots
         ]
 
-        return {"availability": availability_data}
+        response.headers["ETag"] = etag
+        return prebuilt({"availability": availability_data, "next_cursor": next_cursor}, response)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        traceback.print_exc()
+        logger.exception("Unexpected error while listing availability")
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(e)}")
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import timedelta
+from itertools import groupby
+
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi_jwt_auth import AuthJWT
+from motor.motor_asyncio import AsyncIOMotorDatabase
+
+from app import config, day_buckets, times
+from app.db import get_db
+from app.read_routing import browsing, read_session
+from app.schemas import SlotSearchQuery
+from app.slot_search import earliest_free_slots
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+async def _schedules_from_intervals(db, query, professor_ids, user_id):
+    """professor id -> (availability, bookings) in the window, from the interval collections."""
+    window_filter = {
+        times.field("start"): {"$lt": times.key(query.to_time)},
+        times.field("end"): {"$gt": times.key(query.from_time)},
+    }
+    if professor_ids is not None:
+        window_filter["professor_id"] = {"$in": professor_ids}
+
+    # One batched query per collection for every candidate professor, served by secondaries.
+    # The queries run concurrently, so each takes its own read-your-writes session.
+    projection = {"_id": 0, "professor_id": 1, "start_time": 1, "end_time": 1}
+    async with read_session(db, user_id) as slots_session, read_session(db, user_id) as bookings_session:
+        free_slots, bookings = await asyncio.gather(
+            browsing(db, "availability").find(window_filter, projection, session=slots_session).to_list(length=None),
+            browsing(db, "appointments").find(
+                dict(window_filter, is_canceled=False), projection, session=bookings_session
+            ).to_list(length=None),
+        )
+
+    schedules = defaultdict(lambda: ([], []))
+    for slot in free_slots:
+        schedules[slot["professor_id"]][0].append((slot["start_time"], slot["end_time"]))
+    for booking in bookings:
+        # Bookings only matter for professors that have availability in the window
+        if booking["professor_id"] in schedules:
+            schedules[booking["professor_id"]][1].append((booking["start_time"], booking["end_time"]))
+    return schedules
+
+
+async def _schedules_from_day_buckets(db, query, professor_ids, user_id):
+    """professor id -> (free runs, no bookings) in the window, from day buckets.
+
+    Booked slots are never in a bucket's free bitmap, so there is nothing to cut out.
+    """
+    async with read_session(db, user_id) as session:
+        buckets = await day_buckets.find_window(
+            browsing(db, day_buckets.COLLECTION), query.from_time, query.to_time, professor_ids, session=session
+        )
+    return {
+        professor_id: (day_buckets.free_intervals(list(professor_buckets)), [])
+        for professor_id, professor_buckets in groupby(buckets, key=lambda bucket: bucket["professor_id"])
+    }
+
+
+# Route to find the earliest bookable slots across many professors in one call
+@router.post("/searchslots")
+async def search_slots(
+    query: SlotSearchQuery,
+    Authorize: AuthJWT = Depends(),
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    # JWT validation
+    Authorize.jwt_required()
+
+    if query.from_time >= query.to_time:
+        raise HTTPException(status_code=400, detail="'from' must be earlier than 'to'")
+
+    # Restrict to the requested professors, or search everyone
+    professor_ids = None
+    if query.professor_ids is not None:
+        if not all(ObjectId.is_valid(professor_id) for professor_id in query.professor_ids):
+            raise HTTPException(status_code=400, detail="Invalid professor ID format")
+        professor_ids = [ObjectId(professor_id) for professor_id in query.professor_ids]
+
+    user_id = Authorize.get_jwt_subject()
+    try:
+        if config.SCHEDULE_STORAGE == "day_buckets":
+            schedules = await _schedules_from_day_buckets(db, query, professor_ids, user_id)
+        else:
+            schedules = await _schedules_from_intervals(db, query, professor_ids, user_id)
+    except Exception as error:
+        logger.exception("Unexpected error while searching slots")
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {str(error)}")
+
+    slots = earliest_free_slots(
+        schedules, query.from_time, query.to_time, timedelta(minutes=query.min_duration_minutes), query.limit
+    )
+    return {
+        "slots": [
+            {"professor_id": str(professor_id), "start_time": start, "end_time": end}
+            for start, end, professor_id in slots
+        ]
+    }
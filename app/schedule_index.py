@@ -0,0 +1,194 @@
+import asyncio
+import time
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+from app import config
+from app.read_routing import primary
+from app.times import epoch as _key, from_epoch
+
+
+class _IntervalList:
+    """Disjoint [start, end) intervals kept sorted in parallel arrays.
+
+    Because the intervals never overlap, sorting by start also sorts by end,
+    so both "which interval contains t" and "which intervals touch [s, e)"
+    are a bisect away. Bounds are kept as epoch seconds, so any mix of
+    datetimes (aware or not) and legacy ISO strings compares correctly; they
+    are handed back as naive UTC datetimes.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+        self.by_id = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.by_id
+
+    def add(self, item_id, start, end):
+        start, end = _key(start), _key(end)
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, item_id)
+        self.by_id[item_id] = (start, end)
+
+    def remove(self, item_id, start):
+        start = _key(start)
+        i = bisect_left(self.starts, start)
+        while i < len(self.ids) and self.starts[i] == start:
+            if self.ids[i] == item_id:
+                del self.starts[i], self.ends[i], self.ids[i]
+                self.by_id.pop(item_id, None)
+                return True
+            i += 1
+        return False
+
+    def discard(self, item_id):
+        """Remove an interval knowing only its id; returns whether it was present."""
+        bounds = self.by_id.get(item_id)
+        return bounds is not None and self.remove(item_id, bounds[0])
+
+    def upsert(self, item_id, start, end):
+        """Add an interval, or move it if its bounds changed (idempotent)."""
+        if self.by_id.get(item_id) == (_key(start), _key(end)):
+            return
+        self.discard(item_id)
+        self.add(item_id, start, end)
+
+    def containing(self, start, end):
+        """Return (id, start, end) of the interval fully covering [start, end), or None."""
+        start, end = _key(start), _key(end)
+        i = bisect_right(self.starts, start) - 1
+        if i >= 0 and self.ends[i] >= end:
+            return self.ids[i], from_epoch(self.starts[i]), from_epoch(self.ends[i])
+        return None
+
+    def overlapping(self, start, end):
+        """Return every (id, start, end) that overlaps [start, end)."""
+        start, end = _key(start), _key(end)
+        i = bisect_right(self.ends, start)
+        found = []
+        while i < len(self.ids) and self.starts[i] < end:
+            found.append((self.ids[i], from_epoch(self.starts[i]), from_epoch(self.ends[i])))
+            i += 1
+        return found
+
+    def items(self):
+        return [(item_id, from_epoch(start), from_epoch(end)) for item_id, start, end in zip(self.ids, self.starts, self.ends)]
+
+
+class ProfessorSchedule:
+    """Free availability and booked appointments for a single professor."""
+
+    def __init__(self):
+        self.free = _IntervalList()
+        self.booked = _IntervalList()
+        self.loaded_at = time.monotonic()
+
+    def free_slot_for(self, start, end):
+        return self.free.containing(start, end)
+
+    def has_booking_overlap(self, start, end):
+        return bool(self.booked.overlapping(start, end))
+
+    def can_book(self, start, end):
+        """True when [start, end) sits inside one free slot and clashes with no booking."""
+        return self.free_slot_for(start, end) is not None and not self.has_booking_overlap(start, end)
+
+    def add_free(self, slot_id, start, end):
+        self.free.add(slot_id, start, end)
+
+    def remove_free(self, slot_id, start):
+        return self.free.remove(slot_id, start)
+
+    def add_booking(self, appointment_id, start, end):
+        self.booked.add(appointment_id, start, end)
+
+    def remove_booking(self, appointment_id, start):
+        return self.booked.remove(appointment_id, start)
+
+
+class ScheduleIndex:
+    """In-process, per-professor schedule cache built from availability and appointments.
+
+    Entries are loaded lazily with one availability and one appointments query,
+    updated in place by the routes after each successful write, and dropped
+    after ``ttl`` seconds so writes made by other workers are eventually seen.
+    """
+
+    def __init__(self, max_professors=1000, ttl=30.0):
+        self.max_professors = max_professors
+        self.ttl = ttl
+        self._schedules = OrderedDict()
+        self._locks = {}
+
+    def __iter__(self):
+        return iter(list(self._schedules.items()))
+
+    def _fresh(self, schedule):
+        return self.ttl is None or time.monotonic() - schedule.loaded_at < self.ttl
+
+    def cached(self, professor_id):
+        """The cached schedule for a professor if one is loaded and fresh, else None."""
+        key = str(professor_id)
+        schedule = self._schedules.get(key)
+        if schedule is None or not self._fresh(schedule):
+            return None
+        self._schedules.move_to_end(key)
+        return schedule
+
+    async def get(self, db, professor_id, refresh=False):
+        key = str(professor_id)
+        if not refresh:
+            schedule = self.cached(key)
+            if schedule is not None:
+                return schedule
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Another request may have loaded it while we waited for the lock
+            if not refresh:
+                schedule = self.cached(key)
+                if schedule is not None:
+                    return schedule
+            schedule = await self._load(db, professor_id)
+            self._schedules[key] = schedule
+            self._schedules.move_to_end(key)
+            while len(self._schedules) > self.max_professors:
+                evicted, _ = self._schedules.popitem(last=False)
+                self._locks.pop(evicted, None)
+            return schedule
+
+    async def _load(self, db, professor_id):
+        # Booking and availability decisions are made against this, so it is read from the primary
+        projection = {"start_time": 1, "end_time": 1}
+        free_slots, bookings = await asyncio.gather(
+            primary(db, "availability").find({"professor_id": professor_id}, projection).to_list(length=None),
+            primary(db, "appointments").find(
+                {"professor_id": professor_id, "is_canceled": False}, projection
+            ).to_list(length=None),
+        )
+        schedule = ProfessorSchedule()
+        for slot in free_slots:
+            schedule.add_free(slot["_id"], slot["start_time"], slot["end_time"])
+        for booking in bookings:
+            schedule.add_booking(booking["_id"], booking["start_time"], booking["end_time"])
+        return schedule
+
+    def invalidate(self, professor_id=None):
+        if professor_id is None:
+            self._schedules.clear()
+        else:
+            self._schedules.pop(str(professor_id), None)
+
+
+schedule_index = ScheduleIndex(
+    max_professors=config.SCHEDULE_INDEX_MAX_PROFESSORS,
+    ttl=config.SCHEDULE_INDEX_TTL_SECONDS,
+)
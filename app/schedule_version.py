@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import time
+from collections import defaultdict
+
+from app import config
+
+
+class ScheduleVersions:
+    """Per-key write counters used to build strong ETags for schedule listings.
+
+    Keys are professor ids (their availability) and user ids (their
+    appointments); the routes bump them after every write. Versions live in
+    this process only, so each ETag also carries a random process epoch and a
+    time bucket: a worker that did not see a write elsewhere stops answering
+    304 for it after at most ``max_staleness`` seconds.
+    """
+
+    def __init__(self, max_staleness=30.0):
+        self.max_staleness = max_staleness
+        self._epoch = os.urandom(4).hex()
+        self._versions = defaultdict(int)
+
+    def bump(self, *keys):
+        for key in keys:
+            self._versions[str(key)] += 1
+
+    def version(self, key):
+        return self._versions.get(str(key), 0)
+
+    def etag(self, key, *parts):
+        bucket = int(time.time() // self.max_staleness) if self.max_staleness else 0
+        digest = hashlib.sha1(json.dumps(parts, default=str).encode()).hexdigest()[:16]
+        return f'"{self._epoch}-{bucket}-{self.version(key)}-{digest}"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+schedule_versions = ScheduleVersions(max_staleness=config.ETAG_MAX_STALENESS_SECONDS)
+
+
+def expiring(etag, until):
+    """``etag`` made to stop matching at ``until`` (epoch seconds); None never expires.
+
+    For listings that change with the clock as well as with writes.
+    """
+    return f'{etag[:-1]}-{"never" if until is None else until}"'
+
+
+def fresh_expiring_etag(if_none_match, etag, now):
+    """The tag in If-None-Match that is ``etag`` made expiring() and not yet expired at ``now``, or None."""
+    if not if_none_match:
+        return None
+    prefix = etag[:-1] + "-"
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith(prefix) and tag.endswith('"'):
+            until = tag[len(prefix):-1]
+            if until == "never" or (until.isdigit() and now < int(until)):
+                return tag
+    return None
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
-from typing import Optional
-from datetime import datetime
+from pydantic import BaseModel, Field, validator
+from typing import List, Optional
+from datetime import date, datetime, time
+from app.times import to_utc
 
 
 
@@ -19,3 +20,81 @@ class AppointmentCreate(BaseModel):
     student_id: int
     start_time: str
     end_time: str
+
+class AvailabilityQuery(BaseModel):
+    professor_id: str
+    from_time: Optional[datetime] = Field(None, alias="from")  # Only slots ending after this time
+    to_time: Optional[datetime] = Field(None, alias="to")  # Only slots starting before this time
+    limit: int = Field(100, ge=1, le=500)
+    cursor: Optional[str] = None
+
+    _utc = validator("from_time", "to_time", allow_reuse=True)(to_utc)
+
+    class Config:
+        allow_population_by_field_name = True
+
+class AvailabilityInterval(BaseModel):
+    start_time: datetime
+    end_time: datetime
+
+    _utc = validator("start_time", "end_time", allow_reuse=True)(to_utc)
+
+class WeeklyRecurrence(BaseModel):
+    weekdays: List[int] = Field(..., min_items=1)  # Monday=0 .. Sunday=6
+    start: time  # Time of day each slot starts
+    end: time  # Time of day each slot ends
+    from_date: date = Field(..., alias="from")
+    until: date
+    exclude: List[date] = []
+
+    @validator("end")
+    def same_offset(cls, end, values):
+        # expand_weekly converts each slot to UTC on its own date; mixed offsets would make no sense there
+        start = values.get("start")
+        if start is not None and start.utcoffset() != end.utcoffset():
+            raise ValueError("start and end must have the same UTC offset")
+        return end
+
+    class Config:
+        allow_population_by_field_name = True
+
+class BulkAvailabilityCreate(BaseModel):
+    professor_id: str
+    intervals: List[AvailabilityInterval] = []
+    recurrence: Optional[WeeklyRecurrence] = None
+
+class SlotSearchQuery(BaseModel):
+    professor_ids: Optional[List[str]] = None  # None searches every professor
+    from_time: datetime = Field(..., alias="from")
+    to_time: datetime = Field(..., alias="to")
+    min_duration_minutes: int = Field(15, ge=1)
+    limit: int = Field(10, ge=1, le=100)
+
+    _utc = validator("from_time", "to_time", allow_reuse=True)(to_utc)
+
+    class Config:
+        allow_population_by_field_name = True
+
+# Response shapes. The listing routes return prebuilt responses, so these
+# document the output without being validated against it.
+class AppointmentOut(BaseModel):
+    appointment_id: str
+    student_id: str
+    professor_id: str
+    start_time: str
+    end_time: str
+    is_canceled: bool
+
+class AppointmentPage(BaseModel):
+    appointments: List[AppointmentOut]
+    next_cursor: Optional[str] = None
+
+class AvailabilitySlotOut(BaseModel):
+    availability_id: Optional[str]  # None for day-bucket storage
+    professor_id: str
+    start_time: datetime
+    end_time: datetime
+
+class AvailabilityPage(BaseModel):
+    availability: List[AvailabilitySlotOut]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,80 @@
+import asyncio
+import base64
+import functools
+import hashlib
+import hmac
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from app import config
+
+# Stored format: scrypt$<n>$<r>$<p>$<salt>$<hash> (salt and hash urlsafe-base64)
+SCHEME = "scrypt"
+_KEY_LENGTH = 32
+
+# Password hashing is deliberately slow; it runs on this pool (hashlib releases
+# the GIL while hashing) and the semaphore caps how many hashes are queued or
+# running at once, so a login spike waits on the event loop instead of piling
+# up threads or memory.
+_executor = ThreadPoolExecutor(max_workers=config.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_slots = asyncio.Semaphore(config.PASSWORD_HASH_MAX_PENDING)
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 1024 * 1024, dklen=_KEY_LENGTH
+    )
+
+
+def hash_password(password, n=None, r=None, p=None):
+    n = n or config.PASSWORD_SCRYPT_N
+    r = r or config.PASSWORD_SCRYPT_R
+    p = p or config.PASSWORD_SCRYPT_P
+    salt = os.urandom(16)
+    return f"{SCHEME}${n}${r}${p}${_b64(salt)}${_b64(_scrypt(password, salt, n, r, p))}"
+
+
+def is_hashed(stored):
+    return stored.startswith(SCHEME + "$")
+
+
+def verify_password(password, stored):
+    """Check a password against a stored value.
+
+    Returns (matches, needs_rehash). Records that still hold a plaintext
+    password, or were hashed with different cost parameters than the current
+    configuration, need a rehash once the password has been verified.
+    """
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode()), True
+    try:
+        _, n, r, p, salt, expected = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+    except ValueError:
+        return False, False
+    matches = hmac.compare_digest(_scrypt(password, _unb64(salt), n, r, p), _unb64(expected))
+    needs_rehash = (n, r, p) != (config.PASSWORD_SCRYPT_N, config.PASSWORD_SCRYPT_R, config.PASSWORD_SCRYPT_P)
+    return matches, needs_rehash
+
+
+async def run_in_crypto_pool(fn, *args, **kwargs):
+    """Run CPU-bound credential work (hashing, token signing) off the event loop."""
+    async with _slots:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def hash_password_async(password):
+    return await run_in_crypto_pool(hash_password, password)
+
+
+async def verify_password_async(password, stored):
+    return await run_in_crypto_pool(verify_password, password, stored)
@@ -0,0 +1,47 @@
+import heapq
+from bisect import bisect_right
+from itertools import islice
+
+
+def free_fragments(availability, bookings, window_start, window_end, min_duration):
+    """Yield bookable (start, end) pieces of one professor's schedule in start order.
+
+    Each availability slot is clipped to the window and has the bookings that
+    overlap it cut out; pieces shorter than ``min_duration`` are dropped.
+    Bookings are assumed not to overlap each other (the booking path
+    guarantees this), so sorted by start they are also sorted by end.
+    """
+    bookings = sorted(bookings)
+    booking_ends = [end for _, end in bookings]
+    for slot_start, slot_end in sorted(availability):
+        cursor = max(slot_start, window_start)
+        slot_end = min(slot_end, window_end)
+        # First booking that ends after the cursor
+        i = bisect_right(booking_ends, cursor)
+        while cursor < slot_end:
+            if i < len(bookings) and bookings[i][0] < slot_end:
+                booked_start, booked_end = bookings[i]
+                piece_end = min(booked_start, slot_end)
+                i += 1
+            else:
+                booked_end = piece_end = slot_end
+            if piece_end - cursor >= min_duration:
+                yield cursor, piece_end
+            cursor = max(cursor, booked_end)
+
+
+def earliest_free_slots(schedules, window_start, window_end, min_duration, limit):
+    """Merge every professor's free fragments and return the earliest ``limit`` of them.
+
+    ``schedules`` maps professor id -> (availability, bookings), both lists of
+    (start, end). Returns (start, end, professor_id) tuples ordered by start.
+    """
+    def tagged(professor_id, availability, bookings):
+        for start, end in free_fragments(availability, bookings, window_start, window_end, min_duration):
+            yield start, end, professor_id
+
+    streams = [
+        tagged(professor_id, availability, bookings)
+        for professor_id, (availability, bookings) in schedules.items()
+    ]
+    return list(islice(heapq.merge(*streams, key=lambda slot: (slot[0], slot[1])), limit))
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app import config, times
+from app.archive import run_archive_loop
+from app.change_stream import ChangeStreamSubscriber
+from app.compaction import run_compaction_loop
+from app.db import connect, close
+from app.indexes import ensure_indexes
+from app.schedule_index import schedule_index
+from app.users import remember_user
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Startup progress reported by /readyz
+state = {
+    "ready": False,
+    "import_seconds": None,
+    "startup_seconds": None,
+    "warmed_professors": 0,
+    "warmed_schedules": 0,
+    "index_problems": [],
+}
+
+
+def record_import_time(seconds):
+    state["import_seconds"] = round(seconds, 3)
+    if seconds > config.STARTUP_IMPORT_BUDGET_SECONDS:
+        logger.warning(
+            "Importing the application took %.2fs, over the %.2fs budget",
+            seconds, config.STARTUP_IMPORT_BUDGET_SECONDS,
+        )
+
+
+async def warm_caches(db):
+    """Load professor records and the schedules most likely to be booked next."""
+    professors = await db["users"].find({"role": "professor"}).to_list(length=config.WARMUP_MAX_PROFESSORS)
+    for professor in professors:
+        remember_user(professor)
+    state["warmed_professors"] = len(professors)
+
+    # Professors with the most upcoming appointments are the ones students are booking
+    busiest = await db["appointments"].aggregate([
+        {"$match": {"is_canceled": False, times.field("start"): {"$gte": times.key(datetime.utcnow())}}},
+        {"$group": {"_id": "$professor_id", "upcoming": {"$sum": 1}}},
+        {"$sort": {"upcoming": -1}},
+        {"$limit": config.WARMUP_MAX_SCHEDULES},
+    ]).to_list(length=None)
+    gate = asyncio.Semaphore(8)
+
+    async def load(professor_id):
+        async with gate:
+            await schedule_index.get(db, professor_id)
+
+    await asyncio.gather(*(load(professor["_id"]) for professor in busiest))
+    state["warmed_schedules"] = len(busiest)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    started = time.perf_counter()
+
+    # Open the pool once at startup (the ping forces TLS setup and replica-set discovery now)
+    client = connect()
+    db = client[config.MONGO_DB_NAME]
+    await client.admin.command("ping")
+    state["index_problems"] = await ensure_indexes(db)
+
+    try:
+        await asyncio.wait_for(warm_caches(db), timeout=config.WARMUP_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        logger.warning("Cache warm-up did not finish within %ss; serving cold", config.WARMUP_TIMEOUT_SECONDS)
+
+    # Background tasks: availability compaction (day buckets have no fragments to merge),
+    # appointment archiving and change-stream cache coherence
+    background = []
+    if config.COMPACTION_INTERVAL_SECONDS > 0 and config.SCHEDULE_STORAGE != "day_buckets":
+        background.append(asyncio.create_task(run_compaction_loop(db, config.COMPACTION_INTERVAL_SECONDS)))
+    if config.ARCHIVE_INTERVAL_SECONDS > 0:
+        background.append(asyncio.create_task(run_archive_loop(db, config.ARCHIVE_INTERVAL_SECONDS)))
+    if config.CHANGE_STREAM_ENABLED:
+        background.append(asyncio.create_task(ChangeStreamSubscriber(db).run()))
+
+    state["startup_seconds"] = round(time.perf_counter() - started, 3)
+    state["ready"] = True
+    try:
+        yield
+    finally:
+        state["ready"] = False
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        close()
+
+
+# Liveness: the process is up and serving requests
+@router.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+# Readiness: the pool is open and caches are warm
+@router.get("/readyz")
+async def readyz():
+    if not state["ready"]:
+        return JSONResponse(status_code=503, content=dict(state, status="starting"))
+    return dict(state, status="ready")
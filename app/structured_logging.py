@@ -0,0 +1,186 @@
+# Structured, non-blocking logging.
+#
+# Every record is handed to a bounded in-memory queue on the request path and
+# written by a background QueueListener thread, so a slow stdout/stderr sink
+# never holds up the event loop. Records are not formatted on the request
+# path either: the message (``msg % args``), the traceback and the JSON line
+# are all built by the writer thread. Log with %-style arguments
+# (``logger.info("Booked %s", appointment_id)``) and pass values that will not
+# change afterwards.
+#
+# RequestContextMiddleware gives each request an id (the caller's X-Request-ID
+# or a fresh one, echoed back in the response) and every line logged while
+# serving it carries that id, the method, the route template and the
+# milliseconds elapsed since the request arrived.
+import atexit
+import contextvars
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import orjson
+
+from app import config
+from app.metrics import Counter, register, route_template
+
+log_records_dropped = register(Counter(
+    "log_records_dropped_total", "Log records dropped because the log queue was full"
+))
+
+_request_context = contextvars.ContextVar("request_context", default=None)
+
+# Attributes every LogRecord has; anything else on a record came in through ``extra=``
+_STANDARD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listener = None
+_handler = None
+
+
+class _RequestContextFilter(logging.Filter):
+    """Stamps records with the current request's id, route and elapsed time.
+
+    Runs in the thread that logged, since that is where the request context is.
+    """
+
+    def filter(self, record):
+        context = _request_context.get()
+        if context is not None:
+            if context["route"] is None:
+                context["route"] = route_template(context["scope"].get("app"), context["scope"])
+            record.request_id = context["request_id"]
+            record.method = context["method"]
+            record.route = context["route"]
+            record.elapsed_ms = round((time.perf_counter() - context["started"]) * 1000, 2)
+        return True
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never waits: a full queue drops the record and counts it."""
+
+    def prepare(self, record):
+        # The stock prepare() formats the record here; leave that to the writer thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            log_records_dropped.inc()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with request context and ``extra=`` fields as keys."""
+
+    def format(self, record):
+        line = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_ATTRIBUTES:
+                line[key] = value
+        if record.exc_info:
+            line["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            line["exception"] = record.exc_text
+        # str() anything else (ObjectIds, ...) rather than lose the line
+        return orjson.dumps(line, default=str).decode()
+
+
+class TextFormatter(logging.Formatter):
+    """Plain-text lines for local development; request context is appended when present."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        if getattr(record, "request_id", None):
+            text += f" [request_id={record.request_id} route={record.method} {record.route} elapsed_ms={record.elapsed_ms}]"
+        return text
+
+
+def configure_logging(stream=None):
+    """Send the root logger through the queue to a background writer; safe to call again.
+
+    Handlers already on the root logger (e.g. test capture) are left alone.
+    """
+    global _listener, _handler
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if config.LOG_FORMAT == "json" else TextFormatter())
+    records = queue.Queue(maxsize=config.LOG_QUEUE_MAX_RECORDS)
+    _handler = _NonBlockingQueueHandler(records)
+    _handler.addFilter(_RequestContextFilter())
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(config.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def shutdown_logging():
+    """Write out whatever is still queued and stop the writer thread."""
+    global _listener, _handler
+    if _listener is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _listener.stop()
+    _listener = _handler = None
+
+
+access_logger = logging.getLogger("app.access")
+
+
+class RequestContextMiddleware:
+    """ASGI middleware giving each request an id and logging one line when it finishes."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        context = {
+            "request_id": request_id or uuid.uuid4().hex,
+            "method": scope["method"],
+            "route": None,  # Resolved on first use
+            "scope": scope,
+            "started": time.perf_counter(),
+        }
+        token = _request_context.set(context)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-request-id", context["request_id"].encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if config.LOG_REQUESTS:
+                access_logger.info("%s %s %s", scope["method"], scope["path"], status["code"], extra={"status": status["code"]})
+            _request_context.reset(token)
@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.admission import AdmissionMiddleware, ConcurrencyGate, TokenBuckets
+
+
+def test_token_bucket_allows_a_burst_then_asks_to_wait():
+    buckets = TokenBuckets(rate=1.0, burst=3)
+
+    assert [buckets.take("student") for _ in range(3)] == [0, 0, 0]
+    assert 0 < buckets.take("student") <= 1.0
+    assert buckets.take("someone-else") == 0
+
+
+@pytest.mark.asyncio
+async def test_gate_serializes_holders_of_the_same_key():
+    gate = ConcurrencyGate(limit=1, max_waiting=10, timeout=1.0)
+    inside = []
+    overlaps = []
+
+    async def book(key):
+        async with gate.enter(key):
+            overlaps.append(key in inside)
+            inside.append(key)
+            await asyncio.sleep(0.01)
+            inside.remove(key)
+
+    await asyncio.gather(*(book("professor-1") for _ in range(5)), book("professor-2"))
+
+    assert overlaps == [False] * 6
+    assert gate._gates == {}
+
+
+@pytest.mark.asyncio
+async def test_gate_sheds_when_the_queue_is_full():
+    gate = ConcurrencyGate(limit=1, max_waiting=1, timeout=1.0)
+    release = asyncio.Event()
+
+    async def holder():
+        async with gate.enter("professor"):
+            await release.wait()
+
+    async def waiter():
+        async with gate.enter("professor"):
+            pass
+
+    tasks = [asyncio.create_task(holder()), asyncio.create_task(waiter())]
+    await asyncio.sleep(0.01)
+    with pytest.raises(HTTPException) as shed:
+        async with gate.enter("professor"):
+            pass
+    assert shed.value.status_code == 503 and "Retry-After" in shed.value.headers
+    release.set()
+    await asyncio.gather(*tasks)
+
+
+@pytest.mark.asyncio
+async def test_middleware_returns_503_beyond_the_in_flight_limit():
+    release = asyncio.Event()
+
+    async def app(scope, receive, send):
+        await release.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    middleware = AdmissionMiddleware(app, max_in_flight=1)
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": "/appointments"}
+    first = asyncio.create_task(middleware(scope, None, send))
+    await asyncio.sleep(0.01)
+    await middleware(scope, None, send)
+
+    assert sent[0]["status"] == 503
+    assert (b"retry-after", b"1") in sent[0]["headers"]
+    release.set()
+    await first
+    assert sent[-2]["status"] == 200 and middleware.in_flight == 0
@@ -0,0 +1,78 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from app import archive
+from app.archive import archive_old_appointments, merge_pages, with_epoch_times
+from app.times import bounds
+
+# Archiving uses bulk replaces, which need a real mongod; mongomock's bulk_write rejects current pymongo ReplaceOne
+MONGO_URI = os.getenv("MONGO_REPLICA_SET_URI")
+
+
+def row(appointment_id, cursor_time):
+    return {"appointment_id": appointment_id, "cursor_time": cursor_time}
+
+
+def test_history_pages_merge_in_listing_order():
+    hot = [row("a3", 30), row("a5", 50)]
+    cold = [row("a1", 10), row("a2", 30), row("a4", 40)]
+
+    merged = merge_pages(hot, cold, limit=3)
+
+    assert [r["appointment_id"] for r in merged] == ["a1", "a2", "a3", "a4"]
+
+
+def test_history_pages_merge_most_recent_first_and_prefer_the_hot_copy():
+    hot = [row("a5", 50), row("a2", 20)]
+    cold = [row("a4", 40), row("a2", 20), row("a1", 10)]
+
+    merged = merge_pages(hot, cold, limit=10, descending=True)
+
+    assert [r["appointment_id"] for r in merged] == ["a5", "a4", "a2", "a1"]
+    assert merged[2] is hot[1]
+
+
+def test_appointments_from_before_integer_times_get_them_when_archived():
+    legacy = {"_id": ObjectId(), "start_time": "2030-01-07T09:00:00", "end_time": datetime(2030, 1, 7, 9, 15)}
+
+    archived = with_epoch_times(legacy)
+
+    assert archived == {"_id": legacy["_id"], **bounds(datetime(2030, 1, 7, 9), datetime(2030, 1, 7, 9, 15))}
+    assert with_epoch_times(archived) is archived
+    unreadable = {"_id": 1, "start_time": "soon", "end_time": "later"}
+    assert with_epoch_times(unreadable) is unreadable
+
+
+@pytest.mark.skipif(not MONGO_URI, reason="MONGO_REPLICA_SET_URI is not set")
+@pytest.mark.asyncio
+async def test_old_appointments_move_to_the_archive(monkeypatch):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    monkeypatch.setattr(archive.config, "ARCHIVE_AFTER_DAYS", 30)
+    monkeypatch.setattr(archive.config, "ARCHIVE_BATCH_SIZE", 2)
+    monkeypatch.setattr(archive.config, "ARCHIVE_PAUSE_SECONDS", 0)
+    client = AsyncIOMotorClient(MONGO_URI)
+    await client.drop_database("archive_test")
+    db = client["archive_test"]
+    now = datetime(2030, 6, 1)
+    appointments = [
+        {
+            "professor_id": ObjectId(),
+            "student_id": ObjectId(),
+            **bounds(now - timedelta(days=days), now - timedelta(days=days) + timedelta(minutes=15)),
+            "is_canceled": days == 90,
+        }
+        for days in (400, 90, 45, 10, -5)
+    ]
+    await db["appointments"].insert_many(appointments)
+
+    assert await archive_old_appointments(db, now=now) == 3
+
+    assert await db["appointments"].count_documents({}) == 2
+    assert await db[archive.COLLECTION].count_documents({}) == 3
+    assert await db[archive.COLLECTION].find_one({"is_canceled": True}) is not None
+    assert await archive_old_appointments(db, now=now) == 0
+    client.close()
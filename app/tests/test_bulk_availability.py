@@ -0,0 +1,56 @@
+from datetime import date, datetime, time
+
+import pytest
+from pydantic import ValidationError
+
+from app.bulk_availability import expand_weekly, sweep_conflicts
+from app.schemas import WeeklyRecurrence
+
+
+def test_expand_weekly_skips_other_days_and_exclusions():
+    # 2024-06-03 is a Monday
+    slots = expand_weekly(
+        weekdays=[0, 2], start=time(14), end=time(15),
+        from_date=date(2024, 6, 3), until=date(2024, 6, 17),
+        exclude=[date(2024, 6, 12)],
+    )
+    assert [slot[0].date() for slot in slots] == [
+        date(2024, 6, 3), date(2024, 6, 5), date(2024, 6, 10), date(2024, 6, 17),
+    ]
+    assert slots[0] == (datetime(2024, 6, 3, 14), datetime(2024, 6, 3, 15))
+
+
+def test_recurrences_with_utc_offsets_expand_to_utc():
+    recurrence = WeeklyRecurrence(
+        weekdays=[0], start="01:00:00+02:00", end="02:30:00+02:00", **{"from": "2024-06-03"}, until="2024-06-03",
+    )
+
+    slots = expand_weekly(
+        recurrence.weekdays, recurrence.start, recurrence.end, recurrence.from_date, recurrence.until,
+    )
+
+    # 01:00 on Monday at +02:00 is still Sunday in UTC
+    assert slots == [(datetime(2024, 6, 2, 23), datetime(2024, 6, 3, 0, 30))]
+
+
+def test_recurrences_mixing_utc_offsets_are_rejected():
+    with pytest.raises(ValidationError):
+        WeeklyRecurrence(weekdays=[0], start="09:00:00+02:00", end="10:00:00", **{"from": "2024-06-03"}, until="2024-06-10")
+
+
+def test_sweep_conflicts_against_existing_and_batch():
+    def at(hour):
+        return datetime(2024, 6, 3, hour)
+
+    existing = [("long", at(8), at(12)), ("short", at(9), at(10))]
+    candidates = [(at(14), at(15)), (at(11), at(13)), (at(12), at(13)), (at(14), at(16)), (at(16), at(17))]
+
+    results = sweep_conflicts(candidates, existing)
+
+    assert [conflict for _, conflict in results] == [
+        None,
+        ("long", at(8), at(12)),
+        None,
+        (None, at(14), at(15)),
+        None,
+    ]
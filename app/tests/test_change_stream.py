@@ -0,0 +1,177 @@
+import asyncio
+import os
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app import config
+from app.change_stream import ChangeStreamSubscriber, TOKENS_COLLECTION, _use_long_ttls
+from app.schedule_index import schedule_index
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+# Change streams need a replica set, e.g. a local single-node one started with
+#   mongod --replSet rs0 --dbpath /tmp/rs0 && mongosh --eval "rs.initiate()"
+REPLICA_SET_URI = os.getenv("MONGO_REPLICA_SET_URI")
+
+
+async def wait_for(predicate, timeout=10.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached before timeout")
+        await asyncio.sleep(0.05)
+
+
+@pytest.mark.skipif(not REPLICA_SET_URI, reason="MONGO_REPLICA_SET_URI is not set")
+@pytest.mark.asyncio
+async def test_writes_from_another_worker_reach_the_schedule_index():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(REPLICA_SET_URI)
+    db = client["change_stream_test"]
+    await client.drop_database("change_stream_test")
+    professor_id = ObjectId()
+    schedule = await schedule_index.get(db, professor_id)
+
+    subscriber = ChangeStreamSubscriber(db, consumer="test-worker")
+    task = asyncio.create_task(subscriber.run())
+    try:
+        await wait_for(lambda: subscriber.healthy)
+
+        # A write made directly against the database, as another worker would
+        slot = {"professor_id": professor_id, "start_time": datetime(2030, 1, 1, 9), "end_time": datetime(2030, 1, 1, 10)}
+        result = await db["availability"].insert_one(slot)
+        await wait_for(lambda: result.inserted_id in schedule.free)
+
+        await db["availability"].delete_one({"_id": result.inserted_id})
+        await wait_for(lambda: result.inserted_id not in schedule.free)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    # The resume token was persisted for the consumer
+    assert await db[TOKENS_COLLECTION].find_one({"_id": "test-worker"}) is not None
+    schedule_index.invalidate()
+    await client.drop_database("change_stream_test")
+    client.close()
+
+
+class FakeStream:
+    """Replays events like a change stream, then ends or fails with ``error``."""
+
+    def __init__(self, events, error):
+        self.events = events
+        self.error = error
+        self.resume_token = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def __aiter__(self):
+        for number, event in enumerate(self.events):
+            self.resume_token = {"_data": str(number)}
+            yield event
+        if self.error is not None:
+            raise self.error
+
+
+class StreamDatabase:
+    def __init__(self, events=(), error=None):
+        self.events = events
+        self.error = error
+        self.store = mongomock_motor.AsyncMongoMockClient()["change_stream_unit"]
+
+    def __getitem__(self, name):
+        return self.store[name]
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+    def watch(self, pipeline, **options):
+        return FakeStream(self.events, self.error)
+
+
+def availability_event(document):
+    return {"ns": {"coll": "availability"}, "documentKey": {"_id": document["_id"]}, "fullDocument": document}
+
+
+@pytest.fixture
+def caches():
+    schedule_index.invalidate()
+    yield
+    schedule_index.invalidate()
+    _use_long_ttls(False)
+
+
+@pytest.mark.asyncio
+async def test_a_malformed_event_is_skipped_and_its_schedule_dropped(caches):
+    broken_professor, professor = ObjectId(), ObjectId()
+    db = StreamDatabase([
+        availability_event({"_id": ObjectId(), "professor_id": broken_professor, "end_time": datetime(2030, 1, 1, 10)}),
+        availability_event({
+            "_id": ObjectId(), "professor_id": professor,
+            "start_time": datetime(2030, 1, 1, 9), "end_time": datetime(2030, 1, 1, 10),
+        }),
+    ])
+    await schedule_index.get(db, broken_professor)
+    schedule = await schedule_index.get(db, professor)
+
+    subscriber = ChangeStreamSubscriber(db, consumer="unit-worker")
+    await subscriber.run_once()
+
+    assert schedule_index.cached(broken_professor) is None
+    assert len(schedule.free) == 1
+    assert subscriber._token == {"_data": "1"}
+
+
+@pytest.mark.asyncio
+async def test_any_subscriber_failure_falls_back_to_short_ttls(caches):
+    professor = ObjectId()
+    db = StreamDatabase(error=RuntimeError("unexpected"))
+    await schedule_index.get(db, professor)
+    subscriber = ChangeStreamSubscriber(db, consumer="unit-worker")
+
+    task = asyncio.create_task(subscriber.run())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert not subscriber.healthy
+    assert schedule_index.ttl == config.SCHEDULE_INDEX_TTL_SECONDS
+    assert schedule_index.cached(professor) is None
+
+
+@pytest.mark.asyncio
+async def test_workers_take_their_own_slots_and_a_restarted_one_resumes(monkeypatch):
+    monkeypatch.setattr(config, "CHANGE_STREAM_CONSUMER", "host-a")
+    db = StreamDatabase()
+    first, second = ChangeStreamSubscriber(db), ChangeStreamSubscriber(db)
+    first.consumer = await first._claim_consumer()
+    second.consumer = await second._claim_consumer()
+    first._token = {"_data": "7"}
+    await first._save_token(force=True)
+    await first._release_consumer()  # As on shutdown
+
+    restarted = ChangeStreamSubscriber(db)
+    restarted.consumer = await restarted._claim_consumer()
+    another = ChangeStreamSubscriber(db)
+
+    assert (first.consumer, second.consumer, restarted.consumer) == ("host-a:0", "host-a:1", "host-a:0")
+    assert await restarted._load_token() == {"_data": "7"}
+    assert await another._claim_consumer() == "host-a:2"
+
+
+@pytest.mark.asyncio
+async def test_a_slot_whose_worker_died_is_taken_over_after_its_lease(monkeypatch):
+    monkeypatch.setattr(config, "CHANGE_STREAM_CONSUMER", "host-b")
+    db = StreamDatabase()
+    assert await ChangeStreamSubscriber(db)._claim_consumer() == "host-b:0"  # Never released
+    assert await ChangeStreamSubscriber(db)._claim_consumer() == "host-b:1"
+
+    monkeypatch.setattr(config, "CHANGE_STREAM_SLOT_LEASE_SECONDS", 0)
+    assert await ChangeStreamSubscriber(db)._claim_consumer() == "host-b:0"
@@ -0,0 +1,94 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app import times
+from app.compaction import LEASE_COLLECTION, _compact_run, coalesce, compact_professor, restore_interval
+
+
+def slot(slot_id, start_hour, end_hour):
+    return {"_id": slot_id, "start_time": datetime(2024, 6, 22, start_hour), "end_time": datetime(2024, 6, 22, end_hour)}
+
+
+def test_touching_and_overlapping_fragments_form_runs():
+    slots = [slot("a", 8, 9), slot("b", 9, 10), slot("c", 9, 11), slot("d", 12, 13), slot("e", 14, 15), slot("f", 15, 16)]
+
+    runs = coalesce(slots)
+
+    assert [(head["_id"], [o["_id"] for o in others], end.hour) for head, others, _, end in runs] == [
+        ("a", ["b", "c"], 11),
+        ("e", ["f"], 16),
+    ]
+
+
+def test_isolated_slots_are_left_alone():
+    assert coalesce([slot("a", 8, 9), slot("b", 10, 11)]) == []
+
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["compaction_test"]
+
+
+async def add_fragments(db, professor_id, *hours):
+    result = await db["availability"].insert_many([
+        {"professor_id": professor_id, **times.bounds(datetime(2030, 1, 7, start), datetime(2030, 1, 7, end))}
+        for start, end in hours
+    ])
+    return result.inserted_ids
+
+
+async def free_hours(db, professor_id):
+    slots = await db["availability"].find({"professor_id": professor_id}).sort("start_time", 1).to_list(length=None)
+    return [(slot["start_time"].hour, slot["end_time"].hour) for slot in slots]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_passes_do_not_stretch_over_reinserted_fragments(db):
+    professor_id = ObjectId()
+    await add_fragments(db, professor_id, (9, 10), (10, 11), (11, 12))
+
+    removed = await asyncio.gather(compact_professor(db, professor_id), compact_professor(db, professor_id))
+
+    assert sorted(removed) == [0, 2]
+    assert await free_hours(db, professor_id) == [(9, 12)]
+    assert await db[LEASE_COLLECTION].count_documents({}) == 0
+
+
+@pytest.mark.asyncio
+async def test_a_held_lease_skips_the_professor(db):
+    professor_id = ObjectId()
+    await add_fragments(db, professor_id, (9, 10), (10, 11))
+    await db[LEASE_COLLECTION].insert_one({"_id": professor_id, "owner": ObjectId(), "expires_at": datetime(2100, 1, 1)})
+
+    assert await compact_professor(db, professor_id) == 0
+    assert await free_hours(db, professor_id) == [(9, 10), (10, 11)]
+
+
+@pytest.mark.asyncio
+async def test_a_claimed_fragment_abandons_the_run_and_only_deleted_ones_return(db):
+    professor_id = ObjectId()
+    _, middle, _ = await add_fragments(db, professor_id, (9, 10), (10, 11), (11, 12))
+    slots = await db["availability"].find({"professor_id": professor_id}).sort("start_time", 1).to_list(length=None)
+    # A booking claims the middle fragment after the pass read it
+    await db["availability"].update_one({"_id": middle}, {"$set": times.bounds(end=datetime(2030, 1, 7, 10))})
+
+    assert await _compact_run(db["availability"], professor_id, slots[0], slots[1:], datetime(2030, 1, 7, 12)) == 0
+    assert await free_hours(db, professor_id) == [(9, 10), (10, 10), (11, 12)]
+
+
+@pytest.mark.asyncio
+async def test_restored_time_leaves_its_neighbours_for_compaction(db):
+    professor_id = ObjectId()
+    await add_fragments(db, professor_id, (9, 10), (11, 12))
+
+    await restore_interval(db, professor_id, datetime(2030, 1, 7, 10), datetime(2030, 1, 7, 11))
+    assert await free_hours(db, professor_id) == [(9, 10), (10, 11), (11, 12)]
+
+    assert await compact_professor(db, professor_id) == 2
+    assert await free_hours(db, professor_id) == [(9, 12)]
@@ -0,0 +1,56 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+
+from app import day_buckets
+from app.day_buckets import day_spans, free_intervals, from_words, runs, span_mask, to_words
+from app.migrate_day_buckets import build_buckets
+
+DAY = datetime(2030, 1, 7)
+
+
+def at(day, hour, minute=0):
+    return datetime(2030, 1, day, hour, minute)
+
+
+def test_spans_use_five_minute_slots_and_split_at_midnight():
+    assert day_spans(at(7, 9), at(7, 10)) == [(DAY, 108, 120)]
+    assert day_spans(at(7, 23), at(8, 1)) == [(DAY, 276, 288), (datetime(2030, 1, 8), 0, 12)]
+
+
+def test_off_grid_times_are_rejected_or_rounded():
+    with pytest.raises(ValueError):
+        day_spans(at(7, 9, 2), at(7, 10))
+    assert day_spans(at(7, 9, 2), at(7, 9, 58), align="inward") == [(DAY, 109, 119)]
+    assert day_spans(at(7, 9, 2), at(7, 9, 58), align="outward") == [(DAY, 108, 120)]
+
+
+def test_bitmaps_round_trip_through_words():
+    mask = span_mask(30, 40) | span_mask(100, 288)
+    words = to_words(mask)
+    assert len(words) == day_buckets.WORDS and all(0 <= word < 2 ** 32 for word in words)
+    assert from_words(words) == mask
+    assert runs(mask) == [(30, 40), (100, 288)]
+
+
+def test_free_runs_touching_midnight_are_joined():
+    buckets = [
+        {"day": DAY, "free": to_words(span_mask(276, 288))},
+        {"day": datetime(2030, 1, 8), "free": to_words(span_mask(0, 12) | span_mask(24, 36))},
+    ]
+    assert free_intervals(buckets) == [(at(7, 23), at(8, 1)), (at(8, 2), at(8, 3))]
+
+
+def test_migration_keeps_free_and_booked_disjoint():
+    professor_id = ObjectId()
+    slots = [{"start_time": at(7, 9), "end_time": at(7, 12)}]
+    bookings = [{"start_time": at(7, 10, 3), "end_time": at(7, 10, 20)}]
+
+    [bucket] = build_buckets(professor_id, slots, bookings)
+
+    free, booked = from_words(bucket["free"]), from_words(bucket["booked"])
+    assert free & booked == 0
+    assert runs(booked) == [(120, 124)]
+    assert runs(free) == [(108, 120), (124, 144)]
+    assert bucket["_id"] == f"{professor_id}:2030-01-07"
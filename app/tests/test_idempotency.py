@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app import idempotency
+from app.idempotency import run_idempotent
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def db():
+    idempotency._completed.invalidate()
+    return mongomock_motor.AsyncMongoMockClient()["idempotency_test"]
+
+
+def counting(result=None, error=None, delay=0):
+    calls = []
+
+    async def operation():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return result
+
+    return operation, calls
+
+
+@pytest.mark.asyncio
+async def test_retry_replays_the_stored_response(db):
+    operation, calls = counting({"appointment_id": "a1"})
+
+    first = await run_idempotent(db, "key-1", "student", "POST /appointments", {"x": 1}, operation)
+    idempotency._completed.invalidate()  # As if the retry reached another worker
+    retry = await run_idempotent(db, "key-1", "student", "POST /appointments", {"x": 1}, operation)
+
+    assert len(calls) == 1
+    assert retry.body == first.body == b'{"appointment_id":"a1"}'
+    assert retry.headers["Idempotent-Replayed"] == "true"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_duplicates_run_once(db):
+    operation, calls = counting({"ok": True}, delay=0.05)
+
+    responses = await asyncio.gather(*(
+        run_idempotent(db, "key-2", "student", "POST /appointments", {"x": 1}, operation) for _ in range(5)
+    ))
+
+    assert len(calls) == 1
+    assert {response.body for response in responses} == {b'{"ok":true}'}
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_replayed_but_server_errors_are_retried(db):
+    conflict, conflict_calls = counting(error=HTTPException(status_code=409, detail="taken"))
+    for _ in range(2):
+        response = await run_idempotent(db, "key-3", "student", "POST /appointments", {}, conflict)
+        assert response.status_code == 409
+    assert len(conflict_calls) == 1
+
+    failure, failure_calls = counting(error=HTTPException(status_code=500, detail="boom"))
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await run_idempotent(db, "key-4", "student", "POST /appointments", {}, failure)
+    assert len(failure_calls) == 2
+
+    limited, limited_calls = counting(error=HTTPException(status_code=429, detail="slow down"))
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            await run_idempotent(db, "key-6", "student", "POST /appointments", {}, limited)
+    assert len(limited_calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_reusing_a_key_for_another_request_is_rejected(db):
+    operation, _ = counting({"ok": True})
+    await run_idempotent(db, "key-5", "student", "POST /availability", {"start": 1}, operation)
+
+    with pytest.raises(HTTPException) as rejected:
+        await run_idempotent(db, "key-5", "student", "POST /availability", {"start": 2}, operation)
+    assert rejected.value.status_code == 422
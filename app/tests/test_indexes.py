@@ -0,0 +1,90 @@
+import pytest
+from pymongo import ASCENDING
+
+from app import config
+from app.indexes import INDEXES, ensure_indexes, find_unindexed_queries
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def db():
+    return mongomock_motor.AsyncMongoMockClient()["indexes_test"]
+
+
+@pytest.mark.asyncio
+async def test_declared_indexes_are_created_with_their_keys(db):
+    assert await ensure_indexes(db) == []
+
+    availability = await db["availability"].index_information()
+    start, end, suffix = ("start_ts", "end_ts", "ts") if config.EPOCH_TIME_QUERIES else ("start_time", "end_time", "time")
+    assert list(availability[f"professor_{suffix}"]["key"]) == [("professor_id", 1), (start, 1), (end, 1)]
+    assert availability["end_time_ttl"]["expireAfterSeconds"] == config.AVAILABILITY_EXPIRE_AFTER_SECONDS
+    assert (await db["users"].index_information())["username_unique"]["unique"]
+    for collection_name, models in INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for model in models:
+            name = model.document["name"]
+            assert list(existing[name]["key"]) == list(model.document["key"].items()), (collection_name, name)
+
+
+@pytest.mark.asyncio
+async def test_an_index_declared_differently_in_the_database_is_reported(db):
+    await db["users"].create_index([("username", ASCENDING), ("role", ASCENDING)], name="username_unique")
+
+    problems = await ensure_indexes(db)
+
+    assert len(problems) == 1 and problems[0].startswith("users:")
+
+
+class ExplainedCursor:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def sort(self, sort):
+        return self
+
+    async def explain(self):
+        return {"queryPlanner": {"winningPlan": self.plan}}
+
+
+class ExplainedCollection:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def find(self, query):
+        return ExplainedCursor(self.plan)
+
+
+class ExplainedDatabase:
+    """Answers explain() with a canned winning plan per collection."""
+
+    def __init__(self, plans):
+        self.plans = plans
+
+    def __getitem__(self, name):
+        return ExplainedCollection(self.plans[name])
+
+
+@pytest.mark.asyncio
+async def test_query_shapes_planned_as_collection_scans_are_reported():
+    indexed = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "professor_time"}}
+    sorted_scan = {"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}}
+    either = {"stage": "SUBPLAN", "inputStage": {"stage": "OR", "inputStages": [
+        {"stage": "IXSCAN"}, {"stage": "COLLSCAN"},
+    ]}}
+    db = ExplainedDatabase({
+        "users": indexed,
+        "availability": indexed,
+        "appointments": indexed,
+        "appointments_archive": sorted_scan,
+        "day_buckets": either,
+    })
+
+    unindexed = await find_unindexed_queries(db)
+
+    assert [collection_name for collection_name, _, _ in unindexed] == [
+        "appointments_archive", "day_buckets", "day_buckets",
+    ]
+    assert unindexed[0][2] == ["SORT", "COLLSCAN"]
+    assert unindexed[1][2] == ["SUBPLAN", "OR", "IXSCAN", "COLLSCAN"]
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from bson import ObjectId
+from fastapi_jwt_auth import AuthJWT
+from httpx import ASGITransport, AsyncClient
+
+from app.db import get_db
+from app.main import application
+from app.metrics import MetricsMiddleware, command_metrics_listener, render
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest_asyncio.fixture
+async def client():
+    application.dependency_overrides[get_db] = lambda: mongomock_motor.AsyncMongoMockClient()["metrics_test"]
+    async with AsyncClient(transport=ASGITransport(app=application), base_url="http://test") as http:
+        yield http
+    application.dependency_overrides.clear()
+
+
+def sample(series):
+    """Current value of one series in the exposition, 0 before it is first recorded."""
+    for line in render().splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+
+def command_event(request_id, command_name="find", collection="availability"):
+    return SimpleNamespace(
+        command_name=command_name, command={command_name: collection}, connection_id=("localhost", 27017),
+        request_id=request_id, duration_micros=1500,
+    )
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_served_as_prometheus_text_labelled_by_route_template(client):
+    appointment_id = str(ObjectId())
+    professor_token = AuthJWT().create_access_token(subject=str(ObjectId()), user_claims={"role": "professor"})
+    headers = {"Authorization": f"Bearer {professor_token}"}
+    canceled = await client.put(f"/appointments/{appointment_id}", headers=headers)
+
+    response = await client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert canceled.status_code == 404
+    assert 'http_responses_total{method="PUT",route="/appointments/{appointmentid}",status="404"}' in response.text
+    assert appointment_id not in response.text
+
+
+@pytest.mark.asyncio
+async def test_admission_and_pool_gauges_are_exported(client):
+    text = (await client.get("/metrics")).text
+
+    assert "# TYPE admission_in_flight gauge" in text
+    assert "# TYPE booking_queue_depth gauge" in text
+    assert 'mongo_pool{stat="max_pool_size"}' in text
+    assert 'mongo_pool{stat="checked_out"}' in text
+    assert "# TYPE user_cache gauge" in text
+
+
+@pytest.mark.asyncio
+async def test_mongo_round_trips_are_counted_per_request():
+    async def endpoint(scope, receive, send):
+        # The commands a route would issue; Motor calls the listener in the request's context
+        for request_id in (1, 2, 3):
+            command_metrics_listener.started(command_event(request_id))
+            command_metrics_listener.succeeded(command_event(request_id))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    round_trips = 'mongo_round_trips_per_request_sum{method="GET",route="/poolstats"}'
+    commands = 'mongo_command_duration_seconds_count{collection="availability",command="find"}'
+    before = sample(round_trips), sample(commands)
+    scope = {"type": "http", "method": "GET", "path": "/poolstats", "headers": [], "app": application}
+
+    await MetricsMiddleware(endpoint)(scope, None, send)
+    # Commands outside a request are timed but not attributed to one
+    command_metrics_listener.started(command_event(4))
+    command_metrics_listener.succeeded(command_event(4))
+
+    assert (sample(round_trips) - before[0], sample(commands) - before[1]) == (3, 4)
@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+
+import orjson
+import pytest
+from bson import ObjectId
+
+from app import config
+from app.pagination import InvalidCursor, decode_cursor, encode_cursor, keyset_filter
+from app.routes.appointments import _ndjson_lines
+
+
+def test_cursors_round_trip_as_epoch_seconds():
+    document_id = ObjectId()
+
+    cursor = encode_cursor(datetime(2030, 1, 7, 9, 30), document_id)
+
+    assert decode_cursor(cursor) == (1894008600, document_id)
+
+
+def test_cursors_from_before_epoch_seconds_still_decode():
+    document_id = ObjectId()
+    payload = json.dumps({"t": "2030-01-07T09:30:00", "id": str(document_id)}).encode()
+    legacy = base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+    assert decode_cursor(legacy) == (1894008600, document_id)
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", base64.urlsafe_b64encode(b'{"t": 1}').decode()])
+def test_malformed_cursors_are_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
+
+
+def test_keyset_filter_breaks_ties_on_id(monkeypatch):
+    monkeypatch.setattr(config, "EPOCH_TIME_QUERIES", True)
+    document_id = ObjectId()
+    cursor = encode_cursor(datetime(2030, 1, 7, 9, 30), document_id)
+
+    assert keyset_filter("start_ts", cursor, descending=True) == {"$or": [
+        {"start_ts": {"$lt": 1894008600}},
+        {"start_ts": 1894008600, "_id": {"$lt": document_id}},
+    ]}
+
+
+async def _documents(*hours):
+    for hour in hours:
+        yield {"appointment_id": str(ObjectId()), "start_time": f"2030-01-07T{hour:02}:00:00", "cursor_time": hour}
+
+
+@pytest.mark.asyncio
+async def test_ndjson_stream_ends_with_the_next_cursor_only_when_more_remain():
+    full = [orjson.loads(line) async for line in _ndjson_lines(_documents(9, 10, 11), limit=2)]
+    last = [orjson.loads(line) async for line in _ndjson_lines(_documents(9, 10), limit=2)]
+
+    assert [line.get("start_time") for line in full] == ["2030-01-07T09:00:00", "2030-01-07T10:00:00", None]
+    assert all("cursor_time" not in line for line in full)
+    assert decode_cursor(full[-1]["next_cursor"]) == (10, ObjectId(full[1]["appointment_id"]))
+    assert [line["start_time"] for line in last] == ["2030-01-07T09:00:00", "2030-01-07T10:00:00"]
@@ -0,0 +1,150 @@
+import time
+
+import pytest
+from bson import Timestamp
+
+from app.cache import MISSING
+from app.read_routing import (
+    CausalPositionMiddleware, _write_positions, carries_newer_position, decode_position, encode_position,
+    read_session, write_session,
+)
+
+
+class FakeSession:
+    """Records the causal position a real ClientSession would carry."""
+
+    def __init__(self, operation_time=None):
+        self.cluster_time = {"clusterTime": operation_time} if operation_time else None
+        self.operation_time = operation_time
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def advance_cluster_time(self, cluster_time):
+        self.cluster_time = cluster_time
+
+    def advance_operation_time(self, operation_time):
+        self.operation_time = operation_time
+
+
+class FakeClient:
+    def __init__(self):
+        self.next_operation_time = None
+
+    async def start_session(self, causal_consistency=False):
+        assert causal_consistency
+        return FakeSession(self.next_operation_time)
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.client = FakeClient()
+
+
+@pytest.mark.asyncio
+async def test_reads_without_a_recent_write_take_no_session():
+    async with read_session(FakeDatabase(), "no-writes-yet") as session:
+        assert session is None
+
+
+@pytest.mark.asyncio
+async def test_reads_wait_for_the_users_latest_write():
+    db = FakeDatabase()
+    db.client.next_operation_time = Timestamp(1700000000, 1)
+    async with write_session(db, "student-1", "professor-1"):
+        pass
+
+    for user_id in ("student-1", "professor-1"):
+        async with read_session(db, user_id) as session:
+            assert session.operation_time == Timestamp(1700000000, 1)
+
+
+@pytest.mark.asyncio
+async def test_an_older_write_does_not_move_the_position_back():
+    db = FakeDatabase()
+    db.client.next_operation_time = Timestamp(1700000100, 1)
+    async with write_session(db, "student-2"):
+        pass
+    db.client.next_operation_time = Timestamp(1700000050, 1)
+    async with write_session(db, "student-2"):
+        pass
+
+    async with read_session(db, "student-2") as session:
+        assert session.operation_time == Timestamp(1700000100, 1)
+
+
+async def through_middleware(handler, position=None):
+    """Run ``handler`` as the endpoint behind CausalPositionMiddleware; returns the X-Causal-Position sent back."""
+    sent = {}
+
+    async def endpoint(scope, receive, send):
+        await handler()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def send(message):
+        sent.update(dict(message["headers"]))
+
+    headers = [(b"x-causal-position", position.encode())] if position else []
+    await CausalPositionMiddleware(endpoint)({"type": "http", "headers": headers}, None, send)
+    position = sent.get(b"x-causal-position")
+    return position.decode() if position else None
+
+
+@pytest.mark.asyncio
+async def test_positions_carried_by_the_client_reach_another_worker():
+    db = FakeDatabase()
+    db.client.next_operation_time = Timestamp(1700000200, 1)
+
+    async def book():
+        async with write_session(db, "student-3", "professor-3"):
+            pass
+
+    position = await through_middleware(book)
+    _write_positions.invalidate()  # The next request lands on a worker that never saw the write
+    seen = []
+
+    async def browse():
+        async with read_session(db, "student-3") as session:
+            seen.append(session.operation_time if session else None)
+
+    await through_middleware(browse, position)
+    await through_middleware(browse)
+    assert seen == [Timestamp(1700000200, 1), None]
+
+
+def test_positions_are_bound_to_their_users_and_cannot_be_altered():
+    cluster_time = {"clusterTime": Timestamp(1700000300, 1)}
+    position = encode_position(["student-4"], cluster_time, Timestamp(1700000300, 1))
+    forged = position[:-4] + ("AAAA" if position[-4:] != "AAAA" else "BBBB")
+    stale = encode_position(["student-4"], cluster_time, Timestamp(1700000300, 1), issued_at=time.time() - 3600)
+
+    assert decode_position(position, "student-4") == (cluster_time, Timestamp(1700000300, 1))
+    assert decode_position(position, "student-5") is MISSING
+    assert decode_position(forged, "student-4") is MISSING
+    assert decode_position(stale, "student-4") is MISSING
+    assert decode_position("not-a-position", "student-4") is MISSING
+
+
+@pytest.mark.asyncio
+async def test_only_positions_from_writes_elsewhere_count_as_newer():
+    db = FakeDatabase()
+    db.client.next_operation_time = Timestamp(1700000400, 1)
+
+    async def book():
+        async with write_session(db, "student-6"):
+            pass
+
+    position = await through_middleware(book)
+    newer = []
+
+    async def check():
+        newer.append(carries_newer_position("student-6"))
+
+    await through_middleware(check, position)  # This worker took the write itself
+    _write_positions.invalidate()
+    await through_middleware(check, position)
+    await through_middleware(check)
+    assert newer == [False, True, False]
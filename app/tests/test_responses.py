@@ -0,0 +1,33 @@
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from fastapi import Response
+
+from app.responses import FastJSONResponse, dumps, prebuilt
+
+
+def test_object_ids_and_datetimes_serialize_like_jsonable_encoder():
+    document_id = ObjectId()
+
+    body = dumps({"id": document_id, "start_time": datetime(2030, 1, 7, 9, 30), 1: "non-string key"})
+
+    assert body == f'{{"id":"{document_id}","start_time":"2030-01-07T09:30:00","1":"non-string key"}}'.encode()
+
+
+def test_unknown_types_still_fail_loudly():
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
+
+
+def test_prebuilt_responses_keep_headers_set_on_the_injected_response():
+    injected = Response()
+    injected.headers["ETag"] = '"v1"'
+
+    response = prebuilt({"ok": True}, injected, status_code=201)
+
+    assert isinstance(response, FastJSONResponse)
+    assert response.status_code == 201 and response.body == b'{"ok":true}'
+    assert response.headers["etag"] == '"v1"'
+    assert response.headers["content-type"] == "application/json"
+    assert response.headers["content-length"] == str(len(response.body))
@@ -0,0 +1,379 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from bson import ObjectId, Timestamp
+from fastapi_jwt_auth import AuthJWT
+from httpx import ASGITransport, AsyncClient
+from pymongo.errors import OperationFailure
+
+from app import admission, config, day_buckets, times
+from app.admission import ConcurrencyGate, TokenBuckets
+from app.db import get_db
+from app.main import application
+from app.read_routing import encode_position
+from app.routes import appointments
+from app.schedule_index import schedule_index
+from app.schedule_version import expiring, schedule_versions
+from app.users import remember_user, user_cache
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def at(hour, minute=0):
+    return datetime(2030, 1, 7, hour, minute)
+
+
+def token(user_id, role):
+    return AuthJWT().create_access_token(subject=str(user_id), user_claims={"role": role})
+
+
+@pytest.fixture
+def db(monkeypatch):
+    # mongomock has no sessions, and the tests make more writes than the rate limit allows
+    monkeypatch.setattr(config, "CAUSAL_READS", False)
+    monkeypatch.setattr(config, "RATE_LIMIT_WRITES_PER_SECOND", 0)
+    database = mongomock_motor.AsyncMongoMockClient()["routes_test"]
+    application.dependency_overrides[get_db] = lambda: database
+    schedule_index.invalidate()
+    user_cache.invalidate()
+    yield database
+    application.dependency_overrides.clear()
+    schedule_index.invalidate()
+    user_cache.invalidate()
+
+
+@pytest_asyncio.fixture
+async def client():
+    async with AsyncClient(transport=ASGITransport(app=application), base_url="http://test") as http:
+        yield http
+
+
+@pytest_asyncio.fixture
+async def professor(db):
+    result = await db["users"].insert_one({"username": "professor", "password": "-", "role": "professor"})
+    return result.inserted_id
+
+
+@pytest.mark.asyncio
+async def test_availability_over_a_booking_from_another_worker_is_rejected(db, client, professor):
+    await schedule_index.get(db, professor)  # Cached before the booking below
+    await db["appointments"].insert_one({
+        "professor_id": professor, "student_id": ObjectId(), "is_canceled": False, **times.bounds(at(10), at(11)),
+    })
+    headers = {"Authorization": f"Bearer {token(professor, 'professor')}"}
+
+    single = await client.post("/availability", headers=headers, json={
+        "professor_id": str(professor), "start_time": at(9).isoformat(), "end_time": at(12).isoformat(),
+    })
+    bulk = await client.post("/availability/bulk", headers=headers, json={
+        "professor_id": str(professor),
+        "intervals": [
+            {"start_time": at(10, 30).isoformat(), "end_time": at(11, 30).isoformat()},
+            {"start_time": at(13).isoformat(), "end_time": at(14).isoformat()},
+        ],
+    })
+
+    assert single.status_code == 409
+    assert [result["status"] for result in bulk.json()["results"]] == ["conflict", "accepted"]
+    assert "appointment_id" in bulk.json()["results"][0]["conflicts_with"]
+    assert await db["availability"].count_documents({}) == 1
+
+
+async def add_student(db, name):
+    result = await db["users"].insert_one({"username": name, "password": "-", "role": "student"})
+    return result.inserted_id
+
+
+async def book(client, professor, student, start, end):
+    return await client.post(
+        "/appointments",
+        headers={"Authorization": f"Bearer {token(student, 'student')}"},
+        json={
+            "professor_id": str(professor), "student_id": str(student),
+            "start_time": start.isoformat(), "end_time": end.isoformat(),
+        },
+    )
+
+
+def if_none_match(headers, etag):
+    return dict(headers, **{"If-None-Match": etag})
+
+
+async def free_times(db, professor):
+    slots = await db["availability"].find({"professor_id": professor}).sort("start_time", 1).to_list(length=None)
+    return [(slot["start_time"], slot["end_time"]) for slot in slots]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("gate_limit", [1, 10], ids=["gated", "ungated"])
+async def test_concurrent_bookings_of_one_slot_book_it_once(db, client, professor, monkeypatch, gate_limit):
+    # Ungated, every request reaches the conditional claim with the same cached schedule
+    monkeypatch.setattr(appointments, "booking_gate", ConcurrencyGate(limit=gate_limit, max_waiting=50, timeout=5))
+    await db["availability"].insert_one({"professor_id": professor, **times.bounds(at(9), at(12))})
+    students = [await add_student(db, f"student{i}") for i in range(5)]
+
+    responses = await asyncio.gather(*(book(client, professor, student, at(10), at(11)) for student in students))
+
+    assert sorted(response.status_code for response in responses) == [200, 409, 409, 409, 409]
+    assert await db["appointments"].count_documents({}) == 1
+    assert await free_times(db, professor) == [(at(9), at(10)), (at(11), at(12))]
+    schedule = await schedule_index.get(db, professor)
+    assert [(start, end) for _, start, end in schedule.free.items()] == [(at(9), at(10)), (at(11), at(12))]
+
+
+@pytest.mark.asyncio
+async def test_a_failed_remainder_write_releases_the_claim(db, client, professor, monkeypatch):
+    await db["availability"].insert_one({"professor_id": professor, **times.bounds(at(9), at(12))})
+    student = await add_student(db, "student")
+    original_bulk_write = mongomock_motor.AsyncMongoMockCollection.bulk_write
+
+    async def failing_bulk_write(self, *args, **kwargs):
+        if self.name == "availability":
+            raise OperationFailure("forced failure")
+        return await original_bulk_write(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock_motor.AsyncMongoMockCollection, "bulk_write", failing_bulk_write)
+    failed = await book(client, professor, student, at(10), at(11))
+
+    assert failed.status_code == 500
+    assert await db["appointments"].count_documents({}) == 0
+    assert await free_times(db, professor) == [(at(9), at(10)), (at(10), at(11)), (at(11), at(12))]
+
+    monkeypatch.setattr(mongomock_motor.AsyncMongoMockCollection, "bulk_write", original_bulk_write)
+    retried = await book(client, professor, student, at(10), at(11))
+    assert retried.status_code == 200
+    assert await free_times(db, professor) == [(at(9), at(10)), (at(11), at(12))]
+
+
+@pytest.mark.asyncio
+async def test_a_rollback_does_not_free_time_another_booking_claimed_meanwhile(db, client, professor, monkeypatch):
+    await db["availability"].insert_one({"professor_id": professor, **times.bounds(at(9), at(12))})
+    student = await add_student(db, "student")
+    original_bulk_write = mongomock_motor.AsyncMongoMockCollection.bulk_write
+
+    async def failing_bulk_write(self, *args, **kwargs):
+        if self.name == "availability":
+            # Meanwhile another booking takes [9:00, 10:00), all the claim left of the slot
+            await db["availability"].delete_one({"professor_id": professor})
+            raise OperationFailure("forced failure")
+        return await original_bulk_write(self, *args, **kwargs)
+
+    monkeypatch.setattr(mongomock_motor.AsyncMongoMockCollection, "bulk_write", failing_bulk_write)
+    failed = await book(client, professor, student, at(10), at(11))
+
+    assert failed.status_code == 500
+    assert await free_times(db, professor) == [(at(10), at(11)), (at(11), at(12))]
+
+
+@pytest.mark.asyncio
+async def test_availability_over_a_slot_from_another_worker_is_rejected(db, client, professor):
+    await schedule_index.get(db, professor)  # An empty schedule cached before the slot below
+    await db["availability"].insert_one({"professor_id": professor, **times.bounds(at(9), at(12))})
+    headers = {"Authorization": f"Bearer {token(professor, 'professor')}"}
+
+    response = await client.post("/availability", headers=headers, json={
+        "professor_id": str(professor), "start_time": at(10).isoformat(), "end_time": at(11).isoformat(),
+    })
+
+    assert response.status_code == 409
+    assert await db["availability"].count_documents({}) == 1
+
+
+@pytest.mark.asyncio
+async def test_weekly_availability_can_be_given_in_local_time(db, client, professor):
+    await db["availability"].insert_one({"professor_id": professor, **times.bounds(at(12), at(13))})
+    headers = {"Authorization": f"Bearer {token(professor, 'professor')}"}
+    recurrence = {
+        "weekdays": [0, 2], "start": "09:00:00+02:00", "end": "10:00:00+02:00", "from": "2030-01-07", "until": "2030-01-09",
+    }
+
+    response = await client.post("/availability/bulk", headers=headers, json={
+        "professor_id": str(professor), "recurrence": recurrence,
+    })
+
+    assert response.status_code == 200
+    wednesday = timedelta(days=2)
+    assert await free_times(db, professor) == [(at(7), at(8)), (at(12), at(13)), (at(7) + wednesday, at(8) + wednesday)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path, body", [
+    ("/availability", {"start_time": at(9).isoformat(), "end_time": at(10).isoformat()}),
+    ("/availability/bulk", {"intervals": [{"start_time": at(9).isoformat(), "end_time": at(10).isoformat()}]}),
+])
+async def test_retries_with_an_idempotency_key_are_not_rate_limited(db, client, professor, monkeypatch, path, body):
+    monkeypatch.setattr(config, "RATE_LIMIT_WRITES_PER_SECOND", 0.001)
+    monkeypatch.setattr(admission, "write_limits", TokenBuckets(0.001, 1))
+    headers = {"Authorization": f"Bearer {token(professor, 'professor')}"}
+    body = dict(body, professor_id=str(professor))
+
+    first = await client.post(path, headers=dict(headers, **{"Idempotency-Key": "k1"}), json=body)
+    retry = await client.post(path, headers=dict(headers, **{"Idempotency-Key": "k1"}), json=body)
+    other = await client.post(path, headers=dict(headers, **{"Idempotency-Key": "k2"}), json=body)
+    after_limit = await client.post(path, headers=dict(headers, **{"Idempotency-Key": "k2"}), json=body)
+
+    assert first.status_code == retry.status_code == 200
+    assert retry.headers["Idempotent-Replayed"] == "true" and retry.content == first.content
+    assert other.status_code == after_limit.status_code == 429  # Not stored as k2's answer
+    assert await db["availability"].count_documents({}) == 1
+
+
+@pytest.mark.asyncio
+async def test_availability_pages_follow_the_cursor_within_the_window(db, client, professor):
+    remember_user(await db["users"].find_one({"_id": professor}))  # $lookup with a pipeline is beyond mongomock
+    await db["availability"].insert_many([
+        {"professor_id": professor, **times.bounds(at(hour), at(hour, 30))} for hour in range(8, 15)
+    ])
+    student = await add_student(db, "student")
+    headers = {"Authorization": f"Bearer {token(student, 'student')}"}
+
+    pages, cursor = [], None
+    while True:
+        query = {"professor_id": str(professor), "from": at(9).isoformat(), "to": at(14).isoformat(), "limit": 2}
+        response = await client.post("/getavailability", headers=headers, json=dict(query, cursor=cursor))
+        assert response.status_code == 200
+        pages.append([slot["start_time"] for slot in response.json()["availability"]])
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            break
+
+    assert pages == [
+        ["2030-01-07T09:00:00", "2030-01-07T10:00:00"],
+        ["2030-01-07T11:00:00", "2030-01-07T12:00:00"],
+        ["2030-01-07T13:00:00"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_availability_pages_do_not_repeat_slots_given_with_fractional_seconds(db, client, professor):
+    remember_user(await db["users"].find_one({"_id": professor}))
+    headers = {"Authorization": f"Bearer {token(professor, 'professor')}"}
+    for hour in range(9, 14):
+        response = await client.post("/availability", headers=headers, json={
+            "professor_id": str(professor),
+            "start_time": f"2030-01-07T{hour:02}:00:00.5",
+            "end_time": f"2030-01-07T{hour:02}:30:00.5",
+        })
+        assert response.status_code == 200
+
+    student = await add_student(db, "student")
+    headers = {"Authorization": f"Bearer {token(student, 'student')}"}
+
+    seen, cursor = [], None
+    while True:
+        query = {"professor_id": str(professor), "from": at(8).isoformat(), "limit": 2, "cursor": cursor}
+        response = await client.post("/getavailability", headers=headers, json=query)
+        seen.extend(slot["start_time"] for slot in response.json()["availability"])
+        cursor = response.json()["next_cursor"]
+        if cursor is None:
+            break
+
+    assert seen == [f"2030-01-07T{hour:02}:00:00" for hour in range(9, 14)]
+
+
+@pytest.mark.asyncio
+async def test_unchanged_availability_is_answered_with_304_until_a_write(db, client, professor):
+    remember_user(await db["users"].find_one({"_id": professor}))
+    await db["availability"].insert_one({"professor_id": professor, **times.bounds(at(9), at(10))})
+    student = await add_student(db, "student")
+    headers = {"Authorization": f"Bearer {token(student, 'student')}"}
+    query = {"professor_id": str(professor)}
+
+    first = await client.post("/getavailability", headers=headers, json=query)
+    repeat = await client.post("/getavailability", headers=if_none_match(headers, first.headers["ETag"]), json=query)
+    await client.post(
+        "/availability", headers={"Authorization": f"Bearer {token(professor, 'professor')}"},
+        json={"professor_id": str(professor), "start_time": at(11).isoformat(), "end_time": at(12).isoformat()},
+    )
+    changed = await client.post("/getavailability", headers=if_none_match(headers, first.headers["ETag"]), json=query)
+
+    assert (first.status_code, repeat.status_code, changed.status_code) == (200, 304, 200)
+    assert len(changed.json()["availability"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_a_write_through_another_worker_is_never_answered_with_304(db, client, professor):
+    remember_user(await db["users"].find_one({"_id": professor}))
+    await db["availability"].insert_one({"professor_id": professor, **times.bounds(at(9), at(11))})
+    student = await add_student(db, "student")
+    headers = {"Authorization": f"Bearer {token(student, 'student')}"}
+    query = {"professor_id": str(professor)}
+    first = await client.post("/getavailability", headers=headers, json=query)
+
+    # The student books on another worker; this one has not heard of it
+    await db["availability"].update_one({"professor_id": professor}, {"$set": times.bounds(end=at(10))})
+    position = encode_position([student], {"clusterTime": Timestamp(1700000000, 1)}, Timestamp(1700000000, 1))
+    headers = dict(if_none_match(headers, first.headers["ETag"]), **{"X-Causal-Position": position})
+    after_booking = await client.post("/getavailability", headers=headers, json=query)
+
+    assert after_booking.status_code == 200
+    assert after_booking.json()["availability"][0]["end_time"] == at(10).isoformat()
+
+
+@pytest.mark.asyncio
+async def test_scoped_appointment_tags_only_match_before_their_expiry(db, client):
+    # Kept to an empty listing: the listing projection uses $type, which mongomock cannot evaluate
+    student = await add_student(db, "student")
+    headers = {"Authorization": f"Bearer {token(student, 'student')}"}
+    tag = schedule_versions.etag(student, "student", "upcoming", 100, None, False, False)
+
+    empty = await client.get("/getappointments?scope=upcoming", headers=headers)
+    repeat = await client.get("/getappointments?scope=upcoming", headers=if_none_match(headers, empty.headers["ETag"]))
+    expired = await client.get("/getappointments?scope=upcoming", headers=if_none_match(headers, expiring(tag, 1)))
+    unscoped = await client.get("/getappointments?scope=upcoming", headers=if_none_match(headers, tag))
+
+    assert empty.headers["ETag"] == expiring(tag, None)
+    assert repeat.status_code == 304
+    assert expired.status_code == unscoped.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_slot_search_reads_day_buckets_in_that_mode(db, client, professor, monkeypatch):
+    monkeypatch.setattr(config, "SCHEDULE_STORAGE", "day_buckets")
+    other = (await db["users"].insert_one({"username": "other", "role": "professor"})).inserted_id
+    day = datetime(2030, 1, 7)
+    first, last = day_buckets.day_spans(at(10), at(11))[0][1:]
+    await db[day_buckets.COLLECTION].insert_many([
+        dict(day_buckets.empty_bucket(professor, day), free=day_buckets.to_words(day_buckets.span_mask(first, last))),
+        dict(day_buckets.empty_bucket(other, day), free=day_buckets.to_words(day_buckets.span_mask(first + 6, last))),
+    ])
+    # Left over from interval storage; must not be offered
+    await db["availability"].insert_one({"professor_id": professor, **times.bounds(at(8), at(9))})
+    student = await add_student(db, "student")
+
+    response = await client.post(
+        "/searchslots", headers={"Authorization": f"Bearer {token(student, 'student')}"},
+        json={"from": at(0).isoformat(), "to": at(23).isoformat(), "min_duration_minutes": 30},
+    )
+
+    assert response.json()["slots"] == [
+        {"professor_id": str(professor), "start_time": "2030-01-07T10:00:00", "end_time": "2030-01-07T11:00:00"},
+        {"professor_id": str(other), "start_time": "2030-01-07T10:30:00", "end_time": "2030-01-07T11:00:00"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_cancel_releases_day_bucket_slots_instead_of_restoring_availability(db, client, professor, monkeypatch):
+    monkeypatch.setattr(config, "SCHEDULE_STORAGE", "day_buckets")
+    released = []
+
+    async def release(db, professor_id, start_time, end_time, session=None):
+        released.append((professor_id, start_time, end_time))
+        return True
+
+    monkeypatch.setattr(day_buckets, "release", release)
+    soon = datetime.utcnow().replace(microsecond=0) + timedelta(days=1)
+    appointment = await db["appointments"].insert_one({
+        "professor_id": professor, "student_id": ObjectId(), "is_canceled": False,
+        **times.bounds(soon, soon + timedelta(hours=1)),
+    })
+
+    response = await client.put(
+        f"/appointments/{appointment.inserted_id}", headers={"Authorization": f"Bearer {token(professor, 'professor')}"}
+    )
+
+    assert response.status_code == 200
+    assert released == [(professor, soon, soon + timedelta(hours=1))]
+    assert await db["availability"].count_documents({}) == 0
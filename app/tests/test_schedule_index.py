@@ -0,0 +1,46 @@
+from datetime import datetime
+
+from app.schedule_index import ProfessorSchedule
+
+
+def at(hour, minute=0):
+    return datetime(2024, 6, 22, hour, minute)
+
+
+def test_booking_must_fit_inside_one_free_slot():
+    schedule = ProfessorSchedule()
+    schedule.add_free("a", at(9), at(10))
+    schedule.add_free("b", at(10), at(11))
+
+    assert schedule.free_slot_for(at(9, 15), at(9, 45)) == ("a", at(9), at(10))
+    assert schedule.free_slot_for(at(10), at(11)) == ("b", at(10), at(11))
+    # Touching slots are not merged, so a booking may not straddle them
+    assert schedule.free_slot_for(at(9, 30), at(10, 30)) is None
+    assert schedule.free_slot_for(at(8), at(9)) is None
+
+
+def test_bookings_block_overlapping_requests():
+    schedule = ProfessorSchedule()
+    schedule.add_free("a", at(13), at(14))
+    schedule.add_booking("x", at(13, 10), at(13, 15))
+
+    assert not schedule.can_book(at(13, 10), at(13, 15))
+    assert not schedule.can_book(at(13, 0), at(13, 11))
+    assert schedule.can_book(at(13, 15), at(13, 30))
+    assert schedule.can_book(at(13, 0), at(13, 10))
+
+    schedule.remove_booking("x", at(13, 10))
+    assert schedule.can_book(at(13, 10), at(13, 15))
+
+
+def test_overlapping_free_slots_and_removal():
+    schedule = ProfessorSchedule()
+    for i, hour in enumerate([8, 10, 12, 14]):
+        schedule.add_free(i, at(hour), at(hour + 1))
+
+    assert [slot[0] for slot in schedule.free.overlapping(at(10, 30), at(12, 30))] == [1, 2]
+    assert schedule.free.overlapping(at(9), at(10)) == []
+
+    assert schedule.remove_free(1, at(10))
+    assert not schedule.remove_free(1, at(10))
+    assert [slot[0] for slot in schedule.free.items()] == [0, 2, 3]
@@ -0,0 +1,31 @@
+from app.schedule_version import ScheduleVersions, etag_matches, expiring, fresh_expiring_etag
+
+
+def test_a_write_changes_the_tag_of_that_key_only():
+    versions = ScheduleVersions(max_staleness=30)
+    professor, other = versions.etag("professor", "all"), versions.etag("other", "all")
+
+    versions.bump("professor")
+
+    assert versions.etag("professor", "all") != professor
+    assert versions.etag("other", "all") == other
+    assert versions.etag("professor", "all") != versions.etag("professor", "upcoming")
+
+
+def test_if_none_match_lists_and_wildcards():
+    tag = ScheduleVersions().etag("professor")
+
+    assert etag_matches(f'"stale", {tag}', tag)
+    assert etag_matches("*", tag)
+    assert not etag_matches('"stale"', tag)
+    assert not etag_matches(None, tag)
+
+
+def test_expiring_tags_stop_matching_at_their_expiry():
+    tag = ScheduleVersions().etag("student", "upcoming")
+    until_1000 = expiring(tag, 1000)
+
+    assert fresh_expiring_etag(until_1000, tag, now=999) == until_1000
+    assert fresh_expiring_etag(until_1000, tag, now=1000) is None
+    assert fresh_expiring_etag(expiring(tag, None), tag, now=10 ** 12) == expiring(tag, None)
+    assert fresh_expiring_etag(tag, tag, now=0) is None
@@ -0,0 +1,19 @@
+from app import config
+from app.security import hash_password, is_hashed, verify_password
+
+
+def test_hash_round_trip_and_rehash_on_cost_change(monkeypatch):
+    monkeypatch.setattr(config, "PASSWORD_SCRYPT_N", 1024)
+    stored = hash_password("password123")
+
+    assert is_hashed(stored)
+    assert verify_password("password123", stored) == (True, False)
+    assert verify_password("wrong", stored) == (False, False)
+
+    monkeypatch.setattr(config, "PASSWORD_SCRYPT_N", 2048)
+    assert verify_password("password123", stored) == (True, True)
+
+
+def test_legacy_plaintext_records_verify_and_need_rehash():
+    assert verify_password("password123", "password123") == (True, True)
+    assert verify_password("nope", "password123")[0] is False
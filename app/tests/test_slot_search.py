@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from app.slot_search import earliest_free_slots, free_fragments
+
+
+def at(hour, minute=0):
+    return datetime(2024, 6, 22, hour, minute)
+
+
+def test_bookings_are_cut_out_of_each_availability_slot():
+    availability = [(at(9), at(12)), (at(14), at(15))]
+    bookings = [(at(9, 30), at(10)), (at(11), at(11, 50)), (at(14), at(15))]
+
+    fragments = list(free_fragments(availability, bookings, at(0), at(23), timedelta(minutes=15)))
+
+    # 11:50-12:00 is shorter than the minimum duration and 14:00-15:00 is fully booked
+    assert fragments == [(at(9), at(9, 30)), (at(10), at(11))]
+
+
+def test_fragments_are_clipped_to_the_window():
+    fragments = list(free_fragments([(at(9), at(12))], [], at(10), at(11), timedelta(minutes=30)))
+    assert fragments == [(at(10), at(11))]
+
+
+def test_earliest_slots_are_merged_across_professors():
+    schedules = {
+        "p1": ([(at(10), at(11)), (at(13), at(14))], []),
+        "p2": ([(at(9), at(10))], [(at(9), at(9, 45))]),
+        "p3": ([(at(12), at(13))], []),
+    }
+
+    slots = earliest_free_slots(schedules, at(0), at(23), timedelta(minutes=30), 3)
+
+    assert slots == [(at(10), at(11), "p1"), (at(12), at(13), "p3"), (at(13), at(14), "p1")]
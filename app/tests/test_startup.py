@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from app import startup, times
+from app.main import application
+from app.schedule_index import schedule_index
+from app.users import cached_user_by_id, user_cache
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def state(monkeypatch):
+    monkeypatch.setattr(startup, "state", dict(startup.state))
+    return startup.state
+
+
+async def get(path):
+    async with AsyncClient(transport=ASGITransport(app=application), base_url="http://test") as client:
+        return await client.get(path)
+
+
+@pytest.mark.asyncio
+async def test_readyz_is_503_until_startup_finishes(state):
+    state["ready"] = False
+    starting = await get("/readyz")
+    state.update(ready=True, warmed_schedules=3)
+    ready = await get("/readyz")
+
+    assert starting.status_code == 503 and starting.json()["status"] == "starting"
+    assert ready.status_code == 200 and ready.json()["warmed_schedules"] == 3
+    assert (await get("/healthz")).json() == {"status": "ok"}
+
+
+@pytest.mark.asyncio
+async def test_warm_up_loads_professors_and_the_busiest_schedules(state):
+    db = mongomock_motor.AsyncMongoMockClient()["startup_test"]
+    busy, quiet = (await db["users"].insert_many([
+        {"username": "busy", "role": "professor"}, {"username": "quiet", "role": "professor"},
+    ])).inserted_ids
+    soon = datetime.utcnow() + timedelta(days=1)
+    await db["appointments"].insert_one({
+        "professor_id": busy, "student_id": quiet, "is_canceled": False, **times.bounds(soon, soon + timedelta(hours=1)),
+    })
+    user_cache.invalidate()
+    schedule_index.invalidate()
+    try:
+        await startup.warm_caches(db)
+
+        assert cached_user_by_id(quiet)["username"] == "quiet"
+        assert schedule_index.cached(busy) is not None and schedule_index.cached(quiet) is None
+        assert (state["warmed_professors"], state["warmed_schedules"]) == (2, 1)
+    finally:
+        user_cache.invalidate()
+        schedule_index.invalidate()
@@ -0,0 +1,122 @@
+import io
+import logging
+import queue
+
+import orjson
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+
+from app import structured_logging
+from app.structured_logging import (
+    JsonFormatter, RequestContextMiddleware, _NonBlockingQueueHandler, _RequestContextFilter, log_records_dropped,
+)
+
+@pytest.fixture
+def captured():
+    """Route the test logger through the real queue/listener pipeline into a buffer."""
+    output = io.StringIO()
+    handler_output = logging.StreamHandler(output)
+    handler_output.setFormatter(JsonFormatter())
+    records = queue.Queue()
+    handler = _NonBlockingQueueHandler(records)
+    handler.addFilter(_RequestContextFilter())
+    listener = logging.handlers.QueueListener(records, handler_output)
+    logger = logging.getLogger("app.tests.logging")
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    listener.start()
+
+    def lines():
+        listener.stop()
+        return [orjson.loads(line) for line in output.getvalue().splitlines()]
+
+    yield logger, lines
+    logger.removeHandler(handler)
+    logger.propagate = True
+
+
+@pytest.mark.asyncio
+async def test_lines_logged_during_a_request_carry_its_id_and_route(captured):
+    logger, lines = captured
+    app = FastAPI()
+
+    @app.get("/appointments/{appointmentid}")
+    async def read(appointmentid: str):
+        logger.info("Looking up %s", appointmentid, extra={"professor_id": "p1"})
+        return {}
+
+    app.add_middleware(RequestContextMiddleware)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        given = await client.get("/appointments/a1", headers={"X-Request-ID": "abc123"})
+        generated = await client.get("/appointments/a2")
+
+    assert given.headers["x-request-id"] == "abc123"
+    assert generated.headers["x-request-id"] not in ("", "abc123")
+    first, second = lines()
+    assert first["message"] == "Looking up a1"
+    assert first["request_id"] == "abc123"
+    assert first["method"] == "GET"
+    assert first["route"] == "/appointments/{appointmentid}"
+    assert first["elapsed_ms"] >= 0
+    assert first["professor_id"] == "p1"
+    assert second["request_id"] == generated.headers["x-request-id"]
+
+
+def test_records_are_queued_unformatted():
+    formatted = []
+
+    class Probe:
+        def __str__(self):
+            formatted.append(True)
+            return "probe"
+
+    handler = _NonBlockingQueueHandler(queue.Queue())
+    handler.handle(logging.LogRecord("app", logging.INFO, __file__, 1, "value=%s", (Probe(),), None))
+
+    queued = handler.queue.get_nowait()
+    assert not formatted
+    assert queued.msg == "value=%s"
+    assert orjson.loads(JsonFormatter().format(queued))["message"] == "value=probe"
+
+
+def test_exceptions_are_logged_with_their_traceback(captured):
+    logger, lines = captured
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        logger.exception("Unexpected error")
+
+    line = lines()[0]
+    assert line["level"] == "ERROR"
+    assert "RuntimeError: boom" in line["exception"]
+
+
+def test_a_full_queue_drops_records_instead_of_blocking():
+    handler = _NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    logger = logging.getLogger("app.tests.logging.full")
+    logger.addHandler(handler)
+    logger.propagate = False
+    before = sum(log_records_dropped._values.values())
+    try:
+        for i in range(5):
+            logger.warning("record %d", i)
+    finally:
+        logger.removeHandler(handler)
+        logger.propagate = True
+
+    assert handler.queue.qsize() == 1
+    assert sum(log_records_dropped._values.values()) - before == 4
+
+
+def test_configure_logging_is_idempotent():
+    output = io.StringIO()
+    structured_logging.shutdown_logging()  # Importing app.main elsewhere may have configured it already
+    try:
+        listener = structured_logging.configure_logging(output)
+        assert structured_logging.configure_logging(output) is listener
+        logging.getLogger("app.tests.logging.root").warning("through the root logger")
+    finally:
+        structured_logging.shutdown_logging()
+    assert '"message":"through the root logger"' in output.getvalue()
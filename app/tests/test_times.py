@@ -0,0 +1,99 @@
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app import config, times
+from app.migrate_epoch_times import converted, migrate_collection
+from app.pagination import decode_cursor, encode_cursor, keyset_filter
+from app.schedule_index import ProfessorSchedule
+
+# The migration's bulk updates need a real mongod; mongomock's bulk_write rejects current pymongo UpdateOne
+MONGO_URI = os.getenv("MONGO_REPLICA_SET_URI")
+
+
+def test_times_are_normalized_to_utc_at_the_edge():
+    moment = datetime(2030, 1, 1, 9, 0)
+    assert times.to_utc("2030-01-01T11:00:00+02:00") == moment
+    assert times.to_utc("2030-01-01T09:00:00Z") == moment
+    assert times.to_utc(datetime(2030, 1, 1, 4, 0, tzinfo=timezone(timedelta(hours=-5)))) == moment
+    assert times.to_utc(moment) == moment
+    assert times.to_utc("2030-01-01T09:00:00.500+00:00") == times.to_utc(moment.replace(microsecond=999999)) == moment
+
+
+def test_epoch_round_trip_and_bounds():
+    moment = datetime(2030, 1, 1, 9, 0)
+    assert times.epoch(moment) == 1893488400
+    assert times.epoch("2030-01-01T09:00:00") == times.epoch(1893488400) == 1893488400
+    assert times.from_epoch(1893488400) == moment
+    assert times.bounds(end=moment) == {"end_time": moment, "end_ts": 1893488400}
+
+
+def test_query_fields_follow_the_configured_representation(monkeypatch):
+    moment = datetime(2030, 1, 1, 9, 0)
+    monkeypatch.setattr(config, "EPOCH_TIME_QUERIES", True)
+    assert (times.field("start"), times.key(moment)) == ("start_ts", 1893488400)
+    monkeypatch.setattr(config, "EPOCH_TIME_QUERIES", False)
+    assert (times.field("start"), times.key(1893488400)) == ("start_time", moment)
+
+
+def test_cursors_carry_epoch_seconds_and_accept_old_iso_ones(monkeypatch):
+    monkeypatch.setattr(config, "EPOCH_TIME_QUERIES", True)
+    document_id = "0" * 24
+    cursor = encode_cursor(datetime(2030, 1, 1, 9, 0), document_id)
+    assert decode_cursor(cursor)[0] == 1893488400
+    assert keyset_filter("start_ts", cursor)["$or"][0] == {"start_ts": {"$gt": 1893488400}}
+
+    old = "eyJ0IjoiMjAzMC0wMS0wMVQwOTowMDowMCIsImlkIjoiMDAwMDAwMDAwMDAwMDAwMDAwMDAwMDAwIn0"
+    assert decode_cursor(old)[0] == 1893488400
+
+
+def test_schedule_index_compares_mixed_time_representations():
+    schedule = ProfessorSchedule()
+    schedule.add_free("a", datetime(2030, 1, 1, 9), datetime(2030, 1, 1, 10))
+    schedule.add_booking("legacy", "2030-01-01T09:30:00", "2030-01-01T09:45:00")
+
+    aware = timezone(timedelta(hours=2))
+    assert schedule.free_slot_for(datetime(2030, 1, 1, 11, 0, tzinfo=aware), datetime(2030, 1, 1, 11, 15, tzinfo=aware))
+    assert schedule.has_booking_overlap(datetime(2030, 1, 1, 9, 40), datetime(2030, 1, 1, 9, 50))
+
+
+def test_migration_converts_legacy_documents():
+    legacy = {"start_time": "2030-01-02T11:00:00+02:00", "end_time": datetime(2030, 1, 2, 9, 30)}
+    assert converted(legacy) == times.bounds(datetime(2030, 1, 2, 9), datetime(2030, 1, 2, 9, 30))
+    assert converted({"start_time": "soon", "end_time": None}) is None
+    assert converted({"start_time": datetime(2030, 1, 2, 9)}) is None
+
+
+@pytest.mark.skipif(not MONGO_URI, reason="MONGO_REPLICA_SET_URI is not set")
+@pytest.mark.asyncio
+async def test_migration_fills_in_integer_times_and_resumes():
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(MONGO_URI)
+    await client.drop_database("epoch_times_test")
+    db = client["epoch_times_test"]
+    start = datetime(2030, 1, 1, 9)
+    await db["appointments"].insert_many(
+        [{"start_time": start + timedelta(hours=i), "end_time": start + timedelta(hours=i, minutes=30)} for i in range(5)]
+        + [{"start_time": "2030-01-02T09:00:00", "end_time": "2030-01-02T09:30:00"}, {"start_time": "soon", "end_time": None}]
+    )
+    documents = await db["appointments"].find().sort("_id", 1).to_list(length=None)
+    # As if an earlier run stopped after the first two documents
+    await db["migration_progress"].insert_one({"_id": "epoch_times:appointments", "last_id": documents[1]["_id"]})
+
+    totals = await migrate_collection(db, "appointments", batch_size=2)
+
+    assert totals["updated"] == 4
+    assert totals["unreadable"] == 1
+    migrated = await db["appointments"].find_one({"_id": documents[5]["_id"]})
+    assert migrated["start_time"] == datetime(2030, 1, 2, 9)
+    assert migrated["start_ts"] == times.epoch(datetime(2030, 1, 2, 9))
+    assert "start_ts" not in await db["appointments"].find_one({"_id": documents[0]["_id"]})
+    assert await db["migration_progress"].count_documents({}) == 0
+    assert "professor_active_ts" in await db["appointments"].index_information()
+
+    totals = await migrate_collection(db, "appointments", batch_size=2)
+    assert totals["updated"] == 2
+    assert totals["remaining"] == 1  # Only the unreadable one
+    client.close()
@@ -0,0 +1,61 @@
+import pytest
+
+from app import users
+from app.cache import MISSING, TTLCache
+from app.users import find_user_by_id, find_user_by_username, invalidate_user, invalidate_user_everywhere
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+@pytest.fixture
+def db():
+    users.user_cache.invalidate()
+    yield mongomock_motor.AsyncMongoMockClient()["users_test"]
+    users.user_cache.invalidate()
+
+
+def test_least_recently_used_entries_are_evicted_first():
+    cache = TTLCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.peek("b") is MISSING
+    assert (cache.peek("a"), cache.peek("c")) == (1, 3)
+
+
+def test_misses_expire_sooner_than_hits(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("app.cache.time.monotonic", lambda: now[0])
+    cache = TTLCache(ttl=300, negative_ttl=30)
+    cache.set("found", {"username": "a"})
+    cache.set("absent", None)
+
+    now[0] += 31
+    assert cache.get("absent") is MISSING
+    assert cache.get("found") == {"username": "a"}
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_served_from_the_cache_under_both_keys(db):
+    result = await db["users"].insert_one({"username": "professor", "role": "professor"})
+    await find_user_by_username(db, "professor")
+    await db["users"].delete_one({"_id": result.inserted_id})  # Only the cache can answer now
+
+    assert (await find_user_by_id(db, result.inserted_id))["username"] == "professor"
+    assert (await find_user_by_username(db, "professor"))["_id"] == result.inserted_id
+
+    invalidate_user_everywhere(result.inserted_id)
+    assert await find_user_by_username(db, "professor") is None
+
+
+@pytest.mark.asyncio
+async def test_a_cached_miss_is_dropped_when_the_user_registers(db):
+    assert await find_user_by_username(db, "newcomer") is None
+    await db["users"].insert_one({"username": "newcomer", "role": "student"})
+    assert await find_user_by_username(db, "newcomer") is None
+
+    invalidate_user(username="newcomer")
+    assert (await find_user_by_username(db, "newcomer"))["role"] == "student"
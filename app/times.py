@@ -0,0 +1,78 @@
+# Canonical time representation for availability and appointments.
+#
+# Every availability and appointment document stores its bounds twice:
+#
+#   start_time / end_time   naive UTC datetimes, for display and for people
+#                           reading the collections
+#   start_ts / end_ts       UTC epoch seconds as integers; range queries,
+#                           sorts, indexes and comparisons use these
+#
+# Timezones are dealt with only at the API edge. The request models pass
+# every incoming time through to_utc(): aware values are converted to UTC and
+# naive ones are taken to be UTC already. Sub-second parts are dropped there
+# too, as start_ts/end_ts and pagination cursors hold whole seconds. Past the
+# edge, the code only ever sees naive UTC datetimes or epoch integers.
+#
+# Queries use the datetime fields until EPOCH_TIME_QUERIES is turned on (it is
+# off by default), which is safe once `python -m app.migrate_epoch_times` has
+# filled the integer fields in on documents written before they existed.
+from datetime import datetime, timedelta, timezone
+
+from app import config
+
+_EPOCH = datetime(1970, 1, 1)
+_SECOND = timedelta(seconds=1)
+
+
+def _naive_utc(value):
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def to_utc(value):
+    """Naive UTC datetime in whole seconds from a datetime or ISO 8601 string; naive input is taken as UTC."""
+    return _naive_utc(value).replace(microsecond=0)
+
+
+def epoch(value):
+    """UTC epoch seconds of a datetime, ISO string or (already) epoch integer."""
+    if isinstance(value, int):
+        return value
+    return (to_utc(value) - _EPOCH) // _SECOND
+
+
+def from_epoch(seconds):
+    return _EPOCH + timedelta(seconds=seconds)
+
+
+def bounds(start=None, end=None):
+    """Field values for writing a start and/or end: the display datetime and its integer twin."""
+    fields = {}
+    if start is not None:
+        fields["start_time"] = to_utc(start)
+        fields["start_ts"] = epoch(start)
+    if end is not None:
+        fields["end_time"] = to_utc(end)
+        fields["end_ts"] = epoch(end)
+    return fields
+
+
+def field(name):
+    """The field queries on ``name`` ("start" or "end") should use."""
+    return f"{name}_ts" if config.EPOCH_TIME_QUERIES else f"{name}_time"
+
+
+def key(value):
+    """``value`` in the representation that field() holds, for use in query conditions."""
+    if config.EPOCH_TIME_QUERIES:
+        return epoch(value)
+    # Exact, so that matches() still finds documents stored with sub-second times before to_utc() dropped them
+    return from_epoch(value) if isinstance(value, int) else _naive_utc(value)
+
+
+def matches(document):
+    """Conditions matching ``document``'s current bounds, for updates that must not race a move."""
+    return {field("start"): key(document["start_time"]), field("end"): key(document["end_time"])}
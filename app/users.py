@@ -0,0 +1,70 @@
+from bson import ObjectId
+
+from app import config
+from app.cache import MISSING, TTLCache
+
+# User records almost never change, so lookups by _id and by username are
+# served from one in-process cache (keys are prefixed to keep them apart).
+user_cache = TTLCache(
+    maxsize=config.USER_CACHE_MAX_ENTRIES,
+    ttl=config.USER_CACHE_TTL_SECONDS,
+    negative_ttl=config.USER_CACHE_NEGATIVE_TTL_SECONDS,
+)
+
+
+def _id_key(user_id):
+    return f"id:{user_id}"
+
+
+def _username_key(username):
+    return f"username:{username}"
+
+
+def remember_user(user):
+    user_cache.set(_id_key(user["_id"]), user)
+    user_cache.set(_username_key(user["username"]), user)
+
+
+def cached_user_by_id(user_id):
+    """The cached user (or None for a cached miss) without touching Mongo; MISSING if unknown."""
+    return user_cache.get(_id_key(user_id))
+
+
+async def find_user_by_id(db, user_id):
+    user = user_cache.get(_id_key(user_id))
+    if user is not MISSING:
+        return user
+    user = await db["users"].find_one({"_id": ObjectId(user_id)})
+    if user is None:
+        user_cache.set(_id_key(user_id), None)
+    else:
+        remember_user(user)
+    return user
+
+
+async def find_user_by_username(db, username):
+    user = user_cache.get(_username_key(username))
+    if user is not MISSING:
+        return user
+    user = await db["users"].find_one({"username": username})
+    if user is None:
+        user_cache.set(_username_key(username), None)
+    else:
+        remember_user(user)
+    return user
+
+
+def invalidate_user(user_id=None, username=None):
+    if user_id is not None:
+        user_cache.invalidate(_id_key(user_id))
+    if username is not None:
+        user_cache.invalidate(_username_key(username))
+
+
+def invalidate_user_everywhere(user_id, username=None):
+    """Drop a user from both cache keys, finding the username from the cache if not given."""
+    if username is None:
+        cached = user_cache.peek(_id_key(user_id))
+        if cached not in (None, MISSING):
+            username = cached["username"]
+    invalidate_user(user_id, username)
@@ -0,0 +1,105 @@
+# Micro-benchmark: day-bucket bitmaps vs the interval model.
+#
+#   python -m benchmarks.bench_day_buckets [--days 28] [--bookings 50000]
+#
+# Both models hold one professor with fragmented availability (20-minute
+# slots every 30 minutes, 08:00-18:00). For each booking request the interval
+# model checks the schedule index and splits the covering slot the way
+# book_appointment does; the bitmap model does the AND check and the
+# free -> booked bit move that day_buckets.book sends to the server. Listing
+# compares turning each model back into free intervals, plus how many
+# documents a week's lookup reads and how many writes a booking needs.
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app import day_buckets
+from app.schedule_index import ProfessorSchedule
+
+BASE_DAY = datetime(2030, 1, 7)
+
+
+def build(days):
+    schedule = ProfessorSchedule()
+    masks = {}
+    slot_id = 0
+    for d in range(days):
+        day = BASE_DAY + timedelta(days=d)
+        masks[day] = [0, 0]
+        for k in range(20):
+            start = day + timedelta(hours=8, minutes=30 * k)
+            end = start + timedelta(minutes=20)
+            schedule.add_free(slot_id, start, end)
+            slot_id += 1
+            [(_, first, last)] = day_buckets.day_spans(start, end)
+            masks[day][0] |= day_buckets.span_mask(first, last)
+    return schedule, masks
+
+
+def book_interval(schedule, start, end, next_id):
+    if not schedule.can_book(start, end):
+        return False
+    slot_id, slot_start, slot_end = schedule.free_slot_for(start, end)
+    schedule.remove_free(slot_id, slot_start)
+    if slot_start < start:
+        schedule.add_free(slot_id, slot_start, start)
+    if slot_end > end:
+        schedule.add_free(next_id, end, slot_end)
+    schedule.add_booking(next_id, start, end)
+    return True
+
+
+def book_bitmap(masks, start, end):
+    [(day, first, last)] = day_buckets.day_spans(start, end)
+    mask = day_buckets.span_mask(first, last)
+    bucket = masks[day]
+    if bucket[0] & mask != mask:
+        return False
+    bucket[0] &= ~mask
+    bucket[1] |= mask
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Day-bucket bitmaps vs interval documents")
+    parser.add_argument("--days", type=int, default=28)
+    parser.add_argument("--bookings", type=int, default=50000)
+    args = parser.parse_args()
+
+    requests = []
+    for _ in range(args.bookings):
+        start = BASE_DAY + timedelta(days=random.randrange(args.days), hours=8, minutes=5 * random.randrange(120))
+        requests.append((start, start + timedelta(minutes=random.choice([5, 10, 15]))))
+
+    schedule, masks = build(args.days)
+    started = time.perf_counter()
+    booked_intervals = sum(book_interval(schedule, start, end, (start, end)) for start, end in requests)
+    interval_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    booked_bitmaps = sum(book_bitmap(masks, start, end) for start, end in requests)
+    bitmap_time = time.perf_counter() - started
+    assert booked_intervals == booked_bitmaps
+
+    week = [{"day": day, "free": day_buckets.to_words(free)} for day, (free, _) in sorted(masks.items())[:7]]
+    week_end = BASE_DAY + timedelta(days=7)
+    started = time.perf_counter()
+    for _ in range(1000):
+        listed = [item for item in schedule.free.items() if item[1] < week_end]
+    interval_list = (time.perf_counter() - started) / 1000
+    started = time.perf_counter()
+    for _ in range(1000):
+        day_buckets.free_intervals(week)
+    bitmap_list = (time.perf_counter() - started) / 1000
+
+    print(f"{args.days} days of fragmented availability, {args.bookings} booking attempts ({booked_bitmaps} succeed)")
+    print(f"  booking check + apply, intervals: {interval_time / args.bookings * 1e6:8.2f} us")
+    print(f"  booking check + apply, bitmaps:   {bitmap_time / args.bookings * 1e6:8.2f} us")
+    print(f"  list one week, intervals:         {interval_list * 1e6:8.2f} us ({len(listed)} documents read)")
+    print(f"  list one week, bitmaps:           {bitmap_list * 1e6:8.2f} us ({len(week)} documents read)")
+    print("  writes per booking: intervals 2-3 (claim, appointment, remainder); bitmaps 2 (bucket, appointment)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# Login throughput at the configured scrypt cost.
+#
+#   python -m benchmarks.bench_password_hashing [--n 16384] [--seconds 5]
+#
+# Reports single-core verifications per second (what one worker core can
+# sustain for logins) and the aggregate rate through the bounded hashing pool.
+import argparse
+import asyncio
+import os
+import time
+
+from app import config
+from app.security import hash_password, verify_password, verify_password_async
+
+
+def single_core(stored, seconds):
+    done = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        verify_password("password123", stored)
+        done += 1
+    return done / seconds
+
+
+async def through_pool(stored, seconds, concurrency):
+    done = 0
+    deadline = time.perf_counter() + seconds
+
+    async def client():
+        nonlocal done
+        while time.perf_counter() < deadline:
+            await verify_password_async("password123", stored)
+            done += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return done / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput at the configured scrypt cost")
+    parser.add_argument("--n", type=int, default=config.PASSWORD_SCRYPT_N, help="scrypt cost factor")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=64)
+    args = parser.parse_args()
+
+    config.PASSWORD_SCRYPT_N = args.n
+    stored = hash_password("password123", n=args.n)
+
+    per_core = single_core(stored, args.seconds)
+    pooled = asyncio.run(through_pool(stored, args.seconds, args.concurrency))
+    print(f"scrypt n={args.n} r={config.PASSWORD_SCRYPT_R} p={config.PASSWORD_SCRYPT_P}")
+    print(f"  single core:  {per_core:8.1f} logins/s ({1000 / per_core:.1f} ms per verification)")
+    print(f"  hashing pool: {pooled:8.1f} logins/s with {config.PASSWORD_HASH_WORKERS} workers on {os.cpu_count()} cores")
+
+
+if __name__ == "__main__":
+    main()
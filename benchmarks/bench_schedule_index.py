@@ -0,0 +1,61 @@
+# Micro-benchmark: booking checks against the schedule index vs a linear scan.
+#
+#   python -m benchmarks.bench_schedule_index [--slots 500] [--lookups 100000]
+#
+# The linear scan is what book_appointment did before the index: walk every
+# availability slot and every booking of the professor for each request.
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from app.schedule_index import ProfessorSchedule
+
+BASE_TIME = datetime(2030, 1, 7, 8, 0)
+
+
+def build(slots):
+    schedule = ProfessorSchedule()
+    free, booked = [], []
+    for k in range(slots):
+        start = BASE_TIME + timedelta(minutes=30 * k)
+        schedule.add_free(k, start, start + timedelta(minutes=20))
+        free.append((start, start + timedelta(minutes=20)))
+        if k % 3 == 0:
+            schedule.add_booking(k, start + timedelta(minutes=20), start + timedelta(minutes=25))
+            booked.append((start + timedelta(minutes=20), start + timedelta(minutes=25)))
+    return schedule, free, booked
+
+
+def linear_can_book(free, booked, start, end):
+    return any(s <= start and e >= end for s, e in free) and not any(s < end and e > start for s, e in booked)
+
+
+def timed(fn, requests):
+    started = time.perf_counter()
+    for start, end in requests:
+        fn(start, end)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schedule index vs linear scan")
+    parser.add_argument("--slots", type=int, default=500)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args()
+
+    schedule, free, booked = build(args.slots)
+    requests = []
+    for _ in range(args.lookups):
+        start = BASE_TIME + timedelta(minutes=random.randrange(30 * args.slots))
+        requests.append((start, start + timedelta(minutes=10)))
+
+    indexed = timed(schedule.can_book, requests)
+    linear = timed(lambda start, end: linear_can_book(free, booked, start, end), requests)
+    print(f"{args.slots} slots, {args.lookups} lookups")
+    print(f"  schedule index: {indexed / args.lookups * 1e6:8.2f} us per check")
+    print(f"  linear scan:    {linear / args.lookups * 1e6:8.2f} us per check ({linear / indexed:.0f}x slower)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# Micro-benchmark: response serialization for large listing payloads.
+#
+#   python -m benchmarks.bench_serialization [--items 500] [--rounds 200]
+#
+# "stdlib" is what every route did before: jsonable_encoder over the returned
+# dict, then JSONResponse (json.dumps). "orjson" is the prebuilt
+# FastJSONResponse the listing routes now return, which skips the encoder.
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.responses import FastJSONResponse
+
+BASE_TIME = datetime(2030, 1, 7, 8, 0)
+
+
+def appointments_page(items):
+    # Shape produced by APPOINTMENT_PROJECTION: ids and times already strings
+    appointments = []
+    for k in range(items):
+        start = BASE_TIME + timedelta(minutes=30 * k)
+        appointments.append({
+            "appointment_id": str(ObjectId()),
+            "student_id": str(ObjectId()),
+            "professor_id": str(ObjectId()),
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(minutes=15)).isoformat(),
+            "is_canceled": False,
+        })
+    return {"appointments": appointments, "next_cursor": "eyJ0IjoiMjAzMC0wMS0wN1QwODowMDowMCJ9"}
+
+
+def availability_page(items):
+    # Shape built by get_availability: datetimes straight from Mongo
+    professor_id = str(ObjectId())
+    availability = []
+    for k in range(items):
+        start = BASE_TIME + timedelta(minutes=30 * k)
+        availability.append({
+            "availability_id": str(ObjectId()),
+            "professor_id": professor_id,
+            "start_time": start,
+            "end_time": start + timedelta(minutes=20),
+        })
+    return {"availability": availability, "next_cursor": None}
+
+
+def timed(fn, payload, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(payload)
+    return (time.perf_counter() - started) / rounds
+
+
+def stdlib(payload):
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+def fast(payload):
+    return FastJSONResponse(payload).body
+
+
+def main():
+    parser = argparse.ArgumentParser(description="stdlib vs orjson response serialization")
+    parser.add_argument("--items", type=int, default=500, help="entries per page (the route maximum)")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    for name, payload in (
+        ("getappointments", appointments_page(args.items)),
+        ("getavailability", availability_page(args.items)),
+    ):
+        # Same document either way, only the whitespace differs
+        assert json.loads(stdlib(payload)) == json.loads(fast(payload))
+        before = timed(stdlib, payload, args.rounds)
+        after = timed(fast, payload, args.rounds)
+        print(f"{name}: {args.items} items, {len(fast(payload)) / 1024:.0f} KiB")
+        print(f"  jsonable_encoder + json: {before * 1e3:8.3f} ms per response")
+        print(f"  orjson, prebuilt:        {after * 1e3:8.3f} ms per response ({before / after:.0f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
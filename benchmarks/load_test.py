@@ -0,0 +1,251 @@
+# Load test for the booking API against a local MongoDB.
+#
+#   python -m benchmarks.load_test --mongo-uri mongodb://localhost:27017
+#
+# Seeds professors with fragmented availability and long appointment
+# histories, then drives the ASGI app in-process through three scenarios:
+# a booking storm on a few popular professors, availability browsing and
+# appointment listing. Reports throughput and p50/p95/p99 per route plus the
+# number of double bookings; exits non-zero when a double booking happens,
+# any response is other than 2xx, 304 or 409 (a lost race), or a route's p95
+# is above --max-p95-ms, so it can gate a deploy. Latencies only cover the
+# expected responses; errors are counted instead.
+#
+# It needs a real mongod: mongomock_motor cannot run the routes' aggregations
+# ($type, $lookup with a pipeline) or their find_one_and_update sorts, so
+# every scenario would only measure 500s. The database named load_test is
+# wiped first.
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+os.environ.setdefault("MONGO_URI", "mongodb://localhost:27017")
+
+from bson import ObjectId  # noqa: E402
+from fastapi_jwt_auth import AuthJWT  # noqa: E402
+from httpx import ASGITransport, AsyncClient  # noqa: E402
+
+from app import times  # noqa: E402
+from app.db import get_db  # noqa: E402
+from app.indexes import ensure_indexes  # noqa: E402
+from app.main import application  # noqa: E402
+
+BASE_TIME = datetime(2030, 1, 7, 8, 0)
+
+
+def open_database(mongo_uri):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    return AsyncIOMotorClient(mongo_uri)["load_test"]
+
+
+async def seed(db, professors, students, slots_per_professor, history_per_student):
+    """Insert users, fragmented availability and past appointments; returns the user ids."""
+    for name in ("users", "availability", "appointments"):
+        await db[name].delete_many({})
+
+    professor_ids = [ObjectId() for _ in range(professors)]
+    student_ids = [ObjectId() for _ in range(students)]
+    await db["users"].insert_many(
+        [{"_id": pid, "username": f"professor{i}", "password": "x", "role": "professor"} for i, pid in enumerate(professor_ids)]
+        + [{"_id": sid, "username": f"student{i}", "password": "x", "role": "student"} for i, sid in enumerate(student_ids)]
+    )
+
+    # Fragmented availability: 20-minute slots separated by 10-minute gaps
+    availability = []
+    for pid in professor_ids:
+        for k in range(slots_per_professor):
+            start = BASE_TIME + timedelta(minutes=30 * k)
+            availability.append({"professor_id": pid, **times.bounds(start, start + timedelta(minutes=20))})
+    await db["availability"].insert_many(availability)
+
+    history = []
+    for sid in student_ids:
+        for k in range(history_per_student):
+            start = BASE_TIME - timedelta(days=1 + k)
+            history.append({
+                "professor_id": random.choice(professor_ids),
+                "student_id": sid,
+                **times.bounds(start, start + timedelta(minutes=15)),
+                "is_canceled": False,
+            })
+    if history:
+        await db["appointments"].insert_many(history)
+    return professor_ids, student_ids
+
+
+def token(user_id, role):
+    return AuthJWT().create_access_token(subject=str(user_id), user_claims={"role": role}, expires_time=timedelta(hours=1))
+
+
+def expected(status_code):
+    """2xx, 304 and 409 (lost a race for a slot) are answers; anything else is an error."""
+    return 200 <= status_code < 300 or status_code in (304, 409)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+        self.elapsed = defaultdict(float)
+
+    async def call(self, route, request):
+        started = time.perf_counter()
+        response = await request
+        if expected(response.status_code):
+            self.latencies[route].append(time.perf_counter() - started)
+        else:
+            self.errors[route] += 1
+        self.statuses[route][response.status_code] += 1
+        return response
+
+    def report(self):
+        rows = {}
+        for route in self.statuses:
+            ordered = sorted(self.latencies[route])
+            if not ordered:
+                quantiles = [float("nan")] * 99
+            else:
+                quantiles = statistics.quantiles(ordered, n=100) if len(ordered) > 1 else ordered * 99
+            rows[route] = {
+                "requests": len(ordered),
+                "errors": self.errors[route],
+                "throughput_rps": len(ordered) / self.elapsed[route] if self.elapsed[route] else 0.0,
+                "p50_ms": quantiles[49] * 1000,
+                "p95_ms": quantiles[94] * 1000,
+                "p99_ms": quantiles[98] * 1000,
+                "statuses": dict(self.statuses[route]),
+            }
+        return rows
+
+
+async def run_concurrently(recorder, route, calls, concurrency):
+    """Run the request factories in ``calls`` with at most ``concurrency`` in flight."""
+    gate = asyncio.Semaphore(concurrency)
+
+    async def one(make_request):
+        async with gate:
+            await recorder.call(route, make_request())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(make_request) for make_request in calls))
+    recorder.elapsed[route] += time.perf_counter() - started
+
+
+async def booking_storm(client, recorder, professor_ids, student_ids, hot_professors, attempts, concurrency):
+    calls = []
+    for _ in range(attempts):
+        pid = random.choice(professor_ids[:hot_professors])
+        sid = random.choice(student_ids)
+        # Everyone goes for the first few slots, with overlapping 5-10 minute windows
+        start = BASE_TIME + timedelta(minutes=30 * random.randrange(3) + 5 * random.randrange(3))
+        body = {
+            "professor_id": str(pid),
+            "student_id": str(sid),
+            "start_time": start.isoformat(),
+            "end_time": (start + timedelta(minutes=random.choice([5, 10]))).isoformat(),
+        }
+        headers = {"Authorization": f"Bearer {token(sid, 'student')}"}
+        calls.append(lambda body=body, headers=headers: client.post("/appointments", json=body, headers=headers))
+    await run_concurrently(recorder, "POST /appointments", calls, concurrency)
+
+
+async def browsing(client, recorder, professor_ids, student_ids, requests, concurrency):
+    calls = []
+    for _ in range(requests):
+        body = {"professor_id": str(random.choice(professor_ids)), "limit": 50}
+        headers = {"Authorization": f"Bearer {token(random.choice(student_ids), 'student')}"}
+        calls.append(lambda body=body, headers=headers: client.post("/getavailability", json=body, headers=headers))
+    await run_concurrently(recorder, "POST /getavailability", calls, concurrency)
+
+
+async def listing(client, recorder, professor_ids, student_ids, requests, concurrency):
+    calls = []
+    for _ in range(requests):
+        if random.random() < 0.5:
+            headers = {"Authorization": f"Bearer {token(random.choice(professor_ids), 'professor')}"}
+        else:
+            headers = {"Authorization": f"Bearer {token(random.choice(student_ids), 'student')}"}
+        calls.append(lambda headers=headers: client.get("/getappointments", params={"limit": 100}, headers=headers))
+    await run_concurrently(recorder, "GET /getappointments", calls, concurrency)
+
+
+async def count_double_bookings(db, professor_ids):
+    """Number of overlapping pairs among each professor's active appointments."""
+    doubles = 0
+    cursor = db["appointments"].find(
+        {"professor_id": {"$in": professor_ids}, "is_canceled": False, "start_time": {"$gte": BASE_TIME}}
+    ).sort("start_time", 1)
+    latest_end = {}
+    async for appointment in cursor:
+        pid = appointment["professor_id"]
+        if pid in latest_end and latest_end[pid] > appointment["start_time"]:
+            doubles += 1
+        latest_end[pid] = max(latest_end.get(pid, appointment["end_time"]), appointment["end_time"])
+    return doubles
+
+
+async def main(args):
+    random.seed(args.seed)
+    db = open_database(args.mongo_uri)
+    await ensure_indexes(db)
+
+    async def override_db():
+        return db
+
+    application.dependency_overrides[get_db] = override_db
+
+    professor_ids, student_ids = await seed(db, args.professors, args.students, args.slots, args.history)
+    recorder = Recorder()
+    transport = ASGITransport(app=application)
+    async with AsyncClient(transport=transport, base_url="http://load-test") as client:
+        await booking_storm(client, recorder, professor_ids, student_ids, args.hot_professors, args.bookings, args.concurrency)
+        await browsing(client, recorder, professor_ids, student_ids, args.requests, args.concurrency)
+        await listing(client, recorder, professor_ids, student_ids, args.requests, args.concurrency)
+
+    report = recorder.report()
+    double_bookings = await count_double_bookings(db, professor_ids[:args.hot_professors])
+
+    if args.json:
+        print(json.dumps({"routes": report, "double_bookings": double_bookings}, indent=2))
+    else:
+        print(f"{'route':26} {'reqs':>6} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  statuses")
+        for route, row in report.items():
+            print(
+                f"{route:26} {row['requests']:6d} {row['errors']:6d} {row['throughput_rps']:8.1f} "
+                f"{row['p50_ms']:8.2f} {row['p95_ms']:8.2f} {row['p99_ms']:8.2f}  {row['statuses']}"
+            )
+        print(f"double bookings: {double_bookings}")
+
+    errors = sum(row["errors"] for row in report.values())
+    too_slow = [route for route, row in report.items() if args.max_p95_ms and row["p95_ms"] > args.max_p95_ms]
+    return 1 if double_bookings or errors or too_slow else 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Load test the booking API against a local MongoDB")
+    parser.add_argument("--mongo-uri", required=True, help="local mongod to run against (its load_test database is wiped)")
+    parser.add_argument("--professors", type=int, default=2000)
+    parser.add_argument("--students", type=int, default=5000)
+    parser.add_argument("--slots", type=int, default=40, help="availability fragments per professor")
+    parser.add_argument("--history", type=int, default=20, help="past appointments per student")
+    parser.add_argument("--hot-professors", type=int, default=5, help="professors targeted by the booking storm")
+    parser.add_argument("--bookings", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per browsing/listing scenario")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--max-p95-ms", type=float, default=0, help="fail when any route's p95 exceeds this")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -1,14 +1,24 @@
-from app.db import get_db
+import asyncio
 
-# Test the connection
-try:
-    with get_db() as db:
+from app.db import connect, close, get_db
+
+
+async def main():
+    # Test the connection
+    try:
+        connect()
+        db = await get_db()
         # Try to ping the database
-        db.command('ping')
+        await db.command('ping')
         print("Successfully connected to MongoDB!")
-        
+
         # Optional: Print list of collections
-        print("Collections in database:", db.list_collection_names())
-except Exception as e:
-    print("Failed to connect to MongoDB:")
-    print(e)
\ No newline at end of file
+        print("Collections in database:", await db.list_collection_names())
+    except Exception as e:
+        print("Failed to connect to MongoDB:")
+        print(e)
+    finally:
+        close()
+
+
+asyncio.run(main())